@@ -3,20 +3,35 @@
 Aplicación Flask - DW Manager con MySQL.
 API compatible con el frontend existente.
 """
-import os
+import csv
 import json
-import subprocess
+import os
+import random
+import threading
+import time
 from functools import wraps
+from itertools import groupby
 
-import bcrypt
 import pymysql
-from pymysql.cursors import DictCursor
-from flask import Flask, request, jsonify, session, g
-from datetime import date, datetime
+from pymysql.cursors import DictCursor, SSDictCursor
+from flask import Flask, request, jsonify, session, g, Response, stream_with_context
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
 
 from dotenv import load_dotenv
 load_dotenv()
 
+from pool_mysql import PoolMySQL, PoolAgotado
+from olap_dimensiones import CacheDimensiones
+from olap_cache import CacheResultados
+import cubo_columnar
+from cubo_columnar import CuboColumnar
+from hash_passwords import ServicioHash, ColaHashLlena
+from buffer_accesos import BufferUltimoAcceso
+from eventos_sse import Difusor, Publicador
+from trabajos import EjecutorTrabajos, fila_publica
+from scripts import asignacion_engine
+
 app = Flask(__name__, static_folder='public', static_url_path='')
 app.secret_key = os.getenv('SESSION_SECRET', 'cambia-esto-en-produccion')
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -43,9 +58,41 @@ def get_db_config():
         'cursorclass': DictCursor,
     }
 
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Pool de conexiones del proceso (se crea en el primer uso)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolMySQL(
+                    get_db_config,
+                    min_size=int(os.getenv('MYSQL_POOL_MIN', 2)),
+                    max_size=int(os.getenv('MYSQL_POOL_MAX', 10)),
+                    max_idle=int(os.getenv('MYSQL_POOL_MAX_IDLE', 300)),
+                    max_age=int(os.getenv('MYSQL_POOL_MAX_AGE', 3600)),
+                    ping_after=int(os.getenv('MYSQL_POOL_PING_AFTER', 30)),
+                    timeout=float(os.getenv('MYSQL_POOL_TIMEOUT', 10)),
+                )
+    return _pool
+
+# Claves sustitutas del DW en memoria (ETL y cargadores)
+dim_cache = CacheDimensiones()
+
+# Trabajos en segundo plano (refresco del cubo, asignación); cada uno corre dentro de app.app_context()
+ejecutor_trabajos = EjecutorTrabajos(
+    get_pool,
+    lambda: app.app_context(),
+    hilos=int(os.getenv('TRABAJOS_HILOS', 2)),
+    intervalo_avance=float(os.getenv('TRABAJOS_INTERVALO_AVANCE', 1.0)),
+    max_pendiente=int(os.getenv('TRABAJOS_PENDIENTE_MAX_S', 3600)),
+)
+
 def get_db():
     if 'db' not in g:
-        g.db = pymysql.connect(**get_db_config())
+        g.db = get_pool().obtener()
     return g.db
 
 def test_conexion_mysql():
@@ -84,7 +131,10 @@ def test_conexion_mysql():
 def close_db(e):
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        if isinstance(e, pymysql.err.OperationalError):
+            get_pool().descartar(db)
+        else:
+            get_pool().devolver(db)
 
 def db_execute(query, args=None, commit=False):
     conn = get_db()
@@ -129,15 +179,239 @@ def require_admin(f):
         return f(*args, **kwargs)
     return inner
 
+@app.errorhandler(PoolAgotado)
+def pool_agotado(e):
+    return jsonify({'error': 'Servidor ocupado, intenta de nuevo en unos segundos'}), 503
+
+@app.errorhandler(ColaHashLlena)
+def cola_hash_llena(e):
+    return jsonify({'error': 'Demasiados inicios de sesión simultáneos, intenta de nuevo en unos segundos'}), 503
+
+# --- Respuestas condicionales (ETag / 304) ---
+# Cada tabla tiene un contador de versión en `versiones_tablas` que suben los endpoints de escritura.
+# El ETag de una lectura se arma con las versiones de las tablas de las que depende (una lectura por
+# clave primaria en lugar de la consulta completa). La tabla la comparten todos los workers y sobrevive
+# a los reinicios. Sin ella (falta la migración) se usan contadores del proceso, con el instante de
+# arranque en el ETag: en ese modo cada worker emite sus propios ETag.
+_versiones_lock = threading.Lock()
+_versiones = {}
+_modificadas = {}
+_ARRANQUE = datetime.now(timezone.utc).replace(microsecond=0)
+_ARRANQUE_ID = format(int(_ARRANQUE.timestamp()), 'x')
+# None: aún no se sabe si existe versiones_tablas; False: no existe, se usan los contadores del proceso
+_versiones_en_mysql = None
+
+def _tabla_versiones_falta(e):
+    global _versiones_en_mysql
+    if isinstance(e, pymysql.err.ProgrammingError) and e.args and e.args[0] == 1146:
+        if _versiones_en_mysql is not False:
+            app.logger.warning('Falta la tabla versiones_tablas (migracion-rendimiento.sql): ETag por proceso')
+        _versiones_en_mysql = False
+        return True
+    return False
+
+def tocar_tablas(*tablas):
+    """
+    Sube la versión de las tablas modificadas (invalida los ETag que dependen de ellas).
+    Se llama justo después del commit de la escritura y usa la misma conexión de la petición. Si la
+    versión no se puede subir la excepción sigue su curso y la petición falla: un ETag sin cambiar
+    haría que los clientes guardaran para siempre datos que ya no son los de la tabla.
+    """
+    global _versiones_en_mysql
+    ahora = datetime.now(timezone.utc).replace(microsecond=0)
+    with _versiones_lock:
+        for t in tablas:
+            _versiones[t] = _versiones.get(t, 0) + 1
+            _modificadas[t] = ahora
+    if tablas and _versiones_en_mysql is not False:
+        orden = tuple(sorted(set(tablas)))
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            # Orden fijo de filas: dos escrituras simultáneas no se interbloquean
+            cur.execute(
+                'INSERT INTO versiones_tablas (tabla, version) VALUES ' + ', '.join(['(%s, 1)'] * len(orden)) +
+                ' ON DUPLICATE KEY UPDATE version = version + 1, modificada = CURRENT_TIMESTAMP',
+                orden
+            )
+            conn.commit()
+            _versiones_en_mysql = True
+        except Exception as e:
+            conn.rollback()
+            if not _tabla_versiones_falta(e):
+                raise
+        finally:
+            cur.close()
+    if 'productos' in tablas or 'pedidos' in tablas:
+        publicador_sse.marcar()
+
+def _version_de(tablas):
+    """(etag, última modificación) de las tablas: de versiones_tablas o, sin ella, del proceso."""
+    if _versiones_en_mysql is not False:
+        try:
+            filas = db_execute(
+                'SELECT tabla, version, UNIX_TIMESTAMP(modificada) AS modificada FROM versiones_tablas WHERE tabla IN ('
+                + ', '.join(['%s'] * len(tablas)) + ')', tablas
+            )
+        except pymysql.err.ProgrammingError as e:
+            if not _tabla_versiones_falta(e):
+                raise
+        else:
+            por_tabla = {f['tabla']: f for f in filas}
+            etag = 'v' + '.'.join(str(por_tabla[t]['version']) if t in por_tabla else '0' for t in tablas)
+            # Una tabla nunca tocada no cambió desde el arranque
+            modificada = max(datetime.fromtimestamp(int(por_tabla[t]['modificada']), timezone.utc) if t in por_tabla
+                             else _ARRANQUE for t in tablas)
+            return etag, modificada
+    with _versiones_lock:
+        etag = _ARRANQUE_ID + '-' + '.'.join(str(_versiones.get(t, 0)) for t in tablas)
+        modificada = max([_modificadas.get(t, _ARRANQUE) for t in tablas])
+    return etag, modificada
+
+def respuesta_condicional(*tablas):
+    """Añade ETag/Last-Modified según las versiones de `tablas` y responde 304 si el cliente ya las tiene."""
+    def deco(f):
+        @wraps(f)
+        def inner(*args, **kwargs):
+            etag, modificada = _version_de(tablas)
+            # olap_cacheado reutiliza esta lectura en lugar de repetirla
+            g.version_tablas = (tablas, etag)
+            if request.if_none_match:
+                no_cambio = request.if_none_match.contains(etag)
+            else:
+                no_cambio = request.if_modified_since is not None and modificada <= request.if_modified_since
+            if no_cambio:
+                resp = Response(status=304)
+            else:
+                resp = app.make_response(f(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag)
+            resp.last_modified = modificada
+            resp.headers['Cache-Control'] = 'private, no-cache'
+            return resp
+        return inner
+    return deco
+
+# Tablas de las que dependen las respuestas OLAP: sus versiones forman el ETag y la clave de olap_cache
+OLAP_TABLAS = ('fact_ventas', 'dim_sucursal', 'agg_ventas_mes_categoria_sucursal', 'agg_ventas_producto_mes')
+
+# Caché de respuestas OLAP (cambia de versión al refrescar el cubo, en cualquier worker)
+olap_cache = CacheResultados(max_entradas=int(os.getenv('OLAP_CACHE_MAX', 256)))
+
+# Cubo columnar en memoria (OLAP_CUBO_MEMORIA=1, requiere NumPy): slice, dice, drill-down y roll-up sin MySQL
+_CUBO_MEMORIA = os.getenv('OLAP_CUBO_MEMORIA', '0') == '1'
+# Snapshot en disco que comparten todos los procesos vía mmap (vacío = sin snapshot)
+_CUBO_SNAPSHOT = os.getenv('OLAP_CUBO_SNAPSHOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cubo_olap.snap'))
+cubo_memoria = CuboColumnar(activo=_CUBO_MEMORIA, ruta_snapshot=_CUBO_SNAPSHOT)
+if _CUBO_MEMORIA and not cubo_columnar.disponible():
+    app.logger.warning('OLAP_CUBO_MEMORIA=1 pero NumPy no está instalado: las consultas OLAP usan MySQL')
+# Arranque en caliente: si hay snapshot, el cubo queda listo sin leer fact_ventas; antes de la primera
+# consulta se compara su marca con la del DW y, si los datos cambiaron mientras tanto, se recarga
+cubo_memoria.abrir_snapshot()
+
+def _desde_cubo(agrupar, medidas, filtros=None, orden=(), limite=None):
+    """Filas calculadas en el cubo en memoria, o None para responder con SQL."""
+    if not cubo_memoria.activo:
+        return None
+    try:
+        # Si hay que cargarlo, lo hace un hilo con su propio app_context; esta petición responde con SQL
+        ins = cubo_memoria.obtener(get_db, app.app_context)
+        if ins is None:
+            return None
+        return cubo_memoria.consultar(ins, agrupar, medidas, filtros, orden, limite)
+    except Exception:
+        app.logger.exception('Error en el cubo columnar; se responde con SQL')
+        return None
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+def olap_cacheado(f):
+    """Sirve la respuesta desde olap_cache si existe; si no, la calcula y guarda el JSON ya serializado."""
+    @wraps(f)
+    def inner(*args, **kwargs):
+        leida = g.get('version_tablas')
+        version = leida[1] if leida and leida[0] == OLAP_TABLAS else _version_de(OLAP_TABLAS)[0]
+        clave = olap_cache.clave(request.endpoint, request.args.items(multi=True), request.view_args)
+        hit = olap_cache.obtener(clave, version)
+        if hit is not None:
+            return Response(hit, mimetype='application/json')
+        resp = app.make_response(f(*args, **kwargs))
+        if resp.status_code == 200:
+            olap_cache.guardar(clave, resp.get_data(), version)
+        return resp
+    return inner
+
 # --- CORS (para desarrollo) ---
 @app.after_request
 def after_request(resp):
     resp.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', 'http://localhost:3000')
     resp.headers['Access-Control-Allow-Credentials'] = 'true'
-    resp.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    resp.headers['Access-Control-Allow-Headers'] = 'Content-Type, If-None-Match'
+    resp.headers['Access-Control-Expose-Headers'] = 'ETag, X-Next-After-Id, X-Total-Count'
     return resp
 
 # ============ Auth ============
+# bcrypt corre en su propio pool de hilos acotado; la petición espera el resultado como mucho
+# BCRYPT_ESPERA_RESULTADO segundos y, si no llega, responde 503 (ver hash_passwords.py)
+servicio_hash = ServicioHash(
+    hilos=int(os.getenv('BCRYPT_HILOS', 2)),
+    max_cola=int(os.getenv('BCRYPT_MAX_COLA', 32)),
+    rounds=int(os.getenv('BCRYPT_ROUNDS', 10)),
+    espera_cola=float(os.getenv('BCRYPT_ESPERA_COLA', 0.5)),
+    espera_resultado=float(os.getenv('BCRYPT_ESPERA_RESULTADO', 5)),
+)
+
+def _guardar_rehash(user_id, hash_anterior):
+    """Devuelve la función que guarda el hash nuevo (corre en el hilo de bcrypt, fuera de la petición)."""
+    def guardar(nuevo_hash):
+        pool = get_pool()
+        conn = pool.obtener()
+        try:
+            cur = conn.cursor()
+            try:
+                # Solo si nadie cambió la contraseña mientras tanto
+                cur.execute('UPDATE usuarios SET password_hash = %s WHERE id = %s AND password_hash = %s',
+                            (nuevo_hash, user_id, hash_anterior))
+                conn.commit()
+            finally:
+                cur.close()
+        except pymysql.err.OperationalError:
+            pool.descartar(conn)
+            raise
+        pool.devolver(conn)
+    return guardar
+
+def _escribir_ultimos_accesos(filas):
+    """Vuelca (usuario_id, momento) en usuarios.ultimo_acceso con un UPDATE ... JOIN por lote."""
+    pool = get_pool()
+    conn = pool.obtener()
+    try:
+        cur = conn.cursor()
+        try:
+            _update_por_lotes(cur, """
+                UPDATE usuarios u JOIN ({valores}) v ON u.id = v.id
+                SET u.ultimo_acceso = GREATEST(COALESCE(u.ultimo_acceso, v.momento), v.momento)
+            """, ('id', 'momento'), filas)
+            conn.commit()
+        finally:
+            cur.close()
+    except pymysql.err.OperationalError:
+        pool.descartar(conn)
+        raise
+    pool.devolver(conn)
+
+# El login no escribe ultimo_acceso en el momento: se acumula y se vuelca cada ULTIMO_ACCESO_MAX_RETRASO s
+ultimos_accesos = BufferUltimoAcceso(
+    _escribir_ultimos_accesos,
+    max_retraso=float(os.getenv('ULTIMO_ACCESO_MAX_RETRASO', 30)),
+    max_pendientes=int(os.getenv('ULTIMO_ACCESO_MAX_PENDIENTES', 1000)),
+)
+
 def _validar_dominio_email(email):
     """El correo debe contener @ y dominio gmail, hotmail o dw."""
     if '@' not in email:
@@ -167,7 +441,7 @@ def register():
     existing = db_execute_one('SELECT id FROM usuarios WHERE email = %s', (email,))
     if existing:
         return jsonify({'error': 'El email ya está registrado'}), 400
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=10)).decode('utf-8')
+    password_hash = servicio_hash.hashear(password)
     db_execute(
         'INSERT INTO usuarios (nombre_completo, email, password_hash, rol) VALUES (%s, %s, %s, %s)',
         (nombre_completo, email, password_hash, 'usuario'),
@@ -200,15 +474,13 @@ def login():
     if not user.get('activo', 1):
         return jsonify({'error': 'Usuario desactivado. Contacta al administrador.'}), 401
     raw_hash = user.get('password_hash') or ''
-    if isinstance(raw_hash, str):
-        raw_hash = raw_hash.strip()
-    hash_bytes = raw_hash.encode('utf-8') if isinstance(raw_hash, str) else (raw_hash if isinstance(raw_hash, bytes) else b'')
-    try:
-        if not hash_bytes or not bcrypt.checkpw(password.encode('utf-8'), hash_bytes):
-            return jsonify({'error': 'Credenciales incorrectas'}), 401
-    except Exception:
+    if isinstance(raw_hash, bytes):
+        raw_hash = raw_hash.decode('utf-8', 'replace')
+    if not servicio_hash.verificar(password, raw_hash.strip()):
         return jsonify({'error': 'Credenciales incorrectas'}), 401
-    db_execute('UPDATE usuarios SET ultimo_acceso = NOW() WHERE id = %s', (user['id'],), commit=True)
+    if servicio_hash.necesita_rehash(raw_hash.strip()):
+        servicio_hash.rehash_en_segundo_plano(password, _guardar_rehash(user['id'], raw_hash))
+    ultimos_accesos.registrar(user['id'])
     session['userId'] = user['id']
     session['userEmail'] = user['email']
     session['userName'] = user['nombre_completo']
@@ -237,33 +509,160 @@ def auth_check():
         })
     return jsonify({'authenticated': False})
 
+# ============ Paginación (keyset) ============
+# Sin `limit` ni `after_id` los listados responden como siempre (todas las filas).
+# Con ellos se pagina por cursor: la respuesta sigue siendo un arreglo y el siguiente cursor
+# viaja en la cabecera X-Next-After-Id (ausente en la última página).
+PAGINA_MAX = 500
+PAGINA_DEFECTO = 100
+
+_CAMPOS_PRODUCTO = {
+    'id': 'p.id', 'nombre': 'p.nombre', 'codigo': 'p.codigo', 'categoria_id': 'p.categoria_id',
+    'categoria_nombre': 'c.nombre AS categoria_nombre', 'precio_unitario': 'p.precio_unitario',
+    'stock': 'p.stock', 'punto_reorden': 'p.punto_reorden', 'pasillo': 'p.pasillo',
+    'estante': 'p.estante', 'nivel': 'p.nivel',
+}
+
+_CAMPOS_PEDIDO = {
+    'id': 'pd.id', 'producto_id': 'pd.producto_id', 'producto_nombre': 'p.nombre AS producto_nombre',
+    'codigo': 'p.codigo', 'stock': 'p.stock', 'cantidad_solicitada': 'pd.cantidad_solicitada',
+    'cantidad_asignada': 'pd.cantidad_asignada', 'estado': 'pd.estado', 'prioridad': 'pd.prioridad',
+    'cliente_ref': 'pd.cliente_ref', 'fecha_solicitud': 'pd.fecha_solicitud',
+}
+
+def _params_paginacion():
+    """Lee after_id y limit. Devuelve (after_id, limit, paginar)."""
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+    paginar = after_id is not None or limit is not None
+    limit = max(1, min(limit or PAGINA_DEFECTO, PAGINA_MAX))
+    return after_id, limit, paginar
+
+def _quiere_total():
+    return request.args.get('total', '').lower() in ('1', 'true', 'si')
+
+def _proyeccion(disponibles):
+    """Columnas pedidas en ?fields=a,b (id siempre se incluye). Devuelve (sql_columnas, error)."""
+    fields = request.args.get('fields', '').strip()
+    if not fields:
+        return ', '.join(disponibles.values()), None
+    pedidos = ['id'] + [f.strip() for f in fields.split(',') if f.strip() and f.strip() != 'id']
+    desconocidos = [f for f in pedidos if f not in disponibles]
+    if desconocidos:
+        return None, 'Campos no válidos: ' + ', '.join(desconocidos)
+    return ', '.join(disponibles[f] for f in dict.fromkeys(pedidos)), None
+
+def _respuesta_paginada(rows, limit, total=None):
+    """Recorta la fila extra de `limit + 1` y pone X-Next-After-Id / X-Total-Count."""
+    hay_mas = limit is not None and len(rows) > limit
+    if hay_mas:
+        rows = rows[:limit]
+    resp = jsonify(rows)
+    if hay_mas:
+        resp.headers['X-Next-After-Id'] = str(rows[-1]['id'])
+    if total is not None:
+        resp.headers['X-Total-Count'] = str(total)
+    return resp
+
 # ============ Productos ============
 @app.route('/api/productos')
 @require_auth
+@respuesta_condicional('productos', 'categorias')
 def list_productos():
     q = request.args.get('q', '').strip()
     categoria_id = request.args.get('categoria_id')
     codigo = request.args.get('codigo', '').strip()
-    sql = """
-        SELECT p.id, p.nombre, p.codigo, p.categoria_id, c.nombre AS categoria_nombre,
-               p.precio_unitario, p.stock, p.punto_reorden, p.pasillo, p.estante, p.nivel
-        FROM productos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id
-        WHERE 1=1
-    """
+    after_id, limit, paginar = _params_paginacion()
+    campos, err = _proyeccion(_CAMPOS_PRODUCTO)
+    if err:
+        return jsonify({'error': err}), 400
+    where = " WHERE 1=1"
     params = []
+    relevancia = None
     if q:
-        sql += " AND (p.nombre LIKE %s OR p.codigo LIKE %s)"
-        params.extend([f'%{q}%', f'%{q}%'])
+        filtro, filtro_params, relevancia = _filtro_busqueda(q)
+        where += " AND " + filtro
+        params.extend(filtro_params)
     if categoria_id:
-        sql += " AND p.categoria_id = %s"
+        where += " AND p.categoria_id = %s"
         params.append(categoria_id)
     if codigo:
-        sql += " AND p.codigo LIKE %s"
-        params.append(f'%{codigo}%')
-    sql += " ORDER BY p.id DESC"
-    rows = db_execute(sql, tuple(params) if params else None)
-    return jsonify(rows or [])
+        # Subcadena, como siempre; la búsqueda por prefijo (con índice) es /api/productos/sugerencias
+        where += " AND p.codigo LIKE %s"
+        params.append('%' + _escapar_like(codigo) + '%')
+    desde = " FROM productos p LEFT JOIN categorias c ON p.categoria_id = c.id"
+    total = None
+    if _quiere_total():
+        total = db_execute_one('SELECT COUNT(*) AS total' + desde + where, tuple(params))['total']
+    sql = 'SELECT ' + campos + desde + where
+    if after_id:
+        sql += " AND p.id < %s"
+        params.append(after_id)
+    if relevancia and not paginar and request.args.get('orden') == 'relevancia':
+        sql += " ORDER BY " + relevancia[0] + " DESC, p.id DESC"
+        params.extend(relevancia[1])
+    else:
+        sql += " ORDER BY p.id DESC"
+    if paginar:
+        sql += " LIMIT %s"
+        params.append(limit + 1)
+    rows = db_execute(sql, tuple(params) if params else None) or []
+    return _respuesta_paginada(rows, limit if paginar else None, total)
+
+SUGERENCIAS_MAX_MS = int(os.getenv('SUGERENCIAS_MAX_MS', 250))
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _filtro_busqueda(q):
+    """
+    Filtro de texto sobre nombre/código usando el índice FULLTEXT ngram (ft_productos_busqueda).
+    La frase entre comillas equivale a buscar la subcadena, como el LIKE '%q%' anterior.
+    Con un solo carácter no hay bigramas que buscar y se usa LIKE.
+    Devuelve (sql, params, (expresion_relevancia, params_relevancia) o None).
+    """
+    if len(q) < 2:
+        patron = '%' + _escapar_like(q) + '%'
+        return "(p.nombre LIKE %s OR p.codigo LIKE %s)", [patron, patron], None
+    frase = '"' + q.replace('"', ' ') + '"'
+    match = "MATCH(p.nombre, p.codigo) AGAINST (%s IN BOOLEAN MODE)"
+    return match, [frase], (match, [frase])
+
+@app.route('/api/productos/sugerencias')
+@require_auth
+def sugerencias_productos():
+    """Autocompletado: primero códigos que empiezan por q (índice único), luego nombres por relevancia."""
+    q = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+    if not q:
+        return jsonify([])
+    rows = db_execute(
+        'SELECT id, nombre, codigo, stock FROM productos WHERE codigo LIKE %s ORDER BY codigo LIMIT %s',
+        (_escapar_like(q) + '%', limit)
+    ) or []
+    if len(rows) < limit and len(q) >= 2:
+        vistos = {r['id'] for r in rows}
+        frase = '"' + q.replace('"', ' ') + '"'
+        try:
+            extra = db_execute(f"""
+                SELECT /*+ MAX_EXECUTION_TIME({SUGERENCIAS_MAX_MS}) */ id, nombre, codigo, stock,
+                       MATCH(nombre, codigo) AGAINST (%s IN BOOLEAN MODE) AS relevancia
+                FROM productos
+                WHERE MATCH(nombre, codigo) AGAINST (%s IN BOOLEAN MODE)
+                ORDER BY relevancia DESC, id DESC
+                LIMIT %s
+            """, (frase, frase, limit)) or []
+        except pymysql.err.OperationalError as e:
+            # 3024: se superó MAX_EXECUTION_TIME; se responde con lo que ya hay
+            if e.args and e.args[0] == 3024:
+                extra = []
+            else:
+                raise
+        for r in extra:
+            if r['id'] not in vistos and len(rows) < limit:
+                r.pop('relevancia', None)
+                rows.append(r)
+    return jsonify(rows)
 
 def _campo_obligatorio(val, nombre_campo='Campo'):
     """Valida que un valor (string o número) no esté vacío."""
@@ -340,6 +739,8 @@ def create_producto():
         (nombre, codigo, int(categoria_id), float(precio), stock, punto, pasillo, estante, nivel)
     )
     conn.commit()
+    dim_cache.invalidar_productos()
+    tocar_tablas('productos')
     row = db_execute_one('SELECT * FROM productos WHERE id = %s', (cur.lastrowid,))
     cur.close()
     return jsonify(row), 201
@@ -383,6 +784,9 @@ def update_producto(id):
         (nombre, codigo, int(categoria_id), float(precio), int(stock), int(punto_reorden), pasillo, estante, nivel, id),
         commit=True
     )
+    dim_cache.invalidar_productos()
+    publicador_sse.marcar((id,))
+    tocar_tablas('productos')
     row = db_execute_one('SELECT * FROM productos WHERE id = %s', (id,))
     if not row:
         return jsonify({'error': 'Producto no encontrado'}), 404
@@ -392,11 +796,14 @@ def update_producto(id):
 @require_auth
 def delete_producto(id):
     db_execute('DELETE FROM productos WHERE id = %s', (id,), commit=True)
+    dim_cache.invalidar_productos()
+    tocar_tablas('productos')
     return jsonify({'message': 'Producto eliminado'})
 
 # ============ Categorías ============
 @app.route('/api/categorias')
 @require_auth
+@respuesta_condicional('categorias')
 def list_categorias():
     rows = db_execute('SELECT * FROM categorias ORDER BY nombre ASC')
     return jsonify(rows or [])
@@ -416,6 +823,7 @@ def create_categoria():
     try:
         cur.execute('INSERT INTO categorias (nombre) VALUES (%s)', (nombre,))
         conn.commit()
+        tocar_tablas('categorias')
     except pymysql.IntegrityError:
         conn.rollback()
         return jsonify({'error': 'La categoría ya existe'}), 400
@@ -434,6 +842,8 @@ def update_categoria(id):
     if err:
         return jsonify({'error': err}), 400
     db_execute('UPDATE categorias SET nombre = %s WHERE id = %s', (nombre, id), commit=True)
+    dim_cache.invalidar_productos()
+    tocar_tablas('categorias', 'productos')
     row = db_execute_one('SELECT * FROM categorias WHERE id = %s', (id,))
     return jsonify(row)
 
@@ -444,11 +854,13 @@ def delete_categoria(id):
     if cnt and cnt['c'] > 0:
         return jsonify({'error': 'No se puede eliminar. Hay productos con esta categoría.'}), 400
     db_execute('DELETE FROM categorias WHERE id = %s', (id,), commit=True)
+    tocar_tablas('categorias')
     return jsonify({'message': 'Categoría eliminada'})
 
 # ============ Sucursales (DW) ============
 @app.route('/api/sucursales')
 @require_auth
+@respuesta_condicional('dim_sucursal')
 def list_sucursales():
     rows = db_execute('SELECT sk_sucursal, id_sucursal, nombre_sucursal, ciudad, estado, region FROM dim_sucursal ORDER BY sk_sucursal DESC')
     return jsonify(rows or [])
@@ -475,6 +887,9 @@ def create_sucursal():
         (next_id, nombre_sucursal, ciudad, estado, region)
     )
     conn.commit()
+    dim_cache.invalidar_sucursales()
+    cubo_memoria.invalidar()
+    tocar_tablas('dim_sucursal')
     row = db_execute_one('SELECT * FROM dim_sucursal WHERE sk_sucursal = %s', (cur.lastrowid,))
     cur.close()
     return jsonify(row), 201
@@ -497,6 +912,8 @@ def update_sucursal(id):
         (nombre_sucursal, ciudad, estado, region, id),
         commit=True
     )
+    cubo_memoria.invalidar()
+    tocar_tablas('dim_sucursal')
     row = db_execute_one('SELECT * FROM dim_sucursal WHERE sk_sucursal = %s', (id,))
     return jsonify(row)
 
@@ -507,21 +924,60 @@ def delete_sucursal(id):
     if r and r['c'] > 0:
         return jsonify({'error': 'No se puede eliminar. La sucursal tiene ventas registradas.'}), 400
     db_execute('DELETE FROM dim_sucursal WHERE sk_sucursal = %s', (id,), commit=True)
+    dim_cache.invalidar_sucursales()
+    cubo_memoria.invalidar()
+    tocar_tablas('dim_sucursal')
     return jsonify({'message': 'Sucursal eliminada'})
 
 # ============ Alertas ============
 @app.route('/api/alertas/bajo-stock')
 @require_auth
+@respuesta_condicional('productos', 'categorias')
 def alertas_bajo_stock():
+    # bajo_stock es una columna generada (stock < punto de reorden) indexada junto con stock:
+    # MySQL la recalcula en cada escritura y aquí solo se leen los productos en alerta, ya ordenados.
     rows = db_execute("""
         SELECT p.id, p.nombre, p.codigo, c.nombre AS categoria, p.stock, p.punto_reorden, p.precio_unitario
         FROM productos p
         LEFT JOIN categorias c ON p.categoria_id = c.id
-        WHERE p.stock < COALESCE(NULLIF(p.punto_reorden, 0), 5)
+        WHERE p.bajo_stock = 1
         ORDER BY p.stock ASC
     """)
     return jsonify(rows or [])
 
+# ============ Stock (ajustes atómicos) ============
+# Ventas y movimientos no leen el stock para luego escribirlo: aplican el cambio con un UPDATE
+# condicionado, así dos salidas simultáneas del mismo producto no pueden dejarlo negativo ni pisarse.
+_stock_lock = threading.Lock()
+_stock_metricas = {'ajustes_aplicados': 0, 'salidas_rechazadas': 0}
+
+def _ajustar_stock(cur, producto_id, delta):
+    """
+    Suma `delta` al stock del producto. Una salida (delta < 0) solo se aplica si el stock actual alcanza.
+    Devuelve True si se aplicó; la fila queda bloqueada hasta el commit de la transacción.
+    El aviso SSE lo da quien llama, después del commit: antes los clientes podrían leer el stock viejo.
+    """
+    if delta < 0:
+        cur.execute('UPDATE productos SET stock = stock - %s WHERE id = %s AND stock >= %s',
+                    (-delta, producto_id, -delta))
+    else:
+        cur.execute('UPDATE productos SET stock = COALESCE(stock, 0) + %s WHERE id = %s', (delta, producto_id))
+    aplicado = cur.rowcount == 1
+    if aplicado:
+        with _stock_lock:
+            _stock_metricas['ajustes_aplicados'] += 1
+    return aplicado
+
+def _stock_no_aplicado(cur, producto_id):
+    """Respuesta cuando _ajustar_stock no aplicó: producto inexistente o stock insuficiente."""
+    cur.execute('SELECT stock FROM productos WHERE id = %s', (producto_id,))
+    prod = cur.fetchone()
+    if not prod:
+        return jsonify({'error': 'Producto no encontrado'}), 404
+    with _stock_lock:
+        _stock_metricas['salidas_rechazadas'] += 1
+    return jsonify({'error': f'Stock insuficiente. Disponible: {prod["stock"] or 0}'}), 400
+
 # ============ Ventas ============
 @app.route('/api/ventas/registrar', methods=['POST'])
 @require_auth
@@ -534,23 +990,21 @@ def registrar_venta():
     conn = get_db()
     cur = conn.cursor()
     try:
+        if not _ajustar_stock(cur, producto_id, -int(cantidad)):
+            return _stock_no_aplicado(cur, producto_id)
         cur.execute('SELECT nombre, precio_unitario, stock FROM productos WHERE id = %s', (producto_id,))
         prod = cur.fetchone()
-        if not prod:
-            return jsonify({'error': 'Producto no encontrado'}), 404
-        stock_actual = prod['stock'] or 0
-        if stock_actual < int(cantidad):
-            return jsonify({'error': f'Stock insuficiente. Disponible: {stock_actual}'}), 400
         monto = float(prod['precio_unitario']) * int(cantidad)
         cur.execute('INSERT INTO ventas (producto_id, cantidad, monto_total, fecha_venta) VALUES (%s, %s, %s, NOW())', (producto_id, cantidad, monto))
-        cur.execute('UPDATE productos SET stock = stock - %s WHERE id = %s', (cantidad, producto_id))
         conn.commit()
+        publicador_sse.marcar((int(producto_id),))
+        tocar_tablas('productos')
         return jsonify({
             'message': 'Venta registrada exitosamente',
             'producto': prod['nombre'],
             'cantidad': cantidad,
             'monto_total': monto,
-            'stock_restante': stock_actual - int(cantidad)
+            'stock_restante': prod['stock']
         })
     except Exception as e:
         conn.rollback()
@@ -558,31 +1012,159 @@ def registrar_venta():
     finally:
         cur.close()
 
+VENTAS_LOTE_MAX = int(os.getenv('VENTAS_LOTE_MAX', 1000))
+
+@app.route('/api/ventas/registrar-lote', methods=['POST'])
+@require_auth
+def registrar_ventas_lote():
+    """
+    Registra muchas líneas de venta (p. ej. el lote de un punto de venta) en una sola transacción:
+    una consulta bloquea y lee todos los productos, las ventas se insertan en bloque y el stock se
+    descuenta sumado por producto. Body: {"ventas": [{"producto_id", "cantidad"}, ...], "todo_o_nada": false}.
+    Las líneas sin stock suficiente se rechazan una a una, salvo con todo_o_nada, que no registra nada.
+    """
+    data = request.get_json() or {}
+    lineas = data.get('ventas') if isinstance(data, dict) else data
+    todo_o_nada = bool(data.get('todo_o_nada')) if isinstance(data, dict) else False
+    if not isinstance(lineas, list) or not lineas:
+        return jsonify({'error': 'ventas debe ser una lista con al menos una línea'}), 400
+    if len(lineas) > VENTAS_LOTE_MAX:
+        return jsonify({'error': f'Máximo {VENTAS_LOTE_MAX} líneas por lote'}), 400
+
+    resultados = []
+    validas = []
+    for i, linea in enumerate(lineas):
+        try:
+            producto_id = int(linea.get('producto_id'))
+            cantidad = int(linea.get('cantidad'))
+        except (AttributeError, TypeError, ValueError):
+            producto_id = cantidad = None
+        if not producto_id or not cantidad or cantidad <= 0:
+            resultados.append({'linea': i, 'ok': False, 'error': 'Datos inválidos'})
+            continue
+        resultados.append({'linea': i, 'producto_id': producto_id, 'cantidad': cantidad})
+        validas.append(i)
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        ids = sorted({resultados[i]['producto_id'] for i in validas})
+        productos = {}
+        if ids:
+            # Orden por id para que dos lotes concurrentes bloqueen las filas en el mismo orden
+            cur.execute(
+                'SELECT id, nombre, precio_unitario, COALESCE(stock, 0) AS stock FROM productos '
+                'WHERE id IN (' + ', '.join(['%s'] * len(ids)) + ') ORDER BY id FOR UPDATE',
+                tuple(ids)
+            )
+            productos = {r['id']: r for r in cur.fetchall()}
+
+        disponible = {pid: p['stock'] for pid, p in productos.items()}
+        descuento = {}
+        filas_ventas = []
+        for i in validas:
+            res = resultados[i]
+            pid, cantidad = res['producto_id'], res['cantidad']
+            prod = productos.get(pid)
+            if prod is None:
+                res.update(ok=False, error='Producto no encontrado')
+            elif disponible[pid] < cantidad:
+                res.update(ok=False, error=f'Stock insuficiente. Disponible: {disponible[pid]}')
+            else:
+                disponible[pid] -= cantidad
+                descuento[pid] = descuento.get(pid, 0) + cantidad
+                monto = float(prod['precio_unitario']) * cantidad
+                filas_ventas.append((pid, cantidad, monto))
+                res.update(ok=True, producto=prod['nombre'], monto_total=monto, stock_restante=disponible[pid])
+
+        rechazadas = len(resultados) - len(filas_ventas)
+        resumen = {
+            'aceptadas': len(filas_ventas),
+            'rechazadas': rechazadas,
+            'monto_total': round(sum(f[2] for f in filas_ventas), 2),
+        }
+        if todo_o_nada and rechazadas:
+            conn.rollback()
+            for res in resultados:
+                if res.get('ok'):
+                    res.update(ok=False, error='Lote no registrado (todo_o_nada)')
+                    res.pop('monto_total', None)
+                    res.pop('stock_restante', None)
+            return jsonify(dict(resumen, aceptadas=0, monto_total=0, resultados=resultados)), 400
+        if filas_ventas:
+            # Todos los VALUES como %s: así PyMySQL lo reescribe en un INSERT de varias filas
+            cur.execute('SELECT NOW() AS ahora')
+            ahora = cur.fetchone()['ahora']
+            cur.executemany(
+                'INSERT INTO ventas (producto_id, cantidad, monto_total, fecha_venta) VALUES (%s, %s, %s, %s)',
+                [fila + (ahora,) for fila in filas_ventas]
+            )
+            actualizadas = _update_por_lotes(cur, """
+                UPDATE productos p JOIN ({valores}) v ON p.id = v.id
+                SET p.stock = p.stock - v.cantidad
+                WHERE p.stock >= v.cantidad
+            """, ('id', 'cantidad'), list(descuento.items()))
+            if actualizadas != len(descuento):
+                conn.rollback()
+                return jsonify({'error': 'El stock cambió durante el registro del lote; reintenta'}), 409
+        conn.commit()
+        if filas_ventas:
+            publicador_sse.marcar(descuento)
+            tocar_tablas('productos')
+        with _stock_lock:
+            _stock_metricas['ajustes_aplicados'] += len(descuento)
+            _stock_metricas['salidas_rechazadas'] += sum(1 for r in resultados if r.get('error', '').startswith('Stock'))
+        return jsonify(dict(resumen, resultados=resultados))
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+
 # ============ Movimientos ============
 @app.route('/api/movimientos')
 @require_auth
 def list_movimientos():
+    """
+    Historial de movimientos, del más reciente al más antiguo. Pagina por cursor sobre (created_at, id):
+    ?after_id= es el id de la última fila recibida y la página siguiente llega en X-Next-After-Id.
+    """
     producto_id = request.args.get('producto_id')
     tipo = request.args.get('tipo')
-    limit = min(int(request.args.get('limit') or 100), 500)
-    sql = """
-        SELECT m.id, m.producto_id, p.nombre AS producto_nombre, p.codigo AS producto_codigo,
-               m.tipo, m.cantidad, m.usuario_id, m.observaciones, m.created_at
-        FROM movimientos m
-        JOIN productos p ON p.id = m.producto_id
-        WHERE 1=1
-    """
+    after_id = request.args.get('after_id', type=int)
+    limit = max(1, min(request.args.get('limit', type=int) or PAGINA_DEFECTO, PAGINA_MAX))
+    where = " WHERE 1=1"
     params = []
     if producto_id:
-        sql += " AND m.producto_id = %s"
+        where += " AND m.producto_id = %s"
         params.append(producto_id)
     if tipo:
-        sql += " AND m.tipo = %s"
+        where += " AND m.tipo = %s"
         params.append(tipo)
-    sql += " ORDER BY m.created_at DESC LIMIT %s"
-    params.append(limit)
-    rows = db_execute(sql, tuple(params))
-    return jsonify(rows or [])
+    if after_id:
+        cursor = db_execute_one('SELECT created_at FROM movimientos WHERE id = %s', (after_id,))
+        if not cursor:
+            return jsonify({'error': 'after_id no corresponde a ningún movimiento'}), 400
+        where += " AND (m.created_at < %s OR (m.created_at = %s AND m.id < %s))"
+        params.extend([cursor['created_at'], cursor['created_at'], after_id])
+    params.append(limit + 1)
+    # La subconsulta recorre solo el índice (created_at / producto_id,created_at / tipo,created_at + id);
+    # las columnas completas se leen después únicamente para las filas de la página.
+    rows = db_execute("""
+        SELECT m.id, m.producto_id, p.nombre AS producto_nombre, p.codigo AS producto_codigo,
+               m.tipo, m.cantidad, m.usuario_id, m.observaciones, m.created_at
+        FROM (
+            SELECT m.id FROM movimientos m""" + where + """
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT %s
+        ) pagina
+        JOIN movimientos m ON m.id = pagina.id
+        JOIN productos p ON p.id = m.producto_id
+        ORDER BY m.created_at DESC, m.id DESC
+    """, tuple(params)) or []
+    return _respuesta_paginada(rows, limit)
+
+TIPOS_MOVIMIENTO = ('entrada_compra', 'entrada_devolucion', 'salida_venta', 'salida_baja')
 
 @app.route('/api/movimientos', methods=['POST'])
 @require_auth
@@ -596,27 +1178,25 @@ def create_movimiento():
         return jsonify({'error': 'Producto, tipo y cantidad (positiva) son obligatorios'}), 400
     if not observaciones:
         return jsonify({'error': 'Observaciones es obligatorio'}), 400
-    valid_types = ('entrada_compra', 'entrada_devolucion', 'salida_venta', 'salida_baja')
-    if tipo not in valid_types:
+    if tipo not in TIPOS_MOVIMIENTO:
         return jsonify({'error': 'tipo debe ser: entrada_compra, entrada_devolucion, salida_venta, salida_baja'}), 400
     conn = get_db()
     cur = conn.cursor()
     try:
+        delta = int(cantidad) if tipo.startswith('entrada_') else -int(cantidad)
+        if not _ajustar_stock(cur, producto_id, delta):
+            return _stock_no_aplicado(cur, producto_id)
         cur.execute('SELECT id, nombre, stock FROM productos WHERE id = %s', (producto_id,))
         prod = cur.fetchone()
-        if not prod:
-            return jsonify({'error': 'Producto no encontrado'}), 404
-        stock_actual = prod['stock'] or 0
-        delta = int(cantidad) if tipo.startswith('entrada_') else -int(cantidad)
-        nuevo_stock = stock_actual + delta
-        if nuevo_stock < 0:
-            return jsonify({'error': f'Stock insuficiente. Disponible: {stock_actual}'}), 400
+        nuevo_stock = prod['stock']
+        stock_actual = nuevo_stock - delta
         cur.execute(
             'INSERT INTO movimientos (producto_id, tipo, cantidad, usuario_id, observaciones) VALUES (%s, %s, %s, %s, %s)',
             (producto_id, tipo, cantidad, session.get('userId'), observaciones)
         )
-        cur.execute('UPDATE productos SET stock = %s WHERE id = %s', (nuevo_stock, producto_id))
         conn.commit()
+        publicador_sse.marcar((int(producto_id),))
+        tocar_tablas('productos')
         return jsonify({
             'message': 'Movimiento registrado',
             'producto': prod['nombre'],
@@ -631,23 +1211,484 @@ def create_movimiento():
     finally:
         cur.close()
 
+# --- Importación masiva (CSV / JSON lines) ---
+IMPORTAR_TAM_LOTE = int(os.getenv('IMPORTAR_TAM_LOTE', 500))
+IMPORTAR_MAX_ERRORES = 100
+
+def _lineas_stream(stream, tam_bloque=64 * 1024):
+    """Lee el cuerpo de la petición por bloques y entrega líneas de texto (con su salto de línea)."""
+    resto = b''
+    primero = True
+    while True:
+        bloque = stream.read(tam_bloque)
+        if not bloque:
+            break
+        if primero and bloque.startswith(b'\xef\xbb\xbf'):
+            bloque = bloque[3:]
+        primero = False
+        resto += bloque
+        *completas, resto = resto.split(b'\n')
+        for linea in completas:
+            yield linea.decode('utf-8') + '\n'
+    if resto:
+        yield resto.decode('utf-8')
+
+def _filas_csv(stream):
+    """(número de línea, dict) por fila de datos; la primera línea es la cabecera."""
+    lector = csv.DictReader(_lineas_stream(stream))
+    for fila in lector:
+        yield lector.line_num, {(k or '').strip().lower(): v for k, v in fila.items()}
+
+def _filas_ndjson(stream):
+    for num, linea in enumerate(_lineas_stream(stream), 1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            fila = None
+        yield num, fila if isinstance(fila, dict) else None
+
+def _importar_lote(conn, filas, usuario_id, obs_defecto, resumen):
+    """
+    Valida e inserta un lote de filas (num, dict) en una transacción: bloquea los productos del lote,
+    aplica las filas en orden contra el stock (una salida sin stock se rechaza) e inserta los movimientos
+    y el cambio neto de stock por producto en bloque.
+    """
+    def error(num, msg):
+        resumen['rechazadas'] += 1
+        if len(resumen['errores']) < IMPORTAR_MAX_ERRORES:
+            resumen['errores'].append({'fila': num, 'error': msg})
+        else:
+            resumen['errores_omitidos'] += 1
+
+    validas = []
+    ids, codigos = set(), set()
+    for num, fila in filas:
+        if fila is None:
+            error(num, 'Fila con formato inválido')
+            continue
+        tipo = str(fila.get('tipo') or '').strip()
+        if tipo not in TIPOS_MOVIMIENTO:
+            error(num, 'tipo debe ser: ' + ', '.join(TIPOS_MOVIMIENTO))
+            continue
+        try:
+            cantidad = int(fila.get('cantidad'))
+        except (TypeError, ValueError):
+            cantidad = 0
+        if cantidad <= 0:
+            error(num, 'cantidad debe ser un entero positivo')
+            continue
+        observaciones = str(fila.get('observaciones') or '').strip() or obs_defecto
+        if not observaciones:
+            error(num, 'Observaciones es obligatorio')
+            continue
+        producto_id = str(fila.get('producto_id') or '').strip()
+        codigo = str(fila.get('codigo') or '').strip()
+        if producto_id.isdigit():
+            ref = ('id', int(producto_id))
+            ids.add(int(producto_id))
+        elif codigo:
+            ref = ('codigo', codigo)
+            codigos.add(codigo)
+        else:
+            error(num, 'Falta producto_id o codigo')
+            continue
+        validas.append((num, ref, tipo, cantidad, observaciones))
+
+    cur = conn.cursor()
+    try:
+        condiciones, params = [], []
+        if ids:
+            condiciones.append('id IN (' + ', '.join(['%s'] * len(ids)) + ')')
+            params.extend(sorted(ids))
+        if codigos:
+            condiciones.append('codigo IN (' + ', '.join(['%s'] * len(codigos)) + ')')
+            params.extend(sorted(codigos))
+        por_id, por_codigo = {}, {}
+        if condiciones:
+            cur.execute(
+                'SELECT id, codigo, COALESCE(stock, 0) AS stock FROM productos WHERE '
+                + ' OR '.join(condiciones) + ' ORDER BY id FOR UPDATE',
+                tuple(params)
+            )
+            for r in cur.fetchall():
+                por_id[r['id']] = r
+                if r['codigo']:
+                    por_codigo[r['codigo']] = r
+        stock = {pid: r['stock'] for pid, r in por_id.items()}
+        neto = {}
+        movimientos = []
+        for num, (clase, valor), tipo, cantidad, observaciones in validas:
+            prod = por_id.get(valor) if clase == 'id' else por_codigo.get(valor)
+            if prod is None:
+                error(num, 'Producto no encontrado')
+                continue
+            pid = prod['id']
+            delta = cantidad if tipo.startswith('entrada_') else -cantidad
+            if stock[pid] + delta < 0:
+                error(num, f'Stock insuficiente. Disponible: {stock[pid]}')
+                continue
+            stock[pid] += delta
+            neto[pid] = neto.get(pid, 0) + delta
+            movimientos.append((pid, tipo, cantidad, usuario_id, observaciones))
+        if movimientos:
+            cur.executemany(
+                'INSERT INTO movimientos (producto_id, tipo, cantidad, usuario_id, observaciones) VALUES (%s, %s, %s, %s, %s)',
+                movimientos
+            )
+            cambios = [(pid, d) for pid, d in neto.items() if d != 0]
+            if cambios:
+                _update_por_lotes(cur, """
+                    UPDATE productos p JOIN ({valores}) v ON p.id = v.id
+                    SET p.stock = COALESCE(p.stock, 0) + v.delta
+                """, ('id', 'delta'), cambios)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    resumen['importadas'] += len(movimientos)
+    resumen['productos_afectados'].update(neto)
+    publicador_sse.marcar(neto)
+    resumen['lotes'] += 1
+
+@app.route('/api/movimientos/importar', methods=['POST'])
+@require_auth
+def importar_movimientos():
+    """
+    Importa movimientos desde un CSV (cabecera: producto_id o codigo, tipo, cantidad, observaciones)
+    o JSON lines (un objeto por línea con los mismos campos). El cuerpo se procesa a medida que llega,
+    en lotes de IMPORTAR_TAM_LOTE filas que se confirman por separado. ?observaciones= se usa en las
+    filas que no traen las suyas. Devuelve un resumen con los errores por fila.
+    """
+    formato = (request.args.get('formato') or '').lower()
+    if not formato:
+        tipo_contenido = (request.mimetype or '').lower()
+        formato = 'ndjson' if 'json' in tipo_contenido else 'csv'
+    if formato not in ('csv', 'ndjson', 'jsonl'):
+        return jsonify({'error': 'formato debe ser csv o ndjson'}), 400
+    filas = _filas_csv(request.stream) if formato == 'csv' else _filas_ndjson(request.stream)
+    obs_defecto = (request.args.get('observaciones') or '').strip()
+    resumen = {'filas': 0, 'importadas': 0, 'rechazadas': 0, 'lotes': 0,
+               'productos_afectados': set(), 'errores': [], 'errores_omitidos': 0}
+    inicio = time.perf_counter()
+    conn = get_db()
+    lote = []
+    try:
+        for num, fila in filas:
+            resumen['filas'] += 1
+            lote.append((num, fila))
+            if len(lote) >= IMPORTAR_TAM_LOTE:
+                _importar_lote(conn, lote, session.get('userId'), obs_defecto, resumen)
+                lote = []
+        if lote:
+            _importar_lote(conn, lote, session.get('userId'), obs_defecto, resumen)
+        codigo_estado = 200
+    except (UnicodeDecodeError, csv.Error) as e:
+        resumen['error'] = f'Archivo ilegible cerca de la fila {resumen["filas"]}: {e}'
+        codigo_estado = 400
+    except pymysql.err.MySQLError as e:
+        resumen['error'] = str(e)
+        codigo_estado = 500
+    if resumen['importadas']:
+        tocar_tablas('productos')
+    resumen['productos_afectados'] = len(resumen['productos_afectados'])
+    resumen['errores'].sort(key=lambda e: e['fila'])
+    resumen['segundos'] = round(time.perf_counter() - inicio, 3)
+    return jsonify(resumen), codigo_estado
+
+# ============ Exportación (streaming) ============
+# Las filas salen de un cursor sin búfer (SSDictCursor) directamente a la respuesta por bloques:
+# la memoria no depende del número de filas y el primer byte sale en cuanto MySQL empieza a devolver.
+EXPORTAR_TAM_BLOQUE = 1000
+
+_EXPORTACIONES = {
+    'movimientos': {
+        'sql': """
+            SELECT m.id, m.producto_id, p.codigo AS producto_codigo, p.nombre AS producto_nombre,
+                   m.tipo, m.cantidad, m.usuario_id, m.observaciones, m.created_at
+            FROM movimientos m
+            JOIN productos p ON p.id = m.producto_id
+        """,
+        'producto': 'm.producto_id', 'tipo': 'm.tipo', 'fecha': 'm.created_at', 'orden': 'm.id',
+    },
+    'ventas': {
+        'sql': """
+            SELECT v.id, v.producto_id, p.codigo AS producto_codigo, p.nombre AS producto_nombre,
+                   v.cantidad, v.monto_total, v.fecha_venta
+            FROM ventas v
+            JOIN productos p ON p.id = v.producto_id
+        """,
+        'producto': 'v.producto_id', 'tipo': None, 'fecha': 'v.fecha_venta', 'orden': 'v.id',
+    },
+    'fact_ventas': {
+        'sql': """
+            SELECT f.id_hecho, t.fecha, dp.id_fuente AS producto_id, dp.nombre AS producto, dp.categoria,
+                   s.nombre_sucursal AS sucursal, s.region, f.cantidad, f.monto_total
+            FROM fact_ventas f
+            JOIN dim_tiempo t ON t.sk_tiempo = f.sk_tiempo
+            JOIN dim_producto dp ON dp.sk_producto = f.sk_producto
+            JOIN dim_sucursal s ON s.sk_sucursal = f.sk_sucursal
+        """,
+        'producto': 'dp.id_fuente', 'tipo': None, 'fecha': 't.fecha', 'orden': 'f.id_hecho',
+    },
+}
+
+def _valor_exportable(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    return v
+
+class _Linea:
+    """Destino de csv.writer que devuelve la línea escrita en lugar de acumularla."""
+    def write(self, texto):
+        return texto
+
+@app.route('/api/exportar/<recurso>')
+@require_auth
+def exportar(recurso):
+    """
+    Exporta el historial completo de movimientos, ventas o fact_ventas como CSV o NDJSON (?formato=).
+    Filtros opcionales: producto_id, tipo (solo movimientos), desde y hasta (YYYY-MM-DD, inclusive).
+    """
+    conf = _EXPORTACIONES.get(recurso)
+    if conf is None:
+        return jsonify({'error': 'recurso debe ser: ' + ', '.join(_EXPORTACIONES)}), 404
+    formato = (request.args.get('formato') or 'csv').lower()
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'error': 'formato debe ser csv o ndjson'}), 400
+    condiciones, params = [], []
+    producto_id = request.args.get('producto_id', type=int)
+    if producto_id:
+        condiciones.append(f"{conf['producto']} = %s")
+        params.append(producto_id)
+    tipo = request.args.get('tipo')
+    if tipo:
+        if not conf['tipo']:
+            return jsonify({'error': 'El filtro tipo solo aplica a movimientos'}), 400
+        if tipo not in TIPOS_MOVIMIENTO:
+            return jsonify({'error': 'tipo debe ser: ' + ', '.join(TIPOS_MOVIMIENTO)}), 400
+        condiciones.append(f"{conf['tipo']} = %s")
+        params.append(tipo)
+    try:
+        desde = date.fromisoformat(request.args['desde']) if request.args.get('desde') else None
+        hasta = date.fromisoformat(request.args['hasta']) if request.args.get('hasta') else None
+    except ValueError:
+        return jsonify({'error': 'desde/hasta deben tener formato YYYY-MM-DD'}), 400
+    if desde:
+        condiciones.append(f"{conf['fecha']} >= %s")
+        params.append(desde)
+    if hasta:
+        condiciones.append(f"{conf['fecha']} < %s")
+        params.append(hasta + timedelta(days=1))
+    sql = conf['sql'] + (' WHERE ' + ' AND '.join(condiciones) if condiciones else '') + f" ORDER BY {conf['orden']}"
+
+    # Conexión propia del pool: la respuesta sigue generándose después de que la vista retorna
+    pool = get_pool()
+    conn = pool.obtener()
+    try:
+        cur = conn.cursor(SSDictCursor)
+        cur.execute('SET SESSION net_write_timeout = 600')
+        cur.execute(sql, tuple(params))
+    except Exception:
+        pool.descartar(conn)
+        raise
+
+    liberada = []
+
+    def liberar(completo):
+        if liberada:
+            return
+        liberada.append(True)
+        if not completo:
+            # Cliente desconectado o error: cerrar el cursor obligaría a leer el resto de filas
+            pool.descartar(conn)
+            return
+        try:
+            cur.close()
+            with conn.cursor() as c:
+                c.execute('SET SESSION net_write_timeout = DEFAULT')
+            pool.devolver(conn)
+        except Exception:
+            pool.descartar(conn)
+
+    def generar():
+        completo = False
+        try:
+            columnas = [d[0] for d in cur.description]
+            escritor = csv.writer(_Linea())
+            if formato == 'csv':
+                yield escritor.writerow(columnas)
+            while True:
+                filas = cur.fetchmany(EXPORTAR_TAM_BLOQUE)
+                if not filas:
+                    break
+                if formato == 'csv':
+                    yield ''.join(escritor.writerow([_valor_exportable(f[c]) for c in columnas]) for f in filas)
+                else:
+                    yield ''.join(json.dumps({c: _valor_exportable(f[c]) for c in columnas}, ensure_ascii=False) + '\n'
+                                  for f in filas)
+            completo = True
+        finally:
+            liberar(completo)
+
+    nombre = f"{recurso}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    resp = Response(stream_with_context(generar()), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    # Si la respuesta se cierra sin haber empezado a generarse, la conexión se libera igual
+    resp.call_on_close(lambda: liberar(False))
+    return resp
+
 # ============ Dashboard métricas ============
+# Los contadores viven en contadores_dashboard (16 filas que mantienen los triggers de productos y
+# pedidos en la misma transacción de cada escritura). Leerlos cuesta lo mismo con 100 o 1M de productos.
+_SQL_CONTADORES = """
+    SELECT COALESCE(SUM(productos_agotados), 0) AS productos_agotados,
+           COALESCE(SUM(pedidos_pendientes), 0) AS pedidos_pendientes,
+           COALESCE(SUM(total_productos), 0) AS total_productos,
+           COALESCE(SUM(total_unidades), 0) AS total_unidades
+    FROM contadores_dashboard
+"""
+
+def _contar_metricas(cur):
+    """Valores reales recorriendo productos y pedidos (para reconciliar, o si no hay contadores)."""
+    cur.execute("""
+        SELECT COUNT(*) AS total_productos, COALESCE(SUM(stock), 0) AS total_unidades,
+               COALESCE(SUM(COALESCE(stock, 0) = 0), 0) AS productos_agotados
+        FROM productos
+    """)
+    productos = cur.fetchone() or {}
+    cur.execute("SELECT COUNT(*) AS total FROM pedidos WHERE estado IN ('pendiente', 'parcial')")
+    pendientes = cur.fetchone() or {}
+    return {
+        'productos_agotados': int(productos.get('productos_agotados') or 0),
+        'pedidos_pendientes': int(pendientes.get('total') or 0),
+        'total_productos': int(productos.get('total_productos') or 0),
+        'total_unidades': int(productos.get('total_unidades') or 0),
+    }
+
+def _leer_contadores(cur):
+    """Suma de los contadores mantenidos, o None si la tabla aún no existe (falta la migración)."""
+    try:
+        cur.execute(_SQL_CONTADORES)
+    except pymysql.err.ProgrammingError as e:
+        if e.args and e.args[0] == 1146:
+            return None
+        raise
+    fila = cur.fetchone() or {}
+    return {k: int(fila.get(k) or 0) for k in ('productos_agotados', 'pedidos_pendientes', 'total_productos', 'total_unidades')}
+
+def _calcular_metricas(cur):
+    """Métricas del panel principal (las comparten /api/dashboard/metricas y el canal SSE)."""
+    valores = _leer_contadores(cur) or _contar_metricas(cur)
+    total_p = valores['total_productos']
+    total_u = valores['total_unidades']
+    return {
+        'productos_agotados': valores['productos_agotados'],
+        'ordenes_pendientes_surtir': valores['pedidos_pendientes'],
+        'total_productos': total_p,
+        'total_unidades': total_u,
+        'ocupacion_almacen': f'{total_p} productos, {total_u} unidades' if total_p else 'Sin datos'
+    }
+
+# --- Reconciliación de contadores ---
+CONTADORES_RECONCILIAR_S = float(os.getenv('CONTADORES_RECONCILIAR_S', 600))
+_reconciliacion_lock = threading.Lock()
+_reconciliacion = {'ejecuciones': 0, 'derivas_corregidas': 0, 'ultima': None, 'ultima_deriva': None, 'errores': 0}
+_reconciliador = None
+
+def _reconciliar_contadores(conn):
+    """
+    Compara los contadores con un recuento real y los corrige si se desviaron.
+    Contadores y recuento se leen en la misma instantánea (lectura consistente, sin bloqueos), así que
+    los recorridos no frenan ninguna escritura. La desviación se suma a la fila 0 en una transacción
+    corta: las escrituras posteriores a la instantánea ya aplicaron su propio incremento.
+    """
+    cur = conn.cursor()
+    try:
+        conn.rollback()
+        cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        cur.execute('START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY')
+        guardado = _leer_contadores(cur)
+        if guardado is None:
+            conn.rollback()
+            return {'error': 'No existe la tabla contadores_dashboard (ejecuta migracion-rendimiento.sql)'}
+        real = _contar_metricas(cur)
+        conn.commit()
+        deriva = {k: real[k] - guardado[k] for k in real if real[k] != guardado[k]}
+        if deriva:
+            cur.execute('UPDATE contadores_dashboard SET productos_agotados = productos_agotados + %s, '
+                        'pedidos_pendientes = pedidos_pendientes + %s, total_productos = total_productos + %s, '
+                        'total_unidades = total_unidades + %s WHERE slot = 0',
+                        tuple(deriva.get(k, 0) for k in ('productos_agotados', 'pedidos_pendientes', 'total_productos', 'total_unidades')))
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    ahora = datetime.now().replace(microsecond=0)
+    with _reconciliacion_lock:
+        _reconciliacion['ejecuciones'] += 1
+        _reconciliacion['ultima'] = ahora
+        if deriva:
+            _reconciliacion['derivas_corregidas'] += 1
+            _reconciliacion['ultima_deriva'] = {'fecha': ahora, 'diferencias': deriva}
+    if deriva:
+        app.logger.warning('Contadores del panel desajustados, corregidos: %s', deriva)
+        publicador_sse.marcar()
+    return {'corregido': bool(deriva), 'deriva': deriva, 'valores': real}
+
+def _bucle_reconciliacion():
+    while True:
+        time.sleep(CONTADORES_RECONCILIAR_S)
+        pool = get_pool()
+        try:
+            conn = pool.obtener()
+        except Exception:
+            with _reconciliacion_lock:
+                _reconciliacion['errores'] += 1
+            continue
+        try:
+            _reconciliar_contadores(conn)
+        except pymysql.err.OperationalError:
+            pool.descartar(conn)
+            conn = None
+            with _reconciliacion_lock:
+                _reconciliacion['errores'] += 1
+        except Exception:
+            app.logger.exception('Error al reconciliar contadores del panel')
+            with _reconciliacion_lock:
+                _reconciliacion['errores'] += 1
+        if conn is not None:
+            pool.devolver(conn)
+
+def _iniciar_reconciliador():
+    """El hilo arranca con la primera lectura del panel, no al importar la app."""
+    global _reconciliador
+    if _reconciliador is not None or CONTADORES_RECONCILIAR_S <= 0:
+        return
+    with _reconciliacion_lock:
+        if _reconciliador is None:
+            _reconciliador = threading.Thread(target=_bucle_reconciliacion, name='reconciliar-contadores', daemon=True)
+            _reconciliador.start()
+
 @app.route('/api/dashboard/metricas')
 @require_auth
 def dashboard_metricas():
+    _iniciar_reconciliador()
     try:
-        agotados = db_execute_one('SELECT COUNT(*) AS total FROM productos WHERE COALESCE(stock, 0) = 0') or {}
-        pendientes = db_execute_one("SELECT COUNT(*) AS total FROM pedidos WHERE estado IN ('pendiente', 'parcial')") or {}
-        ocupacion = db_execute_one('SELECT COUNT(*) AS total_productos, COALESCE(SUM(stock), 0) AS total_unidades FROM productos') or {}
-        total_p = int(ocupacion.get('total_productos') or 0)
-        total_u = int(ocupacion.get('total_unidades') or 0)
-        return jsonify({
-            'productos_agotados': int(agotados.get('total') or 0),
-            'ordenes_pendientes_surtir': int(pendientes.get('total') or 0),
-            'total_productos': total_p,
-            'total_unidades': total_u,
-            'ocupacion_almacen': f'{total_p} productos, {total_u} unidades' if total_p else 'Sin datos'
-        })
+        cur = get_db().cursor()
+        try:
+            return jsonify(_calcular_metricas(cur))
+        finally:
+            cur.close()
     except Exception as e:
         app.logger.exception('Error en dashboard metricas')
         return jsonify({
@@ -658,29 +1699,109 @@ def dashboard_metricas():
             'ocupacion_almacen': 'Error al cargar'
         }), 200
 
+# ============ Eventos (SSE) ============
+# Las escrituras avisan al publicador; un único hilo calcula métricas, alertas y stock cambiado y lo
+# reparte a todos los navegadores conectados. Cada conexión SSE ocupa un hilo del servidor mientras
+# está abierta, así que requiere un servidor con hilos (app.run o gunicorn --threads / gevent).
+difusor_sse = Difusor(max_cola=int(os.getenv('SSE_MAX_COLA', 100)), latido=int(os.getenv('SSE_LATIDO', 15)))
+_estado_sse = {'metricas': None, 'alertas': None}
+
+def _publicar_cambios(ids, forzar=False):
+    """`forzar`: hay un cliente nuevo y el difusor pudo haber olvidado el último estado (se queda sin
+    clientes): métricas y alertas se publican aunque no hayan cambiado desde el último envío."""
+    pool = get_pool()
+    conn = pool.obtener()
+    try:
+        cur = conn.cursor()
+        try:
+            metricas = _calcular_metricas(cur)
+            cur.execute("""
+                SELECT p.id, p.nombre, p.codigo, c.nombre AS categoria, p.stock, p.punto_reorden
+                FROM productos p
+                LEFT JOIN categorias c ON p.categoria_id = c.id
+                WHERE p.bajo_stock = 1
+                ORDER BY p.stock ASC
+            """)
+            alertas = cur.fetchall()
+            cambios = []
+            if ids:
+                lista = sorted(ids)
+                cur.execute('SELECT id, nombre, stock, bajo_stock FROM productos WHERE id IN ('
+                            + ', '.join(['%s'] * len(lista)) + ')', tuple(lista))
+                cambios = cur.fetchall()
+        finally:
+            cur.close()
+    except pymysql.err.OperationalError:
+        pool.descartar(conn)
+        raise
+    pool.devolver(conn)
+
+    if cambios:
+        difusor_sse.publicar('stock', cambios)
+    actuales = {a['id']: a for a in alertas}
+    previas = _estado_sse['alertas']
+    if forzar or previas is None or actuales != previas:
+        difusor_sse.publicar('alertas', {
+            'total': len(alertas),
+            'lista': alertas,
+            # Productos que cruzaron el punto de reorden desde el último aviso
+            'entran': [i for i in actuales if previas is not None and i not in previas],
+            'salen': [i for i in (previas or {}) if i not in actuales],
+        })
+        _estado_sse['alertas'] = actuales
+    if forzar or metricas != _estado_sse['metricas']:
+        difusor_sse.publicar('metricas', metricas)
+        _estado_sse['metricas'] = metricas
+
+publicador_sse = Publicador(difusor_sse, _publicar_cambios, retraso=float(os.getenv('SSE_RETRASO', 0.5)))
+
+@app.route('/api/eventos')
+@require_auth
+def eventos():
+    """Canal SSE: eventos metricas, alertas y stock."""
+    # Sin clientes el último estado no se conserva: se recalcula para quien acaba de conectarse
+    publicador_sse.marcar(forzar=True)
+    resp = Response(difusor_sse.suscribir(('metricas', 'alertas')), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
 # ============ Pedidos ============
 @app.route('/api/pedidos')
 @require_auth
 def list_pedidos():
     estado = request.args.get('estado')
     producto_id = request.args.get('producto_id')
-    sql = """
-        SELECT pd.id, pd.producto_id, p.nombre AS producto_nombre, p.codigo, p.stock,
-               pd.cantidad_solicitada, pd.cantidad_asignada, pd.estado, pd.prioridad, pd.cliente_ref, pd.fecha_solicitud
-        FROM pedidos pd
-        JOIN productos p ON p.id = pd.producto_id
-        WHERE 1=1
-    """
+    after_id, limit, paginar = _params_paginacion()
+    campos, err = _proyeccion(_CAMPOS_PEDIDO)
+    if err:
+        return jsonify({'error': err}), 400
+    where = " WHERE 1=1"
     params = []
     if estado:
-        sql += " AND pd.estado = %s"
+        where += " AND pd.estado = %s"
         params.append(estado)
     if producto_id:
-        sql += " AND pd.producto_id = %s"
+        where += " AND pd.producto_id = %s"
         params.append(producto_id)
-    sql += " ORDER BY pd.fecha_solicitud DESC"
-    rows = db_execute(sql, tuple(params) if params else None)
-    return jsonify(rows or [])
+    desde = " FROM pedidos pd JOIN productos p ON p.id = pd.producto_id"
+    total = None
+    if _quiere_total():
+        total = db_execute_one('SELECT COUNT(*) AS total' + desde + where, tuple(params))['total']
+    sql = 'SELECT ' + campos + desde + where
+    if after_id:
+        # Cursor sobre (fecha_solicitud, id): orden estable aunque varios pedidos compartan fecha
+        cursor = db_execute_one('SELECT fecha_solicitud FROM pedidos WHERE id = %s', (after_id,))
+        if not cursor:
+            return jsonify({'error': 'after_id no corresponde a ningún pedido'}), 400
+        sql += " AND (pd.fecha_solicitud < %s OR (pd.fecha_solicitud = %s AND pd.id < %s))"
+        params.extend([cursor['fecha_solicitud'], cursor['fecha_solicitud'], after_id])
+    sql += " ORDER BY pd.fecha_solicitud DESC, pd.id DESC"
+    if paginar:
+        sql += " LIMIT %s"
+        params.append(limit + 1)
+    rows = db_execute(sql, tuple(params) if params else None) or []
+    return _respuesta_paginada(rows, limit if paginar else None, total)
 
 @app.route('/api/pedidos', methods=['POST'])
 @require_auth
@@ -703,6 +1824,7 @@ def create_pedido():
         (producto_id, cantidad_solicitada, int(prioridad), cliente_ref, session.get('userId'))
     )
     conn.commit()
+    tocar_tablas('pedidos')
     row = db_execute_one('SELECT * FROM pedidos WHERE id = %s', (cur.lastrowid,))
     cur.close()
     return jsonify(row), 201
@@ -710,6 +1832,7 @@ def create_pedido():
 # ============ Reglas asignación ============
 @app.route('/api/reglas-asignacion')
 @require_auth
+@respuesta_condicional('reglas_asignacion')
 def list_reglas():
     rows = db_execute('SELECT * FROM reglas_asignacion ORDER BY activo DESC, id')
     return jsonify(rows or [])
@@ -731,53 +1854,36 @@ def update_regla(id):
         (nombre, criterio, activo, id),
         commit=True
     )
+    tocar_tablas('reglas_asignacion')
     row = db_execute_one('SELECT * FROM reglas_asignacion WHERE id = %s', (id,))
     if not row:
         return jsonify({'error': 'Regla no encontrada'}), 404
     return jsonify(row)
 
 # ============ Motor asignación (Python) ============
-@app.route('/api/asignacion/ejecutar', methods=['POST'])
-@require_auth
-def ejecutar_asignacion():
-    data = request.get_json() or {}
-    producto_id = data.get('producto_id')
-    if not producto_id:
-        return jsonify({'error': 'producto_id es obligatorio'}), 400
-    prod = db_execute_one('SELECT id, nombre, stock FROM productos WHERE id = %s', (producto_id,))
-    if not prod:
-        return jsonify({'error': 'Producto no encontrado'}), 404
-    pedidos = db_execute(
-        "SELECT id, cantidad_solicitada, cantidad_asignada, prioridad, fecha_solicitud FROM pedidos WHERE producto_id = %s AND estado IN ('pendiente', 'parcial') ORDER BY id",
-        (producto_id,)
-    )
+def _criterio_activo():
     regla = db_execute_one('SELECT criterio FROM reglas_asignacion WHERE activo = 1 LIMIT 1')
-    criterio = (regla and regla.get('criterio')) or 'prioridad_fifo'
-    stock_disp = prod['stock'] or 0
-    pedidos_list = [{'id': r['id'], 'cantidad_solicitada': r['cantidad_solicitada'], 'cantidad_asignada': r['cantidad_asignada'] or 0, 'prioridad': r['prioridad'] or 0, 'fecha_solicitud': r['fecha_solicitud'].isoformat() if hasattr(r['fecha_solicitud'], 'isoformat') else str(r['fecha_solicitud'])} for r in (pedidos or [])]
-    if not pedidos_list:
-        return jsonify({'message': 'No hay pedidos pendientes para este producto', 'asignaciones': []})
-    script_dir = os.path.join(os.path.dirname(__file__), 'scripts', 'asignacion_engine.py')
-    inp = json.dumps({'producto_id': producto_id, 'stock_disponible': stock_disp, 'criterio': criterio, 'pedidos': pedidos_list})
-    try:
-        proc = subprocess.run(
-            ['python3', script_dir],
-            input=inp,
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-    except Exception as e:
-        return jsonify({'error': 'Error en motor de asignación: ' + str(e)}), 500
-    if proc.returncode != 0:
-        return jsonify({'error': 'Error en motor de asignación: ' + (proc.stderr or proc.stdout or str(proc.returncode))}), 500
-    try:
-        asignaciones = json.loads(proc.stdout)
-    except json.JSONDecodeError:
-        return jsonify({'error': 'Respuesta inválida del motor de asignación'}), 500
-    conn = get_db()
+    return (regla and regla.get('criterio')) or 'prioridad_fifo'
+
+def _asignar_producto(conn, producto_id, criterio, avance=None):
+    """Asignación de un producto. Bloquea el producto y sus pedidos abiertos hasta el commit."""
     cur = conn.cursor()
     try:
+        cur.execute('SELECT id, nombre, stock FROM productos WHERE id = %s FOR UPDATE', (producto_id,))
+        prod = cur.fetchone()
+        if not prod:
+            conn.rollback()
+            return {'message': 'Producto no encontrado', 'asignaciones': []}
+        stock_disp = prod['stock'] or 0
+        cur.execute(
+            "SELECT id, cantidad_solicitada, cantidad_asignada, prioridad, fecha_solicitud FROM pedidos WHERE producto_id = %s AND estado IN ('pendiente', 'parcial') ORDER BY id FOR UPDATE",
+            (producto_id,)
+        )
+        pedidos = cur.fetchall()
+        if not pedidos:
+            conn.rollback()
+            return {'message': 'No hay pedidos pendientes para este producto', 'asignaciones': []}
+        asignaciones = asignacion_engine.asignar(pedidos, stock_disp, criterio)
         stock_restante = stock_disp
         total_asignado = 0
         for a in asignaciones:
@@ -792,90 +1898,358 @@ def ejecutar_asignacion():
             total_asignado += cant
         cur.execute('UPDATE productos SET stock = stock - %s WHERE id = %s', (total_asignado, producto_id))
         conn.commit()
-    except Exception as e:
+        if avance:
+            avance(filas=len(pedidos))
+        publicador_sse.marcar((int(producto_id),))
+        tocar_tablas('productos', 'pedidos')
+        return {'message': 'Asignación ejecutada', 'criterio': criterio, 'total_asignado': total_asignado, 'asignaciones': asignaciones}
+    except Exception:
         conn.rollback()
-        return jsonify({'error': str(e)}), 500
+        raise
     finally:
         cur.close()
-    return jsonify({'message': 'Asignación ejecutada', 'asignaciones': asignaciones})
 
-# ============ OLAP (simplificado: requiere dim_tiempo poblado) ============
-def _ensure_dim_tiempo(fecha):
-    """Asegura que la fecha exista en dim_tiempo."""
-    d = fecha.date() if hasattr(fecha, 'date') else fecha
-    exists = db_execute_one('SELECT sk_tiempo FROM dim_tiempo WHERE fecha = %s', (d,))
-    if exists:
-        return exists['sk_tiempo']
-    dt = d if isinstance(d, date) else date.fromisoformat(str(d)[:10])
-    nombres_mes = ('', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre')
-    dias = ('Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo')
-    dia_semana = dias[dt.weekday()]
-    db_execute(
-        'INSERT INTO dim_tiempo (fecha, anio, mes, trimestre, nombre_mes, nombre_dia_semana) VALUES (%s, %s, %s, %s, %s, %s)',
-        (d, dt.year, dt.month, (dt.month - 1) // 3 + 1, nombres_mes[dt.month], dia_semana),
-        commit=True
-    )
-    r = db_execute_one('SELECT sk_tiempo FROM dim_tiempo WHERE fecha = %s', (d,))
-    return r['sk_tiempo']
+def _trabajo_asignar_producto(trabajo):
+    producto_id = trabajo.parametros['producto_id']
+    return _asignar_producto(get_db(), producto_id, _criterio_activo(), avance=trabajo.avance)
 
-@app.route('/api/olap/refrescar-cubo', methods=['POST'])
+ejecutor_trabajos.registrar('asignacion_producto', _trabajo_asignar_producto)
+
+@app.route('/api/asignacion/ejecutar', methods=['POST'])
 @require_auth
-def olap_refrescar():
+def ejecutar_asignacion():
+    """Encola la asignación de un producto; el resultado queda en GET /api/trabajos/<id>."""
+    data = request.get_json() or {}
+    producto_id = data.get('producto_id')
+    if not producto_id:
+        return jsonify({'error': 'producto_id es obligatorio'}), 400
+    prod = db_execute_one('SELECT id FROM productos WHERE id = %s', (producto_id,))
+    if not prod:
+        return jsonify({'error': 'Producto no encontrado'}), 404
+    return _encolar_trabajo('asignacion_producto', {'producto_id': prod['id']})
+
+def _update_por_lotes(cur, plantilla, columnas, filas, tam_lote=500):
+    """
+    Ejecuta un UPDATE ... JOIN contra una tabla derivada con las filas dadas, en lotes.
+    `plantilla` lleva {valores}, que se sustituye por la tabla derivada con las `columnas` indicadas.
+    """
+    afectadas = 0
+    for i in range(0, len(filas), tam_lote):
+        lote = filas[i:i + tam_lote]
+        primera = 'SELECT ' + ', '.join(f'%s AS {c}' for c in columnas)
+        resto = ' UNION ALL SELECT ' + ', '.join(['%s'] * len(columnas))
+        derivada = primera + resto * (len(lote) - 1)
+        cur.execute(plantilla.format(valores=derivada), tuple(v for fila in lote for v in fila))
+        afectadas += cur.rowcount
+    return afectadas
+
+def _asignar_todos_los_productos(conn, criterio, avance=None):
+    """
+    Asignación masiva: lee en un solo recorrido todos los pedidos pendientes/parciales de productos
+    con stock, ejecuta el motor por producto y escribe pedidos y stock con UPDATE por lotes
+    en una sola transacción. Devuelve el resumen por producto.
+    """
+    cur = conn.cursor()
     try:
-        # Sincronizar dim_producto
-        db_execute("""
-            INSERT INTO dim_producto (id_fuente, nombre, categoria)
-            SELECT p.id, TRIM(p.nombre), TRIM(COALESCE(c.nombre, 'Sin categoría'))
-            FROM productos p
-            LEFT JOIN categorias c ON p.categoria_id = c.id
-            ON DUPLICATE KEY UPDATE nombre = VALUES(nombre), categoria = VALUES(categoria)
-        """, commit=True)
-        # Para cada venta no cargada, obtener sk_producto, sk_tiempo, insertar en fact_ventas
-        ventas = db_execute("""
-            SELECT v.id, v.producto_id, v.cantidad, v.monto_total, v.fecha_venta
-            FROM ventas v
+        cur.execute("""
+            SELECT pd.id, pd.producto_id, pd.cantidad_solicitada, pd.cantidad_asignada, pd.prioridad,
+                   pd.fecha_solicitud, p.nombre AS producto_nombre, p.stock
+            FROM pedidos pd
+            JOIN productos p ON p.id = pd.producto_id
+            WHERE pd.estado IN ('pendiente', 'parcial') AND p.stock > 0
+            ORDER BY pd.producto_id, pd.id
+            FOR UPDATE
         """)
-        for v in (ventas or []):
-            sk_p = db_execute_one('SELECT sk_producto FROM dim_producto WHERE id_fuente = %s', (v['producto_id'],))
-            if not sk_p:
-                continue
-            sk_t = _ensure_dim_tiempo(v['fecha_venta'])
-            sk_s = db_execute_one('SELECT sk_sucursal FROM dim_sucursal ORDER BY RAND() LIMIT 1')
-            if not sk_s:
-                continue
-            sk_s = sk_s['sk_sucursal']
-            try:
-                db_execute(
+        filas = cur.fetchall()
+        resumen = []
+        upd_pedidos = []
+        upd_stock = []
+        procesados = 0
+        for producto_id, grupo in groupby(filas, key=lambda r: r['producto_id']):
+            grupo = list(grupo)
+            procesados += len(grupo)
+            stock_disp = grupo[0]['stock'] or 0
+            por_id = {r['id']: r for r in grupo}
+            asignaciones = asignacion_engine.asignar(grupo, stock_disp, criterio)
+            stock_restante = stock_disp
+            total_asignado = 0
+            for a in asignaciones:
+                cant = min(a.get('cantidad_asignada', 0), stock_restante)
+                if cant <= 0:
+                    continue
+                r = por_id[a['pedido_id']]
+                nueva = (r['cantidad_asignada'] or 0) + cant
+                upd_pedidos.append((r['id'], nueva, 'surtido' if nueva >= r['cantidad_solicitada'] else 'parcial'))
+                stock_restante -= cant
+                total_asignado += cant
+            if total_asignado:
+                upd_stock.append((producto_id, total_asignado))
+            resumen.append({
+                'producto_id': producto_id,
+                'producto': grupo[0]['producto_nombre'],
+                'stock_inicial': stock_disp,
+                'total_asignado': total_asignado,
+                'stock_restante': stock_restante,
+                'pedidos_pendientes': len(grupo),
+                'asignaciones': len([a for a in asignaciones if a.get('cantidad_asignada', 0) > 0]),
+            })
+            if avance:
+                # El 90 % es el cálculo; el resto, las escrituras por lotes
+                avance(filas=procesados, progreso=90 * procesados / len(filas))
+        _update_por_lotes(
+            cur,
+            'UPDATE pedidos pd JOIN ({valores}) a ON a.id = pd.id SET pd.cantidad_asignada = a.asignada, pd.estado = a.estado',
+            ('id', 'asignada', 'estado'), upd_pedidos
+        )
+        _update_por_lotes(
+            cur,
+            'UPDATE productos p JOIN ({valores}) a ON a.id = p.id SET p.stock = p.stock - a.cant',
+            ('id', 'cant'), upd_stock
+        )
+        conn.commit()
+        publicador_sse.marcar(pid for pid, _ in upd_stock)
+        tocar_tablas('productos', 'pedidos')
+        return resumen
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def _trabajo_asignar_todos(trabajo):
+    criterio = _criterio_activo()
+    resumen = _asignar_todos_los_productos(get_db(), criterio, avance=trabajo.avance)
+    return {
+        'message': 'Asignación masiva ejecutada',
+        'criterio': criterio,
+        'productos_procesados': len(resumen),
+        'total_asignado': sum(r['total_asignado'] for r in resumen),
+        'productos': resumen,
+    }
+
+ejecutor_trabajos.registrar('asignacion_masiva', _trabajo_asignar_todos, exclusivo=True)
+
+@app.route('/api/asignacion/ejecutar-todos', methods=['POST'])
+@require_auth
+def ejecutar_asignacion_todos():
+    """Encola la asignación de todos los productos con pedidos pendientes (una sola transacción)."""
+    return _encolar_trabajo('asignacion_masiva')
+
+# ============ OLAP (simplificado: requiere dim_tiempo poblado) ============
+ETL_PROCESO_FACT = 'Carga Fact Ventas'
+ETL_TAM_LOTE = int(os.getenv('ETL_TAM_LOTE', 2000))
+
+def _etl_cargar_ventas(conn, tam_lote=ETL_TAM_LOTE, avance=None):
+    """
+    ETL incremental ventas → fact_ventas.
+    Carga solo las ventas con id mayor a la marca de agua guardada en etl_log, resuelve las claves
+    sustitutas con los mapas en memoria de `dim_cache` y escribe los hechos en lotes (INSERT multi-fila).
+    Cada lote se confirma junto con la nueva marca de agua, así una ejecución interrumpida se reanuda.
+    """
+    inicio = time.perf_counter()
+    cur = conn.cursor()
+    try:
+        productos_sk = dim_cache.productos(conn)
+        sucursales = dim_cache.sucursales(conn)
+        cur.execute('SELECT COALESCE(MAX(ultimo_id_fuente), 0) AS wm FROM etl_log WHERE proceso = %s', (ETL_PROCESO_FACT,))
+        marca = cur.fetchone()['wm']
+        cur.execute(
+            'INSERT INTO etl_log (proceso, registros_procesados, registros_exitosos, registros_fallidos, estado, ultimo_id_fuente) VALUES (%s, 0, 0, 0, %s, %s)',
+            (ETL_PROCESO_FACT, 'EN_PROCESO', marca)
+        )
+        log_id = cur.lastrowid
+        conn.commit()
+        if not sucursales:
+            cur.execute("UPDATE etl_log SET estado = 'SIN_SUCURSALES' WHERE id = %s", (log_id,))
+            conn.commit()
+            return {'procesadas': 0, 'insertadas': 0, 'fallidas': 0, 'marca_agua': marca, 'segundos': 0.0, 'filas_por_segundo': 0.0}
+        procesadas = insertadas = fallidas = 0
+        pendientes = 0
+        if avance:
+            cur.execute('SELECT COUNT(*) AS n FROM ventas WHERE id > %s', (marca,))
+            pendientes = cur.fetchone()['n']
+        while True:
+            cur.execute("""
+                SELECT id, producto_id, cantidad, monto_total, DATE(fecha_venta) AS fecha
+                FROM ventas
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (marca, tam_lote))
+            lote = cur.fetchall()
+            if not lote:
+                break
+            if any(v['producto_id'] not in productos_sk for v in lote):
+                productos_sk = dim_cache.sincronizar_productos(conn)
+            tiempo_sk = dim_cache.asegurar_fechas(conn, {v['fecha'] for v in lote if v['fecha']})
+            filas = []
+            for v in lote:
+                sk_p = productos_sk.get(v['producto_id'])
+                sk_t = tiempo_sk.get(v['fecha'])
+                if sk_p and sk_t:
+                    filas.append((sk_p, sk_t, random.choice(sucursales), v['cantidad'], v['monto_total']))
+            if filas:
+                cur.executemany(
                     'INSERT IGNORE INTO fact_ventas (sk_producto, sk_tiempo, sk_sucursal, cantidad, monto_total) VALUES (%s, %s, %s, %s, %s)',
-                    (sk_p['sk_producto'], sk_t, sk_s, v['cantidad'], v['monto_total']),
-                    commit=True
+                    filas
                 )
-            except Exception:
-                pass
-        return jsonify({'message': 'Cubo OLAP actualizado exitosamente', 'timestamp': datetime.utcnow().isoformat() + 'Z'})
-    except Exception as e:
-        return jsonify({'error': 'Error al refrescar el cubo OLAP: ' + str(e)}), 500
+                insertadas += cur.rowcount
+            procesadas += len(lote)
+            fallidas += len(lote) - len(filas)
+            marca = lote[-1]['id']
+            cur.execute(
+                'UPDATE etl_log SET registros_procesados = %s, registros_exitosos = %s, registros_fallidos = %s, ultimo_id_fuente = %s WHERE id = %s',
+                (procesadas, insertadas, fallidas, marca, log_id)
+            )
+            conn.commit()
+            if avance:
+                avance(procesadas, pendientes)
+        cur.execute("UPDATE etl_log SET estado = 'EXITOSO' WHERE id = %s", (log_id,))
+        conn.commit()
+        segundos = time.perf_counter() - inicio
+        return {
+            'procesadas': procesadas,
+            'insertadas': insertadas,
+            'fallidas': fallidas,
+            'marca_agua': marca,
+            'segundos': round(segundos, 3),
+            'filas_por_segundo': round(procesadas / segundos, 1) if segundos > 0 else 0.0,
+            'cache_dimensiones': dim_cache.estadisticas(),
+        }
+    except Exception:
+        conn.rollback()
+        dim_cache.invalidar()
+        raise
+    finally:
+        cur.close()
+
+ETL_PROCESO_AGREGADOS = 'Agregados OLAP'
+
+# Agregados materializados (ver sql/schema-mysql.sql). Sus columnas de periodo salen de dim_tiempo.
+_AGREGADOS_SQL = {
+    'agg_ventas_mes_categoria_sucursal': """
+        INSERT INTO agg_ventas_mes_categoria_sucursal
+          (anio, mes, trimestre, nombre_mes, categoria, sk_sucursal, total_ventas, total_unidades, num_transacciones)
+        SELECT t.anio, t.mes, t.trimestre, t.nombre_mes, p.categoria, f.sk_sucursal,
+               SUM(f.monto_total), SUM(f.cantidad), COUNT(*)
+        FROM fact_ventas f
+        JOIN dim_producto p ON f.sk_producto = p.sk_producto
+        JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo
+        WHERE f.id_hecho > %s AND f.id_hecho <= %s
+        GROUP BY t.anio, t.mes, t.trimestre, t.nombre_mes, p.categoria, f.sk_sucursal
+        ON DUPLICATE KEY UPDATE total_ventas = total_ventas + VALUES(total_ventas),
+          total_unidades = total_unidades + VALUES(total_unidades),
+          num_transacciones = num_transacciones + VALUES(num_transacciones)
+    """,
+    'agg_ventas_producto_mes': """
+        INSERT INTO agg_ventas_producto_mes
+          (sk_producto, anio, mes, trimestre, nombre_mes, total_ventas, total_unidades, num_transacciones)
+        SELECT f.sk_producto, t.anio, t.mes, t.trimestre, t.nombre_mes,
+               SUM(f.monto_total), SUM(f.cantidad), COUNT(*)
+        FROM fact_ventas f
+        JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo
+        WHERE f.id_hecho > %s AND f.id_hecho <= %s
+        GROUP BY f.sk_producto, t.anio, t.mes, t.trimestre, t.nombre_mes
+        ON DUPLICATE KEY UPDATE total_ventas = total_ventas + VALUES(total_ventas),
+          total_unidades = total_unidades + VALUES(total_unidades),
+          num_transacciones = num_transacciones + VALUES(num_transacciones)
+    """,
+}
+
+def _refrescar_agregados(conn):
+    """
+    Mantiene las tablas agg_* a partir de fact_ventas.
+    Incremental: suma solo los hechos con id_hecho posterior a la marca guardada en etl_log.
+    Si cambió la categoría/nombre de algún producto en dim_producto, reconstruye la tabla por categoría.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT COALESCE(MAX(ultimo_id_fuente), 0) AS wm FROM etl_log WHERE proceso = %s', (ETL_PROCESO_AGREGADOS,))
+        marca = cur.fetchone()['wm']
+        cur.execute('SELECT COALESCE(MAX(id_hecho), 0) AS tope FROM fact_ventas')
+        tope = cur.fetchone()['tope']
+        reconstruir = set()
+        if marca == 0 or marca > tope:
+            reconstruir = set(_AGREGADOS_SQL)
+        elif dim_cache.consumir_cambios_atributos():
+            reconstruir.add('agg_ventas_mes_categoria_sucursal')
+        for tabla, sql in _AGREGADOS_SQL.items():
+            if tabla in reconstruir:
+                cur.execute(f'DELETE FROM {tabla}')
+                cur.execute(sql, (0, tope))
+            elif tope > marca:
+                cur.execute(sql, (marca, tope))
+        cur.execute(
+            'INSERT INTO etl_log (proceso, registros_procesados, registros_exitosos, registros_fallidos, estado, ultimo_id_fuente) VALUES (%s, %s, %s, 0, %s, %s)',
+            (ETL_PROCESO_AGREGADOS, tope - marca, tope - marca, 'RECONSTRUIDO' if reconstruir else 'EXITOSO', tope)
+        )
+        conn.commit()
+        return {'hechos_nuevos': max(0, tope - marca), 'reconstruidas': sorted(reconstruir)}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def _trabajo_refrescar_cubo(trabajo):
+    """ETL (70 % del progreso), agregados y, si está activo, el cubo en memoria."""
+    conn = get_db()
+    trabajo.avance(progreso=0, mensaje='Cargando ventas en fact_ventas')
+    etl = _etl_cargar_ventas(conn, avance=lambda procesadas, pendientes: trabajo.avance(
+        filas=procesadas, progreso=70 * procesadas / pendientes if pendientes else 70))
+    trabajo.avance(progreso=70, mensaje='Actualizando agregados')
+    etl['agregados'] = _refrescar_agregados(conn)
+    cubo_memoria.invalidar()
+    if cubo_memoria.activo:
+        trabajo.avance(progreso=90, mensaje='Cargando el cubo en memoria')
+        cubo_memoria.cargar(conn)
+        etl['cubo_memoria'] = {'hechos': cubo_memoria.estadisticas().get('hechos'),
+                               'segundos': cubo_memoria.segundos_ultima_carga}
+    tocar_tablas(*OLAP_TABLAS)
+    trabajo.avance(filas=etl['procesadas'], mensaje='Cubo OLAP actualizado')
+    return {'message': 'Cubo OLAP actualizado exitosamente', 'timestamp': datetime.utcnow().isoformat() + 'Z', 'etl': etl}
+
+ejecutor_trabajos.registrar('refrescar_cubo', _trabajo_refrescar_cubo, exclusivo=True)
+
+@app.route('/api/olap/refrescar-cubo', methods=['POST'])
+@require_auth
+def olap_refrescar():
+    """Encola el refresco del cubo. Si ya hay uno en curso devuelve ese mismo trabajo."""
+    return _encolar_trabajo('refrescar_cubo')
 
 @app.route('/api/olap/ventas')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_ventas():
-    rows = db_execute('SELECT p.categoria, SUM(f.monto_total) AS total, SUM(f.cantidad) AS unidades FROM fact_ventas f JOIN dim_producto p ON f.sk_producto = p.sk_producto GROUP BY p.categoria ORDER BY total DESC')
+    rows = db_execute('SELECT a.categoria, SUM(a.total_ventas) AS total, SUM(a.total_unidades) AS unidades FROM agg_ventas_mes_categoria_sucursal a GROUP BY a.categoria ORDER BY total DESC')
     return jsonify(rows or [])
 
 @app.route('/api/olap/kpi/estadisticas')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_kpi_estadisticas():
-    row = db_execute_one('SELECT SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades, COUNT(*) AS num_transacciones, AVG(f.monto_total) AS promedio_transaccion, COUNT(DISTINCT f.sk_producto) AS productos_vendidos, COUNT(DISTINCT f.sk_sucursal) AS sucursales_activas FROM fact_ventas f')
+    row = db_execute_one('''
+        SELECT SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades,
+               SUM(a.num_transacciones) AS num_transacciones,
+               SUM(a.total_ventas) / NULLIF(SUM(a.num_transacciones), 0) AS promedio_transaccion,
+               (SELECT COUNT(DISTINCT sk_producto) FROM agg_ventas_producto_mes) AS productos_vendidos,
+               COUNT(DISTINCT a.sk_sucursal) AS sucursales_activas
+        FROM agg_ventas_mes_categoria_sucursal a
+    ''')
     return jsonify(row or {})
 
 @app.route('/api/olap/kpi/top-productos')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_kpi_top_productos():
     limit = min(int(request.args.get('limit') or 10), 100)
     rows = db_execute('''
-        SELECT p.nombre AS producto, p.categoria, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades, COUNT(*) AS num_transacciones
-        FROM fact_ventas f
-        JOIN dim_producto p ON f.sk_producto = p.sk_producto
+        SELECT p.nombre AS producto, p.categoria, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades, SUM(a.num_transacciones) AS num_transacciones
+        FROM agg_ventas_producto_mes a
+        JOIN dim_producto p ON a.sk_producto = p.sk_producto
         GROUP BY p.nombre, p.categoria
         ORDER BY total_ventas DESC
         LIMIT %s
@@ -884,100 +2258,123 @@ def olap_kpi_top_productos():
 
 @app.route('/api/olap/kpi/ranking-sucursales')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_kpi_ranking_sucursales():
     rows = db_execute('''
-        SELECT s.nombre_sucursal, s.ciudad, s.region, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades, COUNT(*) AS num_transacciones, AVG(f.monto_total) AS promedio_venta
-        FROM fact_ventas f
-        JOIN dim_sucursal s ON f.sk_sucursal = s.sk_sucursal
+        SELECT s.nombre_sucursal, s.ciudad, s.region, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades, SUM(a.num_transacciones) AS num_transacciones, SUM(a.total_ventas) / NULLIF(SUM(a.num_transacciones), 0) AS promedio_venta
+        FROM agg_ventas_mes_categoria_sucursal a
+        JOIN dim_sucursal s ON a.sk_sucursal = s.sk_sucursal
         GROUP BY s.nombre_sucursal, s.ciudad, s.region
         ORDER BY total_ventas DESC
     ''')
     return jsonify(rows or [])
 
+# LAG() en el servidor sobre el agregado mensual: MySQL devuelve ya el mes anterior y el crecimiento
+SQL_TENDENCIA_MENSUAL = """
+    SELECT mes, nombre_mes, total_ventas,
+           LAG(total_ventas) OVER w AS ventas_mes_anterior,
+           CASE WHEN LAG(total_ventas) OVER w > 0
+                THEN ROUND((total_ventas - LAG(total_ventas) OVER w) / LAG(total_ventas) OVER w * 100, 2)
+           END AS crecimiento_porcentual
+    FROM (
+        SELECT a.mes, a.nombre_mes, SUM(a.total_ventas) AS total_ventas
+        FROM agg_ventas_mes_categoria_sucursal a
+        WHERE a.anio = %s
+        GROUP BY a.mes, a.nombre_mes
+    ) ventas_mensuales
+    WINDOW w AS (ORDER BY mes)
+    ORDER BY mes
+"""
+
+# Los dos últimos meses con ventas: idx_agg_pm_periodo (anio, mes) lo resuelve sin leer los importes
+SQL_ULTIMOS_MESES = """
+    SELECT anio, mes FROM agg_ventas_producto_mes
+    GROUP BY anio, mes
+    ORDER BY anio DESC, mes DESC
+    LIMIT 2
+"""
+
+# Crecimiento por producto entre esos dos meses: solo se leen sus filas del agregado (producto, mes)
+SQL_PRODUCTOS_ESTRELLA = """
+    SELECT producto, anio, mes, total_ventas, ventas_mes_anterior,
+           ROUND((total_ventas - ventas_mes_anterior) / ventas_mes_anterior * 100, 2) AS crecimiento_porcentual
+    FROM (
+        SELECT producto, anio, mes, total_ventas,
+               LAG(total_ventas) OVER (PARTITION BY producto ORDER BY anio, mes) AS ventas_mes_anterior
+        FROM (
+            SELECT p.nombre AS producto, a.anio, a.mes, SUM(a.total_ventas) AS total_ventas
+            FROM agg_ventas_producto_mes a
+            JOIN dim_producto p ON a.sk_producto = p.sk_producto
+            WHERE (a.anio = %s AND a.mes = %s) OR (a.anio = %s AND a.mes = %s)
+            GROUP BY p.nombre, a.anio, a.mes
+        ) ventas_mes
+    ) crecimiento
+    WHERE anio = %s AND mes = %s AND ventas_mes_anterior > 0
+    ORDER BY crecimiento_porcentual DESC, total_ventas DESC, producto
+    LIMIT %s
+"""
+
+def _decimales_a_float(fila, *campos):
+    """Estos campos siempre se han servido como número JSON, no como cadena decimal."""
+    for c in campos:
+        if fila.get(c) is not None:
+            fila[c] = float(fila[c])
+    return fila
+
 @app.route('/api/olap/kpi/tendencia-mensual')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_kpi_tendencia():
     anio = request.args.get('anio', '2024')
-    rows = db_execute('''
-        SELECT t.mes, t.nombre_mes, SUM(f.monto_total) AS total_ventas
-        FROM fact_ventas f
-        JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo
-        WHERE t.anio = %s
-        GROUP BY t.mes, t.nombre_mes
-        ORDER BY t.mes
-    ''', (anio,))
-    if not rows:
-        return jsonify([])
-    # Agregar LAG manualmente
-    prev = None
-    out = []
-    for r in rows:
-        r = dict(r)
-        r['ventas_mes_anterior'] = prev
-        if prev and prev > 0:
-            r['crecimiento_porcentual'] = round((float(r['total_ventas']) - prev) / prev * 100, 2)
-        else:
-            r['crecimiento_porcentual'] = None
-        prev = float(r['total_ventas'])
-        out.append(r)
-    return jsonify(out)
+    rows = db_execute(SQL_TENDENCIA_MENSUAL, (anio,)) or []
+    return jsonify([_decimales_a_float(r, 'ventas_mes_anterior', 'crecimiento_porcentual') for r in rows])
 
 @app.route('/api/olap/productos-estrella')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_productos_estrella():
-    rows = db_execute('''
-        SELECT p.nombre AS producto, SUM(f.monto_total) AS total_ventas
-        FROM fact_ventas f
-        JOIN dim_producto p ON f.sk_producto = p.sk_producto
-        JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo
-        GROUP BY p.nombre, t.anio, t.mes
-        ORDER BY t.anio DESC, t.mes DESC
-        LIMIT 100
-    ''')
-    # Simplificado: top 3 por crecimiento (requeriría LAG por producto/mes)
-    if not rows:
+    """Top N productos por crecimiento del último mes con ventas respecto al anterior."""
+    limit = min(int(request.args.get('limit') or 3), 50)
+    meses = db_execute(SQL_ULTIMOS_MESES)
+    if not meses or len(meses) < 2:
         return jsonify([])
-    by_prod = {}
-    for r in rows:
-        name = r['producto']
-        if name not in by_prod:
-            by_prod[name] = []
-        by_prod[name].append(float(r['total_ventas']))
-    growth = []
-    for name, vals in by_prod.items():
-        if len(vals) >= 2:
-            g = round((vals[0] - vals[1]) / vals[1] * 100, 2)
-            growth.append({'producto': name, 'total_ventas': vals[0], 'ventas_mes_anterior': vals[1], 'crecimiento_porcentual': g})
-    growth.sort(key=lambda x: -x['crecimiento_porcentual'])
-    return jsonify(growth[:3])
+    actual, anterior = meses
+    rows = db_execute(SQL_PRODUCTOS_ESTRELLA, (
+        actual['anio'], actual['mes'], anterior['anio'], anterior['mes'], actual['anio'], actual['mes'], limit
+    )) or []
+    return jsonify([
+        _decimales_a_float(r, 'total_ventas', 'ventas_mes_anterior', 'crecimiento_porcentual') for r in rows
+    ])
 
 @app.route('/api/olap/analisis-temporal')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_analisis_temporal():
     nivel = request.args.get('nivel', 'mes')
     if nivel == 'mes':
         rows = db_execute('''
-            SELECT t.anio, t.mes, t.nombre_mes, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades
-            FROM fact_ventas f
-            JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo
-            GROUP BY t.anio, t.mes, t.nombre_mes
-            ORDER BY t.anio DESC, t.mes DESC
+            SELECT a.anio, a.mes, a.nombre_mes, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades
+            FROM agg_ventas_mes_categoria_sucursal a
+            GROUP BY a.anio, a.mes, a.nombre_mes
+            ORDER BY a.anio DESC, a.mes DESC
         ''')
     elif nivel == 'anio':
         rows = db_execute('''
-            SELECT t.anio, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades
-            FROM fact_ventas f
-            JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo
-            GROUP BY t.anio
-            ORDER BY t.anio DESC
+            SELECT a.anio, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades
+            FROM agg_ventas_mes_categoria_sucursal a
+            GROUP BY a.anio
+            ORDER BY a.anio DESC
         ''')
     elif nivel == 'trimestre':
         rows = db_execute('''
-            SELECT t.anio, t.trimestre, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades
-            FROM fact_ventas f
-            JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo
-            GROUP BY t.anio, t.trimestre
-            ORDER BY t.anio DESC, t.trimestre DESC
+            SELECT a.anio, a.trimestre, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades
+            FROM agg_ventas_mes_categoria_sucursal a
+            GROUP BY a.anio, a.trimestre
+            ORDER BY a.anio DESC, a.trimestre DESC
         ''')
     else:
         rows = db_execute('''
@@ -991,35 +2388,61 @@ def olap_analisis_temporal():
     return jsonify(rows or [])
 
 # Rutas OLAP adicionales (drilldown, slice, dice) - respuestas básicas para no romper el front
+# Leen del agregado más pequeño que responde la consulta; dice y el nivel 'dia' siguen en fact_ventas.
+# Con OLAP_CUBO_MEMORIA=1 rollup, drilldown, slice y dice se calculan en cubo_memoria (ver cubo_columnar.py).
 @app.route('/api/olap/rollup/anio')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_rollup_anio():
-    rows = db_execute('SELECT t.anio, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades, COUNT(*) AS num_transacciones FROM fact_ventas f JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo GROUP BY t.anio ORDER BY t.anio')
+    rows = _desde_cubo(['anio'], ('total_ventas', 'total_unidades', 'num_transacciones'), orden=[('anio', False)])
+    if rows is None:
+        rows = db_execute('SELECT a.anio, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades, SUM(a.num_transacciones) AS num_transacciones FROM agg_ventas_mes_categoria_sucursal a GROUP BY a.anio ORDER BY a.anio')
     return jsonify(rows or [])
 
 @app.route('/api/olap/rollup/trimestre')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_rollup_trimestre():
-    rows = db_execute('SELECT t.anio, t.trimestre, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades FROM fact_ventas f JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo GROUP BY t.anio, t.trimestre ORDER BY t.anio, t.trimestre')
+    rows = _desde_cubo(['anio', 'trimestre'], ('total_ventas', 'total_unidades'),
+                       orden=[('anio', False), ('trimestre', False)])
+    if rows is None:
+        rows = db_execute('SELECT a.anio, a.trimestre, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades FROM agg_ventas_mes_categoria_sucursal a GROUP BY a.anio, a.trimestre ORDER BY a.anio, a.trimestre')
     return jsonify(rows or [])
 
 @app.route('/api/olap/rollup/mes')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_rollup_mes():
-    rows = db_execute('SELECT t.anio, t.trimestre, t.mes, t.nombre_mes, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades FROM fact_ventas f JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo GROUP BY t.anio, t.trimestre, t.mes, t.nombre_mes ORDER BY t.anio, t.trimestre, t.mes')
+    rows = _desde_cubo(['anio', 'trimestre', 'mes', 'nombre_mes'], ('total_ventas', 'total_unidades'),
+                       orden=[('anio', False), ('trimestre', False), ('mes', False)])
+    if rows is None:
+        rows = db_execute('SELECT a.anio, a.trimestre, a.mes, a.nombre_mes, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades FROM agg_ventas_mes_categoria_sucursal a GROUP BY a.anio, a.trimestre, a.mes, a.nombre_mes ORDER BY a.anio, a.trimestre, a.mes')
     return jsonify(rows or [])
 
 @app.route('/api/olap/drilldown/categorias')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_drilldown_categorias():
-    rows = db_execute('SELECT p.categoria, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades, COUNT(DISTINCT p.sk_producto) AS num_productos FROM fact_ventas f JOIN dim_producto p ON f.sk_producto = p.sk_producto GROUP BY p.categoria ORDER BY total_ventas DESC')
+    rows = _desde_cubo(['categoria'], ('total_ventas', 'total_unidades', 'num_productos'), orden=[('total_ventas', True)])
+    if rows is None:
+        rows = db_execute('SELECT p.categoria, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades, COUNT(DISTINCT p.sk_producto) AS num_productos FROM agg_ventas_producto_mes a JOIN dim_producto p ON a.sk_producto = p.sk_producto GROUP BY p.categoria ORDER BY total_ventas DESC')
     return jsonify(rows or [])
 
 @app.route('/api/olap/drilldown/productos')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_drilldown_productos():
     cat = request.args.get('categoria')
-    sql = 'SELECT p.categoria, p.nombre AS producto, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades FROM fact_ventas f JOIN dim_producto p ON f.sk_producto = p.sk_producto'
+    rows = _desde_cubo(['categoria', 'producto'], ('total_ventas', 'total_unidades'),
+                       filtros={'categoria': cat} if cat else None, orden=[('categoria', False), ('total_ventas', True)])
+    if rows is not None:
+        return jsonify(rows)
+    sql = 'SELECT p.categoria, p.nombre AS producto, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades FROM agg_ventas_producto_mes a JOIN dim_producto p ON a.sk_producto = p.sk_producto'
     params = []
     if cat:
         sql += ' WHERE p.categoria = %s'
@@ -1030,25 +2453,58 @@ def olap_drilldown_productos():
 
 @app.route('/api/olap/slice/categoria/<categoria>')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_slice_categoria(categoria):
-    rows = db_execute('SELECT t.anio, t.mes, t.nombre_mes, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades FROM fact_ventas f JOIN dim_producto p ON f.sk_producto = p.sk_producto JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo WHERE p.categoria = %s GROUP BY t.anio, t.mes, t.nombre_mes ORDER BY t.anio, t.mes', (categoria,))
+    rows = _desde_cubo(['anio', 'mes', 'nombre_mes'], ('total_ventas', 'total_unidades'),
+                       filtros={'categoria': categoria}, orden=[('anio', False), ('mes', False)])
+    if rows is None:
+        rows = db_execute('SELECT a.anio, a.mes, a.nombre_mes, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades FROM agg_ventas_mes_categoria_sucursal a WHERE a.categoria = %s GROUP BY a.anio, a.mes, a.nombre_mes ORDER BY a.anio, a.mes', (categoria,))
     return jsonify(rows or [])
 
 @app.route('/api/olap/slice/sucursal/<ciudad>')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_slice_sucursal(ciudad):
-    rows = db_execute('SELECT p.categoria, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades FROM fact_ventas f JOIN dim_producto p ON f.sk_producto = p.sk_producto JOIN dim_sucursal s ON f.sk_sucursal = s.sk_sucursal WHERE s.ciudad = %s GROUP BY p.categoria ORDER BY total_ventas DESC', (ciudad,))
+    rows = _desde_cubo(['categoria'], ('total_ventas', 'total_unidades'), filtros={'ciudad': ciudad},
+                       orden=[('total_ventas', True)])
+    if rows is None:
+        rows = db_execute('SELECT a.categoria, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades FROM agg_ventas_mes_categoria_sucursal a JOIN dim_sucursal s ON a.sk_sucursal = s.sk_sucursal WHERE s.ciudad = %s GROUP BY a.categoria ORDER BY total_ventas DESC', (ciudad,))
     return jsonify(rows or [])
 
 @app.route('/api/olap/slice/periodo/<anio>')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_slice_periodo(anio):
-    rows = db_execute('SELECT p.categoria, t.trimestre, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades FROM fact_ventas f JOIN dim_producto p ON f.sk_producto = p.sk_producto JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo WHERE t.anio = %s GROUP BY p.categoria, t.trimestre ORDER BY t.trimestre, total_ventas DESC', (anio,))
+    rows = None
+    if _entero(anio) is not None:
+        rows = _desde_cubo(['categoria', 'trimestre'], ('total_ventas', 'total_unidades'), filtros={'anio': _entero(anio)},
+                           orden=[('trimestre', False), ('total_ventas', True)])
+    if rows is None:
+        rows = db_execute('SELECT a.categoria, a.trimestre, SUM(a.total_ventas) AS total_ventas, SUM(a.total_unidades) AS total_unidades FROM agg_ventas_mes_categoria_sucursal a WHERE a.anio = %s GROUP BY a.categoria, a.trimestre ORDER BY a.trimestre, total_ventas DESC', (anio,))
     return jsonify(rows or [])
 
 @app.route('/api/olap/dice')
 @require_auth
+@respuesta_condicional(*OLAP_TABLAS)
+@olap_cacheado
 def olap_dice():
+    filtros = {}
+    if request.args.get('categoria'):
+        filtros['categoria'] = request.args.get('categoria')
+    if request.args.get('anio'):
+        filtros['anio'] = _entero(request.args.get('anio'))
+    if request.args.get('mes_inicio') and request.args.get('mes_fin'):
+        filtros['mes'] = (_entero(request.args.get('mes_inicio')), _entero(request.args.get('mes_fin')))
+    if request.args.get('ciudad'):
+        filtros['ciudad'] = request.args.get('ciudad')
+    if filtros.get('anio', 0) is not None and None not in filtros.get('mes', ()):
+        rows = _desde_cubo(['categoria', 'producto', 'anio', 'mes', 'nombre_mes', 'ciudad'], ('total_ventas', 'total_unidades'),
+                           filtros=filtros, orden=[('total_ventas', True)], limite=50)
+        if rows is not None:
+            return jsonify(rows)
     params = []
     sql = 'SELECT p.categoria, p.nombre AS producto, t.anio, t.mes, t.nombre_mes, s.ciudad, SUM(f.monto_total) AS total_ventas, SUM(f.cantidad) AS total_unidades FROM fact_ventas f JOIN dim_producto p ON f.sk_producto = p.sk_producto JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo JOIN dim_sucursal s ON f.sk_sucursal = s.sk_sucursal WHERE 1=1'
     if request.args.get('categoria'):
@@ -1067,6 +2523,115 @@ def olap_dice():
     rows = db_execute(sql, tuple(params) if params else None)
     return jsonify(rows or [])
 
+# ============ Trabajos ============
+def _encolar_trabajo(tipo, parametros=None):
+    """202 con el id del trabajo (el existente si es exclusivo y ya hay uno en curso)."""
+    try:
+        trabajo_id, nuevo = ejecutor_trabajos.enviar(tipo, parametros, usuario_id=session.get('userId'))
+    except pymysql.err.ProgrammingError as e:
+        if e.args and e.args[0] == 1146:
+            return jsonify({'error': 'Falta la tabla trabajos (ejecuta sql/migracion-rendimiento.sql)'}), 503
+        raise
+    url = f'/api/trabajos/{trabajo_id}'
+    resp = jsonify({'trabajo_id': trabajo_id, 'nuevo': nuevo, 'url': url})
+    resp.status_code = 202
+    resp.headers['Location'] = url
+    return resp
+
+@app.route('/api/trabajos/<int:id>')
+@require_auth
+def get_trabajo(id):
+    row = db_execute_one('SELECT * FROM trabajos WHERE id = %s', (id,))
+    if not row:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(fila_publica(row))
+
+@app.route('/api/trabajos')
+@require_auth
+def list_trabajos():
+    limit = min(int(request.args.get('limit') or 20), 100)
+    sql = ('SELECT id, tipo, estado, progreso, filas_procesadas, mensaje, error, usuario_id, created_at, '
+           'iniciado_en, terminado_en FROM trabajos WHERE 1=1')
+    params = []
+    for campo in ('tipo', 'estado'):
+        if request.args.get(campo):
+            sql += f' AND {campo} = %s'
+            params.append(request.args.get(campo))
+    sql += ' ORDER BY id DESC LIMIT %s'
+    params.append(limit)
+    rows = db_execute(sql, tuple(params))
+    return jsonify([fila_publica(r) for r in (rows or [])])
+
+# ============ Sistema ============
+@app.route('/api/sistema/pool')
+@require_auth
+@require_admin
+def estadisticas_pool():
+    return jsonify(get_pool().estadisticas())
+
+@app.route('/api/sistema/hash')
+@require_auth
+@require_admin
+def estadisticas_hash():
+    return jsonify(servicio_hash.estadisticas())
+
+@app.route('/api/sistema/ultimo-acceso')
+@require_auth
+@require_admin
+def estadisticas_ultimo_acceso():
+    return jsonify(ultimos_accesos.estadisticas())
+
+@app.route('/api/sistema/stock')
+@require_auth
+@require_admin
+def estadisticas_stock():
+    with _stock_lock:
+        return jsonify(dict(_stock_metricas))
+
+@app.route('/api/sistema/eventos')
+@require_auth
+@require_admin
+def estadisticas_eventos():
+    return jsonify(dict(difusor_sse.estadisticas(), calculos=publicador_sse.ejecuciones, errores=publicador_sse.errores))
+
+@app.route('/api/sistema/trabajos')
+@require_auth
+@require_admin
+def estadisticas_trabajos():
+    return jsonify(ejecutor_trabajos.estadisticas())
+
+@app.route('/api/sistema/contadores')
+@require_auth
+@require_admin
+def estadisticas_contadores():
+    with _reconciliacion_lock:
+        datos = dict(_reconciliacion, intervalo_s=CONTADORES_RECONCILIAR_S)
+    cur = get_db().cursor()
+    try:
+        datos['valores'] = _leer_contadores(cur)
+    finally:
+        cur.close()
+    return jsonify(datos)
+
+@app.route('/api/sistema/contadores/reconciliar', methods=['POST'])
+@require_auth
+@require_admin
+def reconciliar_contadores():
+    resultado = _reconciliar_contadores(get_db())
+    if 'error' in resultado:
+        return jsonify(resultado), 409
+    return jsonify(resultado)
+
+@app.route('/api/olap/cache/estadisticas')
+@require_auth
+def olap_cache_estadisticas():
+    return jsonify(olap_cache.estadisticas())
+
+@app.route('/api/olap/cubo/estadisticas')
+@require_auth
+def olap_cubo_estadisticas():
+    return jsonify(cubo_memoria.estadisticas())
+
 # Servir frontend
 @app.route('/')
 def index():
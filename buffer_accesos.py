@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Escritura diferida de usuarios.ultimo_acceso.
+El login solo anota el momento en memoria; un hilo en segundo plano escribe todos los pendientes
+en una sola sentencia cada `max_retraso` segundos (o antes si se acumulan muchos) y al cerrar el proceso.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+
+class BufferUltimoAcceso:
+    """
+    Acumula {usuario_id: último momento} y lo vuelca con `escribir(filas)`, donde filas es una lista
+    de tuplas (usuario_id, momento). Si la escritura falla, las filas vuelven al buffer.
+
+    - max_retraso: segundos máximos que un acceso puede quedar sin escribir (0 = escribir en el acto).
+    - max_pendientes: con tantos usuarios pendientes se adelanta el volcado.
+    """
+
+    def __init__(self, escribir, max_retraso=30, max_pendientes=1000):
+        self._escribir = escribir
+        self.max_retraso = max_retraso
+        self.max_pendientes = max_pendientes
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detenido = False
+        self._hilo = None
+        # Métricas
+        self._registrados = 0
+        self._volcados = 0
+        self._filas_escritas = 0
+        self._errores = 0
+        self._ultimo_volcado = None
+
+    def registrar(self, usuario_id, momento=None):
+        momento = momento or datetime.now().replace(microsecond=0)
+        if self.max_retraso <= 0:
+            self._escribir([(usuario_id, momento)])
+            return
+        with self._lock:
+            anterior = self._pendientes.get(usuario_id)
+            if anterior is None or momento > anterior:
+                self._pendientes[usuario_id] = momento
+            self._registrados += 1
+            lleno = len(self._pendientes) >= self.max_pendientes
+            if self._hilo is None and not self._detenido:
+                self._iniciar()
+        if lleno:
+            self._despertar.set()
+
+    def _iniciar(self):
+        # Se llama con el lock tomado; el hilo nace con el primer acceso, no al importar la app.
+        self._hilo = threading.Thread(target=self._bucle, name='buffer-ultimo-acceso', daemon=True)
+        self._hilo.start()
+        atexit.register(self.detener)
+
+    def _bucle(self):
+        while not self._detenido:
+            self._despertar.wait(self.max_retraso)
+            self._despertar.clear()
+            self.vaciar()
+
+    def vaciar(self):
+        """Escribe todos los pendientes en una llamada. Devuelve cuántas filas se escribieron."""
+        with self._lock:
+            if not self._pendientes:
+                return 0
+            filas = list(self._pendientes.items())
+            self._pendientes = {}
+        try:
+            self._escribir(filas)
+        except Exception:
+            log.exception('No se pudo escribir ultimo_acceso de %d usuarios; se reintentará', len(filas))
+            with self._lock:
+                self._errores += 1
+                for usuario_id, momento in filas:
+                    actual = self._pendientes.get(usuario_id)
+                    if actual is None or momento > actual:
+                        self._pendientes[usuario_id] = momento
+            return 0
+        with self._lock:
+            self._volcados += 1
+            self._filas_escritas += len(filas)
+            self._ultimo_volcado = time.time()
+        return len(filas)
+
+    def detener(self):
+        """Para el hilo y hace el último volcado (se registra con atexit)."""
+        self._detenido = True
+        self._despertar.set()
+        hilo = self._hilo
+        if hilo is not None and hilo is not threading.current_thread():
+            hilo.join(timeout=5)
+        self.vaciar()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'max_retraso_s': self.max_retraso,
+                'pendientes': len(self._pendientes),
+                'registrados': self._registrados,
+                'volcados': self._volcados,
+                'filas_escritas': self._filas_escritas,
+                'errores': self._errores,
+                'ultimo_volcado': datetime.fromtimestamp(self._ultimo_volcado).isoformat() if self._ultimo_volcado else None,
+            }
@@ -0,0 +1,590 @@
+# -*- coding: utf-8 -*-
+"""
+Cubo OLAP columnar en memoria (opcional, requiere NumPy).
+Carga fact_ventas como arreglos de posiciones de dimensión y medidas; los atributos de las dimensiones
+(categoría, producto, año, mes, ciudad...) se codifican con diccionario. Agrupar, filtrar y hacer
+roll-up se resuelve con bincount / argsort sobre esos arreglos, sin consultar MySQL.
+
+Cada carga desde MySQL se guarda además como snapshot binario (cabecera JSON + arreglos de ancho fijo).
+Los procesos lo abren con mmap sin copiarlo: arrancan sin leer fact_ventas y comparten las páginas
+a través de la caché del sistema operativo. El snapshot guarda la marca del DW con que se leyó
+(último id_hecho y huella de cada dimensión) y no se usa si ya no coincide con la de MySQL.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from decimal import Decimal
+
+from pymysql.cursors import SSCursor
+
+try:
+    import numpy as np
+except ImportError:  # el modo cubo en memoria queda desactivado
+    np = None
+
+log = logging.getLogger(__name__)
+
+# atributo → (dimensión, columna en la tabla de dimensión)
+ATRIBUTOS = {
+    'producto': ('producto', 'nombre'),
+    'categoria': ('producto', 'categoria'),
+    'anio': ('tiempo', 'anio'),
+    'trimestre': ('tiempo', 'trimestre'),
+    'mes': ('tiempo', 'mes'),
+    'nombre_mes': ('tiempo', 'nombre_mes'),
+    'nombre_sucursal': ('sucursal', 'nombre_sucursal'),
+    'ciudad': ('sucursal', 'ciudad'),
+    'region': ('sucursal', 'region'),
+}
+MEDIDAS = ('total_ventas', 'total_unidades', 'num_transacciones', 'num_productos')
+
+_DIMENSIONES = {
+    'producto': 'SELECT sk_producto, nombre, categoria FROM dim_producto ORDER BY sk_producto',
+    'tiempo': 'SELECT sk_tiempo, anio, trimestre, mes, nombre_mes FROM dim_tiempo ORDER BY sk_tiempo',
+    'sucursal': 'SELECT sk_sucursal, nombre_sucursal, ciudad, region FROM dim_sucursal ORDER BY sk_sucursal',
+}
+# Importe en centavos: las sumas son enteras y exactas, como SUM(DECIMAL) en MySQL
+_SQL_HECHOS = """
+    SELECT sk_producto, sk_tiempo, sk_sucursal, cantidad, CAST(ROUND(monto_total * 100) AS SIGNED)
+    FROM fact_ventas
+"""
+# Marca del DW: último hecho y, por dimensión, número de filas y XOR de un CRC32 de cada fila
+# (detecta altas, bajas y ediciones como el cambio de ciudad de una sucursal)
+_SQL_MARCA = """
+    SELECT (SELECT COALESCE(MAX(id_hecho), 0) FROM fact_ventas) AS hechos,
+           (SELECT CONCAT(COUNT(*), ':', COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', sk_producto, nombre, categoria))), 0))
+            FROM dim_producto) AS producto,
+           (SELECT CONCAT(COUNT(*), ':', COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', sk_tiempo, anio, trimestre, mes, nombre_mes))), 0))
+            FROM dim_tiempo) AS tiempo,
+           (SELECT CONCAT(COUNT(*), ':', COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', sk_sucursal, nombre_sucursal, ciudad, region))), 0))
+            FROM dim_sucursal) AS sucursal
+"""
+_LOTE_LECTURA = 50000
+# Por encima de este número de combinaciones de grupo se agrupa ordenando (argsort) en vez de con bincount
+_MAX_GRUPOS_DENSOS = 1 << 22
+# bincount suma en float64: exacto mientras el total quepa en la mantisa
+_MAX_SUMA_EXACTA = 1 << 53
+
+# Snapshot: MAGIA (8 bytes) + longitud de la cabecera (uint64 LE) + cabecera JSON + arreglos alineados
+_MAGIA = b'DWCUBO\x00\x01'
+FORMATO_SNAPSHOT = 2
+_ALINEACION = 64
+# Cada cuánto se mira si otro proceso escribió un snapshot más nuevo
+_REVISION_SNAPSHOT_S = 2.0
+# Tras una carga fallida no se reintenta en segundo plano hasta pasado este tiempo (o hasta cargar())
+ESPERA_TRAS_FALLO_S = 300.0
+
+
+def disponible():
+    return np is not None
+
+
+def marca_dw(conn):
+    """Marca de los datos de los que sale el cubo; cambia con cualquier carga del ETL o edición de dimensión."""
+    cur = conn.cursor()
+    try:
+        cur.execute(_SQL_MARCA)
+        fila = cur.fetchone()
+    finally:
+        cur.close()
+    return {k: (int(v) if k == 'hechos' else str(v)) for k, v in fila.items()}
+
+
+def _normalizar(valor):
+    """Comparación como la collation *_ci de MySQL (mayúsculas y espacios finales), sin acentos."""
+    return str(valor).rstrip().casefold()
+
+
+class _Atributo:
+    """Diccionario de valores ordenados + código por fila de la dimensión."""
+
+    def __init__(self, valores, codigos, rango):
+        self.valores = valores
+        self.codigos = codigos
+        self.rango = rango
+        self.numerico = bool(valores) and all(isinstance(v, int) for v in valores)
+
+    @classmethod
+    def codificar(cls, valores_por_fila):
+        valores, codigos = np.unique(np.asarray(valores_por_fila, dtype=object), return_inverse=True)
+        valores = valores.tolist()
+        numerico = bool(valores) and all(isinstance(v, int) for v in valores)
+        # Rango de cada código en el orden de ORDER BY (numérico o texto sin distinguir mayúsculas)
+        clave = (lambda i: valores[i]) if numerico else (lambda i: _normalizar(valores[i]))
+        rango = np.empty(len(valores), dtype=np.int32)
+        rango[sorted(range(len(valores)), key=clave)] = np.arange(len(valores), dtype=np.int32)
+        return cls(valores, codigos.astype(np.int32), rango)
+
+    def codigos_que_cumplen(self, condicion):
+        """Códigos del diccionario que cumplen un filtro: valor exacto o rango (desde, hasta)."""
+        if isinstance(condicion, tuple):
+            desde, hasta = condicion
+            return [i for i, v in enumerate(self.valores) if desde <= v <= hasta]
+        if self.numerico:
+            return [i for i, v in enumerate(self.valores) if v == condicion]
+        buscado = _normalizar(condicion)
+        return [i for i, v in enumerate(self.valores) if _normalizar(v) == buscado]
+
+    @property
+    def nbytes(self):
+        return self.codigos.nbytes + self.rango.nbytes
+
+
+class _Instantanea:
+    """Contenido inmutable del cubo; se sustituye entero en cada carga."""
+
+    def __init__(self, hechos, atributos, filas_dimension, columnas=None, cabecera=None, marca=None):
+        self.hechos = hechos
+        self.atributos = atributos
+        self.filas_dimension = filas_dimension
+        self._columnas = dict(columnas or {})
+        self._lock = threading.Lock()
+        # Solo en las abiertas desde snapshot: sus arreglos viven en el mmap, no en el heap del proceso
+        self.cabecera = cabecera
+        self.marca = marca
+
+    @property
+    def filas(self):
+        return len(self.hechos['cantidad'])
+
+    def columna(self, atributo):
+        """Código del atributo por cada hecho (se materializa la primera vez que se usa)."""
+        col = self._columnas.get(atributo)
+        if col is None:
+            dimension = ATRIBUTOS[atributo][0]
+            with self._lock:
+                col = self._columnas.get(atributo)
+                if col is None:
+                    col = self.atributos[atributo].codigos[self.hechos[dimension]]
+                    self._columnas[atributo] = col
+        return col
+
+    def memoria(self):
+        hechos = {k: int(v.nbytes) for k, v in self.hechos.items()}
+        columnas = {k: int(v.nbytes) for k, v in list(self._columnas.items())}
+        diccionarios = sum(a.nbytes for a in self.atributos.values())
+        total = sum(hechos.values()) + sum(columnas.values()) + diccionarios
+        return {'hechos': hechos, 'columnas_atributo': columnas, 'diccionarios': int(diccionarios),
+                'total_bytes': int(total), 'total_mb': round(total / 1048576, 2),
+                'origen': 'snapshot (mmap compartido)' if self.cabecera else 'memoria del proceso'}
+
+
+class CuboColumnar:
+    """
+    Cubo en memoria para slice / dice / drill-down / roll-up. Si no está cargado, obtener() lanza la
+    carga en un hilo propio y devuelve None: la ruta responde con SQL sin esperar a fact_ventas.
+    """
+
+    def __init__(self, activo=True, ruta_snapshot=None):
+        self.activo = bool(activo) and disponible()
+        self.ruta_snapshot = ruta_snapshot or None
+        self._instantanea = None
+        self._vigente = False
+        # Un snapshot abierto del disco se compara con la marca del DW antes de responder con él
+        self._por_verificar = False
+        self._generacion = 0
+        self._carga = threading.Lock()
+        self._lanzamiento = threading.Lock()
+        self._hilo = None
+        self._fallo_en = None
+        self.fallos = 0
+        self.ultimo_error = None
+        self._firma = None
+        self._revisado = 0.0
+        self.cargas = 0
+        self.aperturas_snapshot = 0
+        self.consultas = 0
+        self.segundos_ultima_carga = None
+        self.cargado_en = None
+
+    def invalidar(self):
+        """Los datos cambiaron: la siguiente consulta recarga el cubo (hasta entonces responde SQL)."""
+        self._generacion += 1
+        self._vigente = False
+
+    def obtener(self, conectar, contexto=nullcontext):
+        """
+        Instantánea vigente, o None si ahora no se puede usar. Si falta cargarla o verificar el snapshot,
+        lo hace un hilo en segundo plano que llama a conectar() dentro de contexto() (app.app_context).
+        """
+        if not self.activo:
+            return None
+        if self.ruta_snapshot and time.monotonic() - self._revisado >= _REVISION_SNAPSHOT_S:
+            # Otro proceso pudo refrescar el cubo: se cambia a su snapshot sin tocar MySQL
+            self._revisado = time.monotonic()
+            if self._firma_snapshot() not in (None, self._firma):
+                self.abrir_snapshot()
+        if self._vigente and not self._por_verificar:
+            return self._instantanea
+        self._lanzar_carga(conectar, contexto)
+        return None
+
+    def _lanzar_carga(self, conectar, contexto):
+        with self._lanzamiento:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            if self._fallo_en is not None and time.monotonic() - self._fallo_en < ESPERA_TRAS_FALLO_S:
+                return
+            self._hilo = threading.Thread(target=self._cargar_en_segundo_plano, args=(conectar, contexto),
+                                          name='cubo-columnar', daemon=True)
+            self._hilo.start()
+
+    def _cargar_en_segundo_plano(self, conectar, contexto):
+        try:
+            with contexto():
+                conn = conectar()
+                with self._carga:
+                    if self._vigente and self._por_verificar:
+                        self._verificar(conn)
+                    if not self._vigente:
+                        self._cargar(conn)
+        except Exception as e:
+            # Sin reintentar en cada consulta: hasta ESPERA_TRAS_FALLO_S o el próximo refresco responde SQL
+            log.exception('No se pudo cargar el cubo columnar; se reintenta en %s s', ESPERA_TRAS_FALLO_S)
+            self._fallo_en = time.monotonic()
+            self.fallos += 1
+            self.ultimo_error = str(e)
+
+    def cargar(self, conn):
+        """Recarga completa desde MySQL (la llama el refresco del cubo)."""
+        if not self.activo:
+            return None
+        with self._carga:
+            return self._cargar(conn)
+
+    def _verificar(self, conn):
+        """Descarta el snapshot abierto si el DW cambió desde que se escribió (se recarga desde MySQL)."""
+        ins = self._instantanea
+        marca = marca_dw(conn)
+        if ins is not self._instantanea:
+            return
+        if marca != ins.marca:
+            log.info('Snapshot del cubo desactualizado (marca %s, DW %s): se recarga', ins.marca, marca)
+            self._vigente = False
+        self._por_verificar = False
+
+    def _firma_snapshot(self):
+        try:
+            st = os.stat(self.ruta_snapshot)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def abrir_snapshot(self):
+        """Mapea el snapshot del disco si existe y es de este formato. True si quedó en uso."""
+        if not (self.activo and self.ruta_snapshot):
+            return False
+        if not self._carga.acquire(blocking=False):
+            return False
+        try:
+            firma = self._firma_snapshot()
+            if firma is None:
+                return False
+            try:
+                instantanea = leer_snapshot(self.ruta_snapshot)
+            except (OSError, ValueError, KeyError) as e:
+                log.warning('Snapshot del cubo no utilizable (%s): %s', self.ruta_snapshot, e)
+                self._firma = firma
+                return False
+            self._instantanea = instantanea
+            self._firma = firma
+            self._vigente = True
+            self._por_verificar = True
+            self.aperturas_snapshot += 1
+            return True
+        finally:
+            self._carga.release()
+
+    def _cargar(self, conn):
+        t0 = time.perf_counter()
+        generacion = self._generacion
+        # Se toma antes de leer: si algo cambia durante la carga, la marca guardada ya no coincidirá
+        marca = marca_dw(conn)
+        cur = conn.cursor()
+        try:
+            atributos, posiciones, filas_dimension = {}, {}, {}
+            for dimension, sql in _DIMENSIONES.items():
+                cur.execute(sql)
+                filas = cur.fetchall()
+                columnas = list(filas[0].keys()) if filas else []
+                posiciones[dimension] = np.fromiter((f[columnas[0]] for f in filas), dtype=np.int64, count=len(filas))
+                filas_dimension[dimension] = len(filas)
+                for atributo, (dim, columna) in ATRIBUTOS.items():
+                    if dim == dimension:
+                        atributos[atributo] = _Atributo.codificar([f[columna] for f in filas])
+        finally:
+            cur.close()
+        hechos = self._leer_hechos(conn, posiciones)
+        instantanea = _Instantanea(hechos, atributos, filas_dimension, marca=marca)
+        if self.ruta_snapshot:
+            try:
+                escribir_snapshot(instantanea, self.ruta_snapshot)
+                # El propio proceso pasa a usar el mmap y libera los arreglos recién leídos
+                instantanea = leer_snapshot(self.ruta_snapshot)
+                self._firma = self._firma_snapshot()
+            except OSError as e:
+                log.warning('No se pudo escribir el snapshot del cubo (%s): %s', self.ruta_snapshot, e)
+        self._instantanea = instantanea
+        self._por_verificar = False
+        self._fallo_en = None
+        self.ultimo_error = None
+        # Si se invalidó mientras se leía, esta carga se usa pero la siguiente consulta vuelve a cargar
+        self._vigente = generacion == self._generacion
+        self.cargas += 1
+        self.segundos_ultima_carga = round(time.perf_counter() - t0, 3)
+        self.cargado_en = datetime.now().replace(microsecond=0)
+        log.info('Cubo columnar cargado: %s hechos en %.2f s', instantanea.filas, self.segundos_ultima_carga)
+        return instantanea
+
+    @staticmethod
+    def _leer_hechos(conn, posiciones):
+        """Lee fact_ventas en lotes con un cursor sin búfer y convierte cada sk en posición de su dimensión."""
+        partes = {k: [] for k in ('producto', 'tiempo', 'sucursal', 'cantidad', 'monto_centavos')}
+        cur = conn.cursor(SSCursor)
+        try:
+            cur.execute(_SQL_HECHOS)
+            while True:
+                filas = cur.fetchmany(_LOTE_LECTURA)
+                if not filas:
+                    break
+                arr = np.array(filas, dtype=np.int64).reshape(len(filas), 5)
+                for i, dimension in enumerate(('producto', 'tiempo', 'sucursal')):
+                    claves = posiciones[dimension]
+                    pos = np.searchsorted(claves, arr[:, i])
+                    if len(claves) == 0 or (pos >= len(claves)).any() or (claves[np.minimum(pos, len(claves) - 1)] != arr[:, i]).any():
+                        raise ValueError(f'fact_ventas referencia un sk de dim_{dimension} que no existe')
+                    partes[dimension].append(pos.astype(np.int32))
+                partes['cantidad'].append(arr[:, 3].copy())
+                partes['monto_centavos'].append(arr[:, 4].copy())
+        finally:
+            cur.close()
+        return {k: (np.concatenate(v) if v else np.zeros(0, dtype=np.int32 if k in ('producto', 'tiempo', 'sucursal') else np.int64))
+                for k, v in partes.items()}
+
+    def consultar(self, ins, agrupar, medidas, filtros=None, orden=(), limite=None):
+        """
+        GROUP BY agrupar con las medidas pedidas.
+        filtros: {atributo: valor | (desde, hasta)}; orden: [(campo, descendente)], campo = atributo o medida.
+        Devuelve filas como las de db_execute (sumas en Decimal).
+        """
+        self.consultas += 1
+        hechos = ins.hechos
+        seleccion = None
+        for atributo, condicion in (filtros or {}).items():
+            attr = ins.atributos[atributo]
+            permitido = np.zeros(len(attr.valores) + 1, dtype=bool)
+            permitido[attr.codigos_que_cumplen(condicion)] = True
+            cumple = permitido[ins.columna(atributo)]
+            seleccion = cumple if seleccion is None else seleccion & cumple
+        indices = np.flatnonzero(seleccion) if seleccion is not None else None
+
+        def col(c):
+            return c if indices is None else c[indices]
+
+        # Clave de grupo en base mixta: código1 * card2 * ... + códigoN
+        cards = [max(len(ins.atributos[a].valores), 1) for a in agrupar]
+        n = ins.filas if indices is None else len(indices)
+        clave = np.zeros(n, dtype=np.int64)
+        for a, card in zip(agrupar, cards):
+            clave = clave * card + col(ins.columna(a))
+        combinaciones = int(np.prod(cards, dtype=np.float64)) if cards else 1
+
+        if combinaciones <= _MAX_GRUPOS_DENSOS:
+            cuenta = np.bincount(clave, minlength=combinaciones)
+            grupos = np.flatnonzero(cuenta)
+            grupo_de = None
+
+            def sumar(valores):
+                if int(np.abs(valores).sum()) < _MAX_SUMA_EXACTA:
+                    return np.rint(np.bincount(clave, weights=valores, minlength=combinaciones)[grupos]).astype(np.int64)
+                return _sumar_ordenando(clave, valores, grupos)
+            cuenta = cuenta[grupos]
+        else:
+            grupos, grupo_de, cuenta = np.unique(clave, return_inverse=True, return_counts=True)
+
+            def sumar(valores):
+                return _sumar_ordenando(clave, valores, grupos)
+
+        resultado = {}
+        for m in medidas:
+            if m == 'total_ventas':
+                resultado[m] = sumar(col(hechos['monto_centavos']))
+            elif m == 'total_unidades':
+                resultado[m] = sumar(col(hechos['cantidad']))
+            elif m == 'num_transacciones':
+                resultado[m] = cuenta
+            elif m == 'num_productos':
+                resultado[m] = _distintos_por_grupo(clave, grupos, grupo_de, col(hechos['producto']), ins.filas_dimension['producto'])
+            else:
+                raise ValueError(f'Medida desconocida: {m}')
+
+        # Códigos de cada atributo por grupo (deshace la base mixta)
+        codigos = {}
+        resto = grupos.copy()
+        for a, card in reversed(list(zip(agrupar, cards))):
+            codigos[a] = resto % card
+            resto //= card
+
+        if orden:
+            claves_orden = []
+            for campo, descendente in reversed(orden):
+                valores = ins.atributos[campo].rango[codigos[campo]] if campo in codigos else resultado[campo]
+                claves_orden.append(-valores if descendente else valores)
+            posicion = np.lexsort(claves_orden)
+        else:
+            posicion = np.arange(len(grupos))
+        if limite is not None:
+            posicion = posicion[:limite]
+
+        filas = []
+        for i in posicion.tolist():
+            fila = {a: ins.atributos[a].valores[int(codigos[a][i])] for a in agrupar}
+            for m in medidas:
+                v = int(resultado[m][i])
+                if m == 'total_ventas':
+                    fila[m] = Decimal(v).scaleb(-2)
+                elif m == 'num_productos':
+                    fila[m] = v
+                else:
+                    fila[m] = Decimal(v)
+            filas.append(fila)
+        return filas
+
+    def estadisticas(self):
+        ins = self._instantanea
+        datos = {
+            'activo': self.activo,
+            'numpy_disponible': disponible(),
+            'vigente': self._vigente,
+            'por_verificar': self._por_verificar,
+            'cargando': self._hilo is not None and self._hilo.is_alive(),
+            'fallos': self.fallos,
+            'ultimo_error': self.ultimo_error,
+            'reintento_en_s': (round(max(0.0, ESPERA_TRAS_FALLO_S - (time.monotonic() - self._fallo_en)), 1)
+                               if self._fallo_en is not None else None),
+            'cargas': self.cargas,
+            'aperturas_snapshot': self.aperturas_snapshot,
+            'ruta_snapshot': self.ruta_snapshot,
+            'consultas': self.consultas,
+            'segundos_ultima_carga': self.segundos_ultima_carga,
+            'cargado_en': self.cargado_en,
+        }
+        if ins is not None:
+            datos['hechos'] = ins.filas
+            datos['filas_dimension'] = dict(ins.filas_dimension)
+            datos['valores_distintos'] = {a: len(attr.valores) for a, attr in ins.atributos.items()}
+            datos['memoria'] = ins.memoria()
+            if ins.cabecera:
+                datos['snapshot'] = {k: ins.cabecera[k] for k in ('formato', 'creado', 'pid')}
+            datos['marca'] = ins.marca
+        return datos
+
+
+def _alinear(n):
+    return -(-n // _ALINEACION) * _ALINEACION
+
+
+def _dtype_codigos(cardinalidad):
+    for tipo in (np.uint8, np.uint16, np.int32):
+        if cardinalidad <= int(np.iinfo(tipo).max) + 1:
+            return tipo
+    return np.int64
+
+
+def escribir_snapshot(ins, ruta):
+    """
+    Guarda la instantánea en `ruta` (archivo temporal + os.replace: quien tenga mapeado el anterior lo
+    sigue leyendo intacto). Incluye ya materializada la columna de cada atributo por hecho, con el
+    entero más pequeño que admite su diccionario, para que ningún proceso tenga que calcularla.
+    """
+    arreglos = {f'hechos.{k}': v for k, v in ins.hechos.items()}
+    for atributo, attr in ins.atributos.items():
+        arreglos[f'dim.{atributo}.codigos'] = attr.codigos
+        arreglos[f'dim.{atributo}.rango'] = attr.rango
+        arreglos[f'col.{atributo}'] = ins.columna(atributo).astype(_dtype_codigos(len(attr.valores)), copy=False)
+    cabecera = {
+        'formato': FORMATO_SNAPSHOT,
+        'creado': datetime.now().replace(microsecond=0).isoformat(),
+        'pid': os.getpid(),
+        'filas_dimension': ins.filas_dimension,
+        'marca': ins.marca,
+        'valores': {a: attr.valores for a, attr in ins.atributos.items()},
+        'arreglos': {},
+    }
+    desplazamiento = 0
+    for nombre, arr in arreglos.items():
+        arreglos[nombre] = arr = np.ascontiguousarray(arr)
+        cabecera['arreglos'][nombre] = {'dtype': arr.dtype.str, 'forma': list(arr.shape), 'offset': desplazamiento}
+        desplazamiento += _alinear(arr.nbytes)
+    datos_cabecera = json.dumps(cabecera, ensure_ascii=False).encode('utf-8')
+    inicio = _alinear(len(_MAGIA) + 8 + len(datos_cabecera))
+
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    try:
+        with open(temporal, 'wb') as f:
+            f.write(_MAGIA)
+            f.write(struct.pack('<Q', len(datos_cabecera)))
+            f.write(datos_cabecera)
+            f.write(b'\0' * (inicio - f.tell()))
+            for arr in arreglos.values():
+                f.write(arr.tobytes())
+                f.write(b'\0' * (_alinear(arr.nbytes) - arr.nbytes))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def leer_snapshot(ruta):
+    """Abre el snapshot con mmap de solo lectura; los arreglos apuntan al mapa (sin copiar)."""
+    with open(ruta, 'rb') as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapa[:len(_MAGIA)] != _MAGIA:
+        raise ValueError('no es un snapshot del cubo')
+    (largo,) = struct.unpack_from('<Q', mapa, len(_MAGIA))
+    cabecera = json.loads(mapa[len(_MAGIA) + 8:len(_MAGIA) + 8 + largo].decode('utf-8'))
+    if cabecera.get('formato') != FORMATO_SNAPSHOT:
+        raise ValueError(f"formato {cabecera.get('formato')} distinto de {FORMATO_SNAPSHOT}")
+    inicio = _alinear(len(_MAGIA) + 8 + largo)
+
+    def arreglo(nombre):
+        d = cabecera['arreglos'][nombre]
+        tipo = np.dtype(d['dtype'])
+        cuenta = int(np.prod(d['forma'], dtype=np.int64))
+        return np.frombuffer(mapa, dtype=tipo, count=cuenta, offset=inicio + d['offset']).reshape(d['forma'])
+
+    hechos = {k: arreglo(f'hechos.{k}') for k in ('producto', 'tiempo', 'sucursal', 'cantidad', 'monto_centavos')}
+    atributos = {a: _Atributo(cabecera['valores'][a], arreglo(f'dim.{a}.codigos'), arreglo(f'dim.{a}.rango'))
+                 for a in ATRIBUTOS}
+    columnas = {a: arreglo(f'col.{a}') for a in ATRIBUTOS}
+    del cabecera['arreglos'], cabecera['valores']
+    return _Instantanea(hechos, atributos, cabecera['filas_dimension'], columnas, cabecera, cabecera.get('marca'))
+
+
+def _sumar_ordenando(clave, valores, grupos):
+    """Suma exacta en int64 por grupo: ordena por clave (argsort) y reduce cada tramo."""
+    if len(clave) == 0:
+        return np.zeros(len(grupos), dtype=np.int64)
+    orden = np.argsort(clave, kind='stable')
+    ordenadas = clave[orden]
+    inicios = np.flatnonzero(np.r_[True, ordenadas[1:] != ordenadas[:-1]])
+    sumas = np.add.reduceat(valores[orden].astype(np.int64), inicios)
+    # Los grupos vienen ordenados y son exactamente las claves presentes
+    return sumas[np.searchsorted(ordenadas[inicios], grupos)]
+
+
+def _distintos_por_grupo(clave, grupos, grupo_de, productos, num_productos):
+    """COUNT(DISTINCT producto) por grupo."""
+    if grupo_de is None:
+        grupo_de = np.searchsorted(grupos, clave)
+    pares = np.unique(grupo_de.astype(np.int64) * max(num_productos, 1) + productos)
+    return np.bincount(pares // max(num_productos, 1), minlength=len(grupos))
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Canal de Server-Sent Events (SSE).
+Difusor reparte cada evento a todos los navegadores conectados; Publicador agrupa los avisos de las
+escrituras y ejecuta una sola vez el cálculo de lo que hay que enviar, sin importar cuántos clientes haya.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class Difusor:
+    """Suscripciones SSE con una cola acotada por cliente. Un cliente que no lee se desconecta."""
+
+    def __init__(self, max_cola=100, latido=15):
+        self.max_cola = max_cola
+        self.latido = latido
+        self._clientes = set()
+        self._lock = threading.Lock()
+        self._ultimo = {}
+        self.enviados = 0
+        self.descartados = 0
+
+    @staticmethod
+    def formatear(evento, datos):
+        return f'event: {evento}\ndata: {json.dumps(datos, default=str, ensure_ascii=False)}\n\n'
+
+    def publicar(self, evento, datos):
+        """Envía el evento a todos los clientes y lo guarda como último valor (lo recibe quien se conecte después)."""
+        mensaje = self.formatear(evento, datos)
+        with self._lock:
+            self._ultimo[evento] = mensaje
+            clientes = list(self._clientes)
+        enviados = 0
+        for cola in clientes:
+            try:
+                cola.put_nowait(mensaje)
+                enviados += 1
+            except queue.Full:
+                # Cliente lento: se corta; EventSource se reconecta solo y recibe el estado actual
+                with self._lock:
+                    self._clientes.discard(cola)
+                    self.descartados += 1
+                # Nunca un put bloqueante: se quita un mensaje para que quepa el aviso de cierre
+                try:
+                    cola.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    cola.put_nowait(None)
+                except queue.Full:
+                    pass
+        with self._lock:
+            self.enviados += enviados
+
+    def suscriptores(self):
+        with self._lock:
+            return len(self._clientes)
+
+    def suscribir(self, eventos_iniciales=()):
+        """Generador con el flujo text/event-stream de un cliente."""
+        cola = queue.Queue(self.max_cola + 1)
+        with self._lock:
+            self._clientes.add(cola)
+            iniciales = [self._ultimo[e] for e in eventos_iniciales if e in self._ultimo]
+        try:
+            yield 'retry: 3000\n\n'
+            for mensaje in iniciales:
+                yield mensaje
+            while True:
+                try:
+                    mensaje = cola.get(timeout=self.latido)
+                except queue.Empty:
+                    # Comentario SSE: mantiene viva la conexión y detecta clientes que ya se fueron
+                    yield ': latido\n\n'
+                    continue
+                if mensaje is None:
+                    return
+                yield mensaje
+        finally:
+            with self._lock:
+                self._clientes.discard(cola)
+                if not self._clientes:
+                    # Sin nadie escuchando el último estado dejaría de actualizarse: no se conserva
+                    self._ultimo.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'suscriptores': len(self._clientes),
+                'eventos_enviados': self.enviados,
+                'clientes_descartados': self.descartados,
+                'eventos_guardados': sorted(self._ultimo),
+            }
+
+
+class Publicador:
+    """
+    Hilo que, tras un aviso de cambio, espera `retraso` segundos para juntar ráfagas de escrituras y llama
+    a tarea(ids_marcados, forzar) una sola vez. Sin suscriptores no se calcula nada. `forzar` es True si
+    algún aviso lo pidió (un cliente nuevo): la tarea debe publicar el estado aunque no haya cambiado.
+    """
+
+    def __init__(self, difusor, tarea, retraso=0.5):
+        self.difusor = difusor
+        self._tarea = tarea
+        self.retraso = retraso
+        self._ids = set()
+        self._pendiente = False
+        self._forzar = False
+        self._lock = threading.Lock()
+        self._aviso = threading.Event()
+        self._hilo = None
+        self.ejecuciones = 0
+        self.errores = 0
+
+    def marcar(self, ids=(), forzar=False):
+        """Aviso barato desde las rutas de escritura: productos cuyo stock cambió (o ninguno)."""
+        if not forzar and not self.difusor.suscriptores():
+            return
+        with self._lock:
+            self._ids.update(ids)
+            self._pendiente = True
+            self._forzar = self._forzar or forzar
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name='publicador-sse', daemon=True)
+                self._hilo.start()
+        self._aviso.set()
+
+    def _bucle(self):
+        while True:
+            self._aviso.wait()
+            time.sleep(self.retraso)
+            self._aviso.clear()
+            with self._lock:
+                ids, self._ids = self._ids, set()
+                pendiente, self._pendiente = self._pendiente, False
+                forzar, self._forzar = self._forzar, False
+            if not pendiente:
+                continue
+            try:
+                self._tarea(ids, forzar)
+                self.ejecuciones += 1
+            except Exception:
+                self.errores += 1
+                log.exception('Error al calcular los eventos SSE')
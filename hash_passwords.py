@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Ejecutor acotado para el trabajo de bcrypt (hash y verificación de contraseñas).
+bcrypt suelta el GIL mientras calcula, así que unos pocos hilos dedicados bastan; lo importante
+es que una ráfaga de logins no ocupe todos los hilos de Flask ni compita sin límite por la CPU.
+
+Limitación: el hilo de la petición sigue esperando el resultado, es decir, mientras dura bcrypt
+(más la espera de turno) ese hilo de Flask está ocupado. Lo que se acota es cuánto: como mucho
+`espera_cola` para entrar en la cola y `espera_resultado` para obtener el hash; pasado eso se responde
+503 y la operación termina sola en el hilo de bcrypt.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TiempoAgotado
+
+import bcrypt
+
+
+class ColaHashLlena(Exception):
+    """Hay demasiadas operaciones de contraseña en curso o esperando."""
+
+
+class ServicioHash:
+    """
+    Pool de hilos para bcrypt con límite de concurrencia y de cola.
+
+    - hilos: operaciones bcrypt simultáneas.
+    - max_cola: operaciones que pueden esperar turno además de las que se ejecutan.
+    - rounds: coste de bcrypt para los hashes nuevos; los hashes con otro coste se rehacen al iniciar sesión.
+    - espera_cola: segundos que se espera un hueco en la cola antes de rechazar.
+    - espera_resultado: segundos que la petición espera el resultado (turno + cálculo) antes de rechazar.
+    """
+
+    def __init__(self, hilos=2, max_cola=32, rounds=10, espera_cola=0.5, espera_resultado=5.0):
+        if hilos < 1 or max_cola < 0 or not 4 <= rounds <= 31:
+            raise ValueError('Configuración de hash inválida')
+        self.hilos = hilos
+        self.max_cola = max_cola
+        self.rounds = rounds
+        self.espera_cola = espera_cola
+        self.espera_resultado = espera_resultado
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='bcrypt')
+        self._cupo = threading.BoundedSemaphore(hilos + max_cola)
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        # Métricas
+        self._operaciones = 0
+        self._rechazadas = 0
+        self._agotadas = 0
+        self._rehashes = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._calculo_total = 0.0
+        self._pendientes_max = 0
+
+    def _enviar(self, fn, *args):
+        if not self._cupo.acquire(timeout=self.espera_cola):
+            with self._lock:
+                self._rechazadas += 1
+            raise ColaHashLlena(f'Cola de contraseñas llena ({self.hilos} hilos + {self.max_cola} en espera)')
+        with self._lock:
+            self._pendientes += 1
+            self._pendientes_max = max(self._pendientes_max, self._pendientes)
+        encolada = time.monotonic()
+
+        def tarea():
+            inicio = time.monotonic()
+            try:
+                return fn(*args)
+            finally:
+                fin = time.monotonic()
+                with self._lock:
+                    self._pendientes -= 1
+                    self._operaciones += 1
+                    espera = inicio - encolada
+                    self._espera_total += espera
+                    self._espera_max = max(self._espera_max, espera)
+                    self._calculo_total += fin - inicio
+                self._cupo.release()
+
+        try:
+            return self._ejecutor.submit(tarea)
+        except Exception:
+            with self._lock:
+                self._pendientes -= 1
+            self._cupo.release()
+            raise
+
+    def _esperar(self, futuro):
+        """Resultado de la operación, o ColaHashLlena si no llega en espera_resultado segundos."""
+        try:
+            return futuro.result(timeout=self.espera_resultado)
+        except TiempoAgotado:
+            with self._lock:
+                self._agotadas += 1
+            raise ColaHashLlena(f'La operación de contraseña no terminó en {self.espera_resultado} s') from None
+
+    def hashear(self, password):
+        """Hash bcrypt (str) con el coste configurado. Espera como mucho espera_resultado segundos."""
+        return self._esperar(self._enviar(_hashear, password, self.rounds))
+
+    def verificar(self, password, hash_guardado):
+        """True si la contraseña coincide. Un hash mal formado cuenta como no coincidente."""
+        if not hash_guardado:
+            return False
+        return self._esperar(self._enviar(_verificar, password, hash_guardado))
+
+    def necesita_rehash(self, hash_guardado):
+        return coste_de(hash_guardado) not in (None, self.rounds)
+
+    def rehash_en_segundo_plano(self, password, guardar):
+        """
+        Calcula el hash con el coste actual y llama a guardar(nuevo_hash) en el hilo de bcrypt.
+        Si la cola está llena no se hace nada: se volverá a intentar en el siguiente login.
+        """
+        def tarea():
+            guardar(_hashear(password, self.rounds))
+            with self._lock:
+                self._rehashes += 1
+        try:
+            self._enviar(tarea)
+            return True
+        except ColaHashLlena:
+            return False
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True)
+
+    def estadisticas(self):
+        with self._lock:
+            ops = self._operaciones
+            return {
+                'hilos': self.hilos,
+                'max_cola': self.max_cola,
+                'rounds': self.rounds,
+                'pendientes': self._pendientes,
+                'pendientes_max': self._pendientes_max,
+                'operaciones': ops,
+                'rechazadas': self._rechazadas,
+                'tiempo_agotado': self._agotadas,
+                'rehashes': self._rehashes,
+                'espera_promedio_ms': round(self._espera_total / ops * 1000, 3) if ops else 0.0,
+                'espera_max_ms': round(self._espera_max * 1000, 3),
+                'calculo_promedio_ms': round(self._calculo_total / ops * 1000, 3) if ops else 0.0,
+            }
+
+
+def coste_de(hash_guardado):
+    """Coste (rounds) de un hash bcrypt '$2b$10$...', o None si no tiene ese formato."""
+    if isinstance(hash_guardado, bytes):
+        hash_guardado = hash_guardado.decode('utf-8', 'replace')
+    partes = (hash_guardado or '').split('$')
+    if len(partes) < 4 or not partes[2].isdigit():
+        return None
+    return int(partes[2])
+
+
+def _hashear(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _verificar(password, hash_guardado):
+    if isinstance(hash_guardado, str):
+        hash_guardado = hash_guardado.strip().encode('utf-8')
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hash_guardado)
+    except ValueError:
+        return False
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Caché LRU de resultados para los endpoints OLAP.
+fact_ventas solo cambia al refrescar el cubo, así que las respuestas se guardan ya serializadas.
+Cada entrada lleva la versión de las tablas de las que depende (versiones_tablas, compartida por todos
+los workers): cuando otra instancia refresca el cubo la versión cambia y las entradas viejas dejan de
+servirse sin que nadie tenga que avisar a este proceso; el LRU las va desalojando.
+"""
+import threading
+from collections import OrderedDict
+
+
+class CacheResultados:
+    """LRU acotado por número de entradas, con contadores de aciertos y fallos."""
+
+    def __init__(self, max_entradas=256):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    @staticmethod
+    def clave(endpoint, args=None, view_args=None):
+        """Clave normalizada: parámetros vacíos fuera y orden estable."""
+        params = tuple(sorted((k, v) for k, v in (args or ()) if v not in (None, '')))
+        ruta = tuple(sorted((view_args or {}).items()))
+        return (endpoint, ruta, params)
+
+    def obtener(self, clave, version):
+        with self._lock:
+            entrada = self._datos.get((version, clave))
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end((version, clave))
+            self.aciertos += 1
+            return entrada
+
+    def guardar(self, clave, valor, version):
+        """`version` es la que se leyó antes de calcular el valor: si los datos cambiaron mientras tanto,
+        la entrada queda con la versión vieja y no se vuelve a servir."""
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            self._datos[(version, clave)] = valor
+            self._datos.move_to_end((version, clave))
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'tasa_aciertos': round(self.aciertos / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Caché en memoria de claves sustitutas del Data Warehouse.
+Resuelve id_fuente → sk_producto y fecha → sk_tiempo sin ir a MySQL por cada fila.
+Cada mapa se carga con una sola consulta y las fechas que faltan se insertan como rango.
+"""
+import threading
+from datetime import date, datetime
+
+
+class CacheDimensiones:
+    """Mapas de claves sustitutas compartidos por el ETL y cualquier otro cargador."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._productos = None
+        self._productos_sucios = True
+        self._tiempo = None
+        self._sucursales = None
+        self._cambios_atributos = 0
+        self.consultas = 0
+
+    # --- Producto ---
+    def invalidar_productos(self):
+        """Marca dim_producto como desactualizada (cambió productos o categorias)."""
+        with self._lock:
+            self._productos_sucios = True
+
+    def sincronizar_productos(self, conn):
+        """Copia productos → dim_producto (set-based) y recarga el mapa id_fuente → sk_producto."""
+        cur = conn.cursor()
+        try:
+            cur.execute('SELECT COUNT(*) AS n FROM dim_producto')
+            antes = cur.fetchone()['n']
+            cur.execute("""
+                INSERT INTO dim_producto (id_fuente, nombre, categoria)
+                SELECT p.id, TRIM(p.nombre), TRIM(COALESCE(c.nombre, 'Sin categoría'))
+                FROM productos p
+                LEFT JOIN categorias c ON p.categoria_id = c.id
+                ON DUPLICATE KEY UPDATE nombre = VALUES(nombre), categoria = VALUES(categoria)
+            """)
+            afectadas = cur.rowcount
+            cur.execute('SELECT id_fuente, sk_producto FROM dim_producto')
+            mapa = {r['id_fuente']: r['sk_producto'] for r in cur.fetchall()}
+        finally:
+            cur.close()
+        # ON DUPLICATE KEY UPDATE cuenta 1 por fila insertada y 2 por fila modificada
+        insertadas = len(mapa) - antes
+        with self._lock:
+            self._productos = mapa
+            self._productos_sucios = False
+            self._cambios_atributos += max(0, (afectadas - insertadas) // 2)
+            self.consultas += 3
+        return mapa
+
+    def consumir_cambios_atributos(self):
+        """Filas de dim_producto cuyo nombre/categoría cambió desde la última llamada."""
+        with self._lock:
+            n = self._cambios_atributos
+            self._cambios_atributos = 0
+            return n
+
+    def productos(self, conn):
+        with self._lock:
+            if self._productos is not None and not self._productos_sucios:
+                return self._productos
+        return self.sincronizar_productos(conn)
+
+    # --- Tiempo ---
+    def tiempo(self, conn):
+        with self._lock:
+            if self._tiempo is not None:
+                return self._tiempo
+        cur = conn.cursor()
+        try:
+            cur.execute('SELECT fecha, sk_tiempo FROM dim_tiempo')
+            mapa = {r['fecha']: r['sk_tiempo'] for r in cur.fetchall()}
+        finally:
+            cur.close()
+        with self._lock:
+            self._tiempo = mapa
+            self.consultas += 1
+        return mapa
+
+    def asegurar_fechas(self, conn, fechas):
+        """
+        Garantiza que todas las fechas estén en dim_tiempo. Las que faltan se insertan de una vez
+        como rango continuo (igual que rellenar_dim_tiempo_rapido.sql) y se añaden al mapa.
+        """
+        mapa = self.tiempo(conn)
+        faltan = {_como_fecha(f) for f in fechas} - mapa.keys()
+        if not faltan:
+            return mapa
+        desde, hasta = min(faltan), max(faltan)
+        cur = conn.cursor()
+        try:
+            # SET_VAR solo afecta a esta sentencia: la conexión vuelve al pool con su valor de siempre
+            profundidad = int((hasta - desde).days + 2)
+            cur.execute(f"""
+                INSERT /*+ SET_VAR(cte_max_recursion_depth = {profundidad}) */ IGNORE INTO dim_tiempo (fecha, dia, mes, nombre_mes, trimestre, anio, nombre_dia_semana, es_fin_de_semana, semana_del_anio)
+                WITH RECURSIVE fechas(d) AS (
+                  SELECT DATE(%s) UNION ALL
+                  SELECT d + INTERVAL 1 DAY FROM fechas WHERE d < DATE(%s)
+                )
+                SELECT d, DAYOFMONTH(d), MONTH(d),
+                  ELT(MONTH(d), 'Enero','Febrero','Marzo','Abril','Mayo','Junio','Julio','Agosto','Septiembre','Octubre','Noviembre','Diciembre'),
+                  QUARTER(d), YEAR(d),
+                  ELT(DAYOFWEEK(d), 'Domingo','Lunes','Martes','Miércoles','Jueves','Viernes','Sábado'),
+                  IF(DAYOFWEEK(d) IN (1, 7), 1, 0), WEEKOFYEAR(d)
+                FROM fechas
+            """, (desde, hasta))
+            cur.execute('SELECT fecha, sk_tiempo FROM dim_tiempo WHERE fecha BETWEEN %s AND %s', (desde, hasta))
+            nuevas = {r['fecha']: r['sk_tiempo'] for r in cur.fetchall()}
+        finally:
+            cur.close()
+        with self._lock:
+            if self._tiempo is None:
+                self._tiempo = dict(mapa)
+            self._tiempo.update(nuevas)
+            self.consultas += 2
+            return self._tiempo
+
+    # --- Sucursal ---
+    def sucursales(self, conn):
+        with self._lock:
+            if self._sucursales is not None:
+                return self._sucursales
+        cur = conn.cursor()
+        try:
+            cur.execute('SELECT sk_sucursal FROM dim_sucursal ORDER BY sk_sucursal')
+            lista = [r['sk_sucursal'] for r in cur.fetchall()]
+        finally:
+            cur.close()
+        with self._lock:
+            self._sucursales = lista
+            self.consultas += 1
+        return lista
+
+    def invalidar_sucursales(self):
+        with self._lock:
+            self._sucursales = None
+
+    def invalidar(self):
+        with self._lock:
+            self._productos = None
+            self._productos_sucios = True
+            self._tiempo = None
+            self._sucursales = None
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'productos': len(self._productos) if self._productos is not None else None,
+                'productos_desactualizados': self._productos_sucios,
+                'fechas': len(self._tiempo) if self._tiempo is not None else None,
+                'sucursales': len(self._sucursales) if self._sucursales is not None else None,
+                'consultas_realizadas': self.consultas,
+            }
+
+
+def _como_fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
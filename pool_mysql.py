@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de conexiones MySQL (PyMySQL) seguro para hilos.
+Reutiliza conexiones entre peticiones en lugar de abrir una nueva cada vez.
+"""
+import threading
+import time
+from collections import deque
+
+import pymysql
+
+
+class PoolAgotado(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera."""
+
+
+class _Entrada:
+    __slots__ = ('conn', 'creada', 'ultimo_uso')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.creada = time.monotonic()
+        self.ultimo_uso = self.creada
+
+
+class PoolMySQL:
+    """
+    Pool con tamaño mínimo/máximo, verificación de salud y reciclaje.
+
+    - min_size: conexiones que se abren al crear el pool y se mantienen.
+    - max_size: límite de conexiones abiertas (prestadas + libres).
+    - max_idle: segundos que una conexión puede estar libre antes de cerrarse.
+    - max_age: segundos de vida máxima de una conexión (se recicla al devolverla o pedirla).
+    - ping_after: si una conexión lleva más de estos segundos libre, se hace ping antes de prestarla.
+    - timeout: segundos máximos de espera por una conexión libre.
+    """
+
+    def __init__(self, config_fn, min_size=1, max_size=10, max_idle=300, max_age=3600,
+                 ping_after=30, timeout=10):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError('Tamaños de pool inválidos')
+        self._config_fn = config_fn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self._libres = deque()
+        self._prestadas = {}
+        self._cond = threading.Condition(threading.Lock())
+        self._abiertas = 0
+        # Métricas
+        self._prestamos = 0
+        self._esperas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._creadas = 0
+        self._descartadas = 0
+        self._agotado = 0
+        self._ultima_purga = time.monotonic()
+        for _ in range(min_size):
+            try:
+                self._libres.append(self._nueva())
+            except pymysql.err.MySQLError:
+                # Si MySQL no está disponible al arranque se crean bajo demanda.
+                break
+
+    def _nueva(self):
+        conn = pymysql.connect(**self._config_fn())
+        with self._cond:
+            self._abiertas += 1
+            self._creadas += 1
+        return _Entrada(conn)
+
+    def _cerrar(self, entrada):
+        try:
+            entrada.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._abiertas -= 1
+            self._descartadas += 1
+            self._cond.notify()
+
+    def _sana(self, entrada, ahora):
+        if self.max_age and ahora - entrada.creada > self.max_age:
+            return False
+        if self.max_idle and ahora - entrada.ultimo_uso > self.max_idle:
+            return False
+        if ahora - entrada.ultimo_uso > self.ping_after:
+            try:
+                entrada.conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def obtener(self):
+        """Presta una conexión; espera hasta `timeout` si el pool está lleno."""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        hubo_espera = False
+        while True:
+            entrada = None
+            crear = False
+            with self._cond:
+                while True:
+                    if self._libres:
+                        entrada = self._libres.pop()
+                        break
+                    if self._abiertas < self.max_size:
+                        self._abiertas += 1
+                        crear = True
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._agotado += 1
+                        raise PoolAgotado(
+                            f'No hay conexiones MySQL libres tras {self.timeout}s (max_size={self.max_size})'
+                        )
+                    hubo_espera = True
+                    self._cond.wait(restante)
+            if crear:
+                try:
+                    conn = pymysql.connect(**self._config_fn())
+                except Exception:
+                    with self._cond:
+                        self._abiertas -= 1
+                        self._cond.notify()
+                    raise
+                entrada = _Entrada(conn)
+                with self._cond:
+                    self._creadas += 1
+                break
+            if self._sana(entrada, time.monotonic()):
+                break
+            self._cerrar(entrada)
+        espera = time.monotonic() - inicio
+        with self._cond:
+            self._prestadas[id(entrada.conn)] = entrada
+            self._prestamos += 1
+            self._espera_total += espera
+            if hubo_espera:
+                self._esperas += 1
+            if espera > self._espera_max:
+                self._espera_max = espera
+        return entrada.conn
+
+    def devolver(self, conn):
+        """Devuelve una conexión al pool. Descarta la transacción abierta, como hacía close()."""
+        with self._cond:
+            entrada = self._prestadas.pop(id(conn), None)
+        if entrada is None:
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            self._cerrar(entrada)
+            return
+        ahora = time.monotonic()
+        if self.max_age and ahora - entrada.creada > self.max_age:
+            self._cerrar(entrada)
+            return
+        entrada.ultimo_uso = ahora
+        with self._cond:
+            self._libres.append(entrada)
+            self._cond.notify()
+            purgar = self.max_idle and ahora - self._ultima_purga > self.max_idle
+            if purgar:
+                self._ultima_purga = ahora
+        if purgar:
+            self.purgar_inactivas()
+
+    def descartar(self, conn):
+        """Cierra una conexión prestada que quedó en mal estado."""
+        with self._cond:
+            entrada = self._prestadas.pop(id(conn), None)
+        if entrada is not None:
+            self._cerrar(entrada)
+
+    def purgar_inactivas(self):
+        """Cierra conexiones libres que superan max_idle/max_age, respetando min_size."""
+        ahora = time.monotonic()
+        cerrar = []
+        with self._cond:
+            conservar = deque()
+            for entrada in self._libres:
+                vieja = (self.max_age and ahora - entrada.creada > self.max_age) or \
+                        (self.max_idle and ahora - entrada.ultimo_uso > self.max_idle)
+                if vieja and self._abiertas - len(cerrar) > self.min_size:
+                    cerrar.append(entrada)
+                else:
+                    conservar.append(entrada)
+            self._libres = conservar
+        for entrada in cerrar:
+            self._cerrar(entrada)
+        return len(cerrar)
+
+    def cerrar_todo(self):
+        with self._cond:
+            libres = list(self._libres)
+            self._libres.clear()
+        for entrada in libres:
+            self._cerrar(entrada)
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'abiertas': self._abiertas,
+                'libres': len(self._libres),
+                'prestadas': len(self._prestadas),
+                'prestamos': self._prestamos,
+                'prestamos_con_espera': self._esperas,
+                'espera_promedio_ms': round(self._espera_total / self._prestamos * 1000, 3) if self._prestamos else 0.0,
+                'espera_max_ms': round(self._espera_max * 1000, 3),
+                'conexiones_creadas': self._creadas,
+                'conexiones_descartadas': self._descartadas,
+                'timeouts': self._agotado,
+            }
@@ -20,6 +20,27 @@ let editIdSucursal = null;
 let editModeCategoria = false;
 let editIdCategoria = null;
 
+// ================================
+// Peticiones GET con ETag (304 = reutilizar la respuesta guardada)
+// ================================
+const respuestasEtag = new Map();
+
+async function fetchConEtag(url, options = {}) {
+    const guardada = respuestasEtag.get(url);
+    const headers = new Headers(options.headers || {});
+    if (guardada) headers.set('If-None-Match', guardada.etag);
+    const response = await fetch(url, { ...options, headers });
+    if (response.status === 304 && guardada) {
+        return new Response(guardada.cuerpo, { status: 200, headers: guardada.headers });
+    }
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) {
+        const cuerpo = await response.clone().text();
+        respuestasEtag.set(url, { etag, cuerpo, headers: [...response.headers] });
+    }
+    return response;
+}
+
 // ================================
 // Funciones de Navegación
 // ================================
@@ -83,7 +104,7 @@ async function renderTable() {
         if (busquedaProductos.q) params.set('q', busquedaProductos.q);
         if (busquedaProductos.categoria_id) params.set('categoria_id', busquedaProductos.categoria_id);
         const url = '/api/productos' + (params.toString() ? '?' + params.toString() : '');
-        const response = await fetch(url, { credentials: 'include' });
+        const response = await fetchConEtag(url, { credentials: 'include' });
         const productos = await response.json();
         
         const tbody = document.querySelector('#product-table tbody');
@@ -192,7 +213,7 @@ function resetForm() {
 
 async function renderSucursalesTable() {
     try {
-        const response = await fetch('/api/sucursales', {
+        const response = await fetchConEtag('/api/sucursales', {
             credentials: 'include'
         });
         const sucursales = await response.json();
@@ -336,7 +357,7 @@ async function deleteSucursal(id) {
 
 async function renderCategoriasTable() {
     try {
-        const response = await fetch('/api/categorias', {
+        const response = await fetchConEtag('/api/categorias', {
             credentials: 'include'
         });
         const categorias = await response.json();
@@ -446,7 +467,7 @@ async function deleteCategoria(id) {
 
 async function loadCategoriasSelect() {
     try {
-        const response = await fetch('/api/categorias', { credentials: 'include' });
+        const response = await fetchConEtag('/api/categorias', { credentials: 'include' });
         const categorias = await response.json();
         const opts = '<option value="">Selecciona una categoría</option>' + categorias.map(c => `<option value="${c.id}">${c.nombre}</option>`).join('');
         const select = document.getElementById('categoria');
@@ -462,17 +483,18 @@ async function loadCategoriasSelect() {
 // PANEL PRINCIPAL: MÉTRICAS Y ALERTAS
 // ================================
 
-async function loadDashboardMetricas() {
+function setMetricas(data) {
     const agotadosEl = document.getElementById('metricas-agotados');
     const pendientesEl = document.getElementById('metricas-pendientes');
     const ocupacionEl = document.getElementById('metricas-ocupacion');
     const unidadesEl = document.getElementById('metricas-unidades');
-    const setMetricas = (data) => {
-        if (agotadosEl) agotadosEl.textContent = data.productos_agotados ?? 0;
-        if (pendientesEl) pendientesEl.textContent = data.ordenes_pendientes_surtir ?? 0;
-        if (ocupacionEl) ocupacionEl.textContent = data.ocupacion_almacen || '—';
-        if (unidadesEl) unidadesEl.textContent = (data.total_unidades ?? 0) + ' unidades';
-    };
+    if (agotadosEl) agotadosEl.textContent = data.productos_agotados ?? 0;
+    if (pendientesEl) pendientesEl.textContent = data.ordenes_pendientes_surtir ?? 0;
+    if (ocupacionEl) ocupacionEl.textContent = data.ocupacion_almacen || '—';
+    if (unidadesEl) unidadesEl.textContent = (data.total_unidades ?? 0) + ' unidades';
+}
+
+async function loadDashboardMetricas() {
     try {
         const response = await fetch('/api/dashboard/metricas', { credentials: 'include' });
         const data = await response.json().catch(() => ({}));
@@ -499,42 +521,62 @@ async function loadDashboardMetricas() {
 
 async function loadPanelAlertas() {
     try {
-        const response = await fetch('/api/alertas/bajo-stock', { credentials: 'include' });
-        const alertas = await response.json();
-        const container = document.getElementById('panel-alertas-bajo-stock');
-        const banner = document.getElementById('alertas-banner');
-        if (!container) return;
-        if (alertas.length === 0) {
-            container.innerHTML = '<p style="color: var(--text-secondary);">✅ Ningún producto bajo punto de reorden.</p>';
-            if (banner) banner.classList.add('hidden');
-            return;
-        }
-        if (banner) {
-            banner.classList.remove('hidden');
-            const text = document.getElementById('alertas-banner-text');
-            if (text) text.textContent = alertas.length + ' producto(s) bajo punto de reorden';
-        }
-        container.innerHTML = alertas.map(p => `
-            <div style="display: flex; justify-content: space-between; align-items: center; padding: 0.75rem; border-bottom: 1px solid rgba(0,0,0,0.06);">
-                <div>
-                    <strong>${p.nombre}</strong> ${p.codigo ? '(' + p.codigo + ')' : ''}
-                    <div style="font-size: 0.875rem; color: var(--text-secondary);">${p.categoria || 'Sin categoría'} · Punto reorden: ${p.punto_reorden ?? 5}</div>
-                </div>
-                <span style="background: #b91c1c; color: white; padding: 0.35rem 0.75rem; border-radius: 6px; font-weight: 700;">${p.stock}</span>
-            </div>
-        `).join('');
+        const response = await fetchConEtag('/api/alertas/bajo-stock', { credentials: 'include' });
+        pintarPanelAlertas(await response.json());
     } catch (err) {
         console.error('Error al cargar alertas panel:', err);
     }
 }
 
+function pintarPanelAlertas(alertas) {
+    const container = document.getElementById('panel-alertas-bajo-stock');
+    const banner = document.getElementById('alertas-banner');
+    if (!container) return;
+    if (alertas.length === 0) {
+        container.innerHTML = '<p style="color: var(--text-secondary);">✅ Ningún producto bajo punto de reorden.</p>';
+        if (banner) banner.classList.add('hidden');
+        return;
+    }
+    if (banner) {
+        banner.classList.remove('hidden');
+        const text = document.getElementById('alertas-banner-text');
+        if (text) text.textContent = alertas.length + ' producto(s) bajo punto de reorden';
+    }
+    container.innerHTML = alertas.map(p => `
+        <div style="display: flex; justify-content: space-between; align-items: center; padding: 0.75rem; border-bottom: 1px solid rgba(0,0,0,0.06);">
+            <div>
+                <strong>${p.nombre}</strong> ${p.codigo ? '(' + p.codigo + ')' : ''}
+                <div style="font-size: 0.875rem; color: var(--text-secondary);">${p.categoria || 'Sin categoría'} · Punto reorden: ${p.punto_reorden ?? 5}</div>
+            </div>
+            <span style="background: #b91c1c; color: white; padding: 0.35rem 0.75rem; border-radius: 6px; font-weight: 700;">${p.stock}</span>
+        </div>
+    `).join('');
+}
+
+// Canal SSE: el servidor empuja métricas y alertas cuando cambian, en lugar de volver a consultarlas
+let eventosServidor = null;
+
+function iniciarEventos() {
+    if (eventosServidor || !window.EventSource) return;
+    eventosServidor = new EventSource('/api/eventos', { withCredentials: true });
+    eventosServidor.addEventListener('metricas', (e) => setMetricas(JSON.parse(e.data)));
+    eventosServidor.addEventListener('alertas', (e) => {
+        const datos = JSON.parse(e.data);
+        pintarPanelAlertas(datos.lista);
+        const nuevas = datos.lista.filter(p => datos.entran.includes(p.id));
+        if (nuevas.length) {
+            mostrarNotificacion(`⚠️ Bajo punto de reorden: ${nuevas.map(p => p.nombre).join(', ')}`, 'danger');
+        }
+    });
+}
+
 // ================================
 // MOVIMIENTOS (ENTRADAS / SALIDAS)
 // ================================
 
 async function loadProductosParaMovimientos() {
     try {
-        const res = await fetch('/api/productos', { credentials: 'include' });
+        const res = await fetchConEtag('/api/productos', { credentials: 'include' });
         const productos = await res.json();
         const sel = document.getElementById('mov-producto');
         if (!sel) return;
@@ -544,18 +586,25 @@ async function loadProductosParaMovimientos() {
     }
 }
 
-async function loadMovimientos() {
+// Cursor del historial: id del último movimiento mostrado (cabecera X-Next-After-Id)
+let movimientosSiguiente = null;
+
+async function loadMovimientos(mas = false) {
     try {
-        const res = await fetch('/api/movimientos?limit=50', { credentials: 'include' });
+        const desde = mas && movimientosSiguiente ? `&after_id=${movimientosSiguiente}` : '';
+        const res = await fetch(`/api/movimientos?limit=50${desde}`, { credentials: 'include' });
         const rows = await res.json();
         const tbody = document.getElementById('movimientos-tbody');
         if (!tbody) return;
-        if (rows.length === 0) {
+        movimientosSiguiente = res.headers.get('X-Next-After-Id');
+        const botonMas = document.getElementById('movimientos-mas');
+        if (botonMas) botonMas.style.display = movimientosSiguiente ? '' : 'none';
+        if (rows.length === 0 && !mas) {
             tbody.innerHTML = '<tr><td colspan="5" style="text-align: center;">No hay movimientos</td></tr>';
             return;
         }
         const tipoLabel = { entrada_compra: 'Entrada (Compra)', entrada_devolucion: 'Entrada (Devolución)', salida_venta: 'Salida (Venta)', salida_baja: 'Salida (Baja)' };
-        tbody.innerHTML = rows.map(m => `
+        const html = rows.map(m => `
             <tr>
                 <td>${new Date(m.created_at).toLocaleString('es-MX')}</td>
                 <td>${m.producto_nombre} ${m.producto_codigo ? '(' + m.producto_codigo + ')' : ''}</td>
@@ -564,6 +613,8 @@ async function loadMovimientos() {
                 <td>${m.observaciones || '—'}</td>
             </tr>
         `).join('');
+        if (mas) tbody.insertAdjacentHTML('beforeend', html);
+        else tbody.innerHTML = html;
     } catch (err) {
         document.getElementById('movimientos-tbody').innerHTML = '<tr><td colspan="5" style="text-align: center;">Error al cargar</td></tr>';
     }
@@ -575,7 +626,7 @@ async function loadMovimientos() {
 
 async function loadProductosParaPedidos() {
     try {
-        const res = await fetch('/api/productos', { credentials: 'include' });
+        const res = await fetchConEtag('/api/productos', { credentials: 'include' });
         const productos = await res.json();
         const sel = document.getElementById('pedido-producto');
         if (!sel) return;
@@ -611,6 +662,18 @@ async function loadPedidos() {
     }
 }
 
+// Las operaciones largas responden 202 con el id de un trabajo; se consulta su estado hasta que termina
+async function esperarTrabajo(id, alAvanzar) {
+    while (true) {
+        const res = await fetch(`/api/trabajos/${id}`, { credentials: 'include' });
+        const t = await res.json();
+        if (!res.ok) throw new Error(t.error || 'Error al consultar el trabajo');
+        if (t.terminado) return t;
+        if (alAvanzar) alAvanzar(t);
+        await new Promise(r => setTimeout(r, 1000));
+    }
+}
+
 async function ejecutarAsignacion(producto_id) {
     try {
         const res = await fetch('/api/asignacion/ejecutar', {
@@ -620,12 +683,17 @@ async function ejecutarAsignacion(producto_id) {
             credentials: 'include'
         });
         const data = await res.json();
-        if (res.ok) {
-            mostrarNotificacion(data.message || 'Asignación ejecutada', 'success');
+        if (!res.ok) {
+            mostrarNotificacion(data.error || 'Error en asignación', 'danger');
+            return;
+        }
+        const t = await esperarTrabajo(data.trabajo_id);
+        if (t.estado === 'completado') {
+            mostrarNotificacion((t.resultado && t.resultado.message) || 'Asignación ejecutada', 'success');
             loadPedidos();
             loadDashboardMetricas();
         } else {
-            mostrarNotificacion(data.error || 'Error en asignación', 'danger');
+            mostrarNotificacion(t.error || t.mensaje || 'Error en asignación', 'danger');
         }
     } catch (err) {
         mostrarNotificacion('Error de conexión o motor Python no disponible', 'danger');
@@ -638,7 +706,7 @@ async function ejecutarAsignacion(producto_id) {
 
 async function loadReglasAsignacion() {
     try {
-        const res = await fetch('/api/reglas-asignacion', { credentials: 'include' });
+        const res = await fetchConEtag('/api/reglas-asignacion', { credentials: 'include' });
         const reglas = await res.json();
         const container = document.getElementById('reglas-container');
         if (!container) return;
@@ -695,7 +763,7 @@ async function actualizarRegla(id, criterio) {
 
 async function loadAlertasBajoStock() {
     try {
-        const response = await fetch('/api/alertas/bajo-stock', {
+        const response = await fetchConEtag('/api/alertas/bajo-stock', {
             credentials: 'include'
         });
         const alertas = await response.json();
@@ -770,10 +838,17 @@ async function refrescarCuboOLAP() {
         });
         
         const data = await response.json();
+        const t = response.ok
+            ? await esperarTrabajo(data.trabajo_id, t => {
+                const titulo = document.querySelector('#export-loading h3');
+                if (titulo) titulo.textContent = `Actualizando Cubo OLAP... ${Math.round(t.progreso || 0)}%`;
+            })
+            : null;
         
-        if (response.ok) {
+        if (t && t.estado === 'completado') {
             ocultarLoadingExport();
-            mostrarNotificacion('✅ Cubo OLAP actualizado exitosamente', 'success');
+            const etl = (t.resultado && t.resultado.etl) || {};
+            mostrarNotificacion(`✅ Cubo OLAP actualizado: ${etl.insertadas ?? 0} ventas nuevas (${etl.filas_por_segundo ?? 0} filas/s)`, 'success');
             
             const dashboardSection = document.getElementById('dashboard-section');
             if (dashboardSection && dashboardSection.style.display !== 'none') {
@@ -781,7 +856,8 @@ async function refrescarCuboOLAP() {
             }
         } else {
             ocultarLoadingExport();
-            mostrarNotificacion('❌ Error al actualizar el cubo', 'danger');
+            const detalle = t ? t.error : data.error;
+            mostrarNotificacion(`❌ Error al actualizar el cubo${detalle ? ': ' + detalle : ''}`, 'danger');
         }
     } catch (err) {
         console.error('Error al refrescar cubo:', err);
@@ -796,7 +872,7 @@ async function refrescarCuboOLAP() {
 
 async function loadProductosEstrella() {
     try {
-        const response = await fetch('/api/olap/productos-estrella', {
+        const response = await fetchConEtag('/api/olap/productos-estrella', {
             credentials: 'include'
         });
         const productos = await response.json();
@@ -899,7 +975,7 @@ async function loadAnalisisTemporal(nivel) {
             }
         });
         
-        const response = await fetch(`/api/olap/analisis-temporal?nivel=${nivel}`, {
+        const response = await fetchConEtag(`/api/olap/analisis-temporal?nivel=${nivel}`, {
             credentials: 'include'
         });
         
@@ -1028,7 +1104,7 @@ async function loadDashboardData() {
 
 async function loadEstadisticasGenerales() {
     try {
-        const response = await fetch('/api/olap/kpi/estadisticas', {
+        const response = await fetchConEtag('/api/olap/kpi/estadisticas', {
             credentials: 'include'
         });
         const stats = await response.json();
@@ -1050,7 +1126,7 @@ async function loadEstadisticasGenerales() {
 
 async function loadVentasPorCategoria() {
     try {
-        const response = await fetch('/api/olap/ventas', {
+        const response = await fetchConEtag('/api/olap/ventas', {
             credentials: 'include'
         });
         const data = await response.json();
@@ -1125,7 +1201,7 @@ async function loadVentasPorCategoria() {
 
 async function loadTopProductos() {
     try {
-        const response = await fetch('/api/olap/kpi/top-productos?limit=5', {
+        const response = await fetchConEtag('/api/olap/kpi/top-productos?limit=5', {
             credentials: 'include'
         });
         const data = await response.json();
@@ -1186,7 +1262,7 @@ async function loadTopProductos() {
 
 async function loadRankingSucursales() {
     try {
-        const response = await fetch('/api/olap/kpi/ranking-sucursales', {
+        const response = await fetchConEtag('/api/olap/kpi/ranking-sucursales', {
             credentials: 'include'
         });
         const data = await response.json();
@@ -1242,7 +1318,7 @@ async function loadRankingSucursales() {
 
 async function loadTendenciaMensual() {
     try {
-        const response = await fetch('/api/olap/kpi/tendencia-mensual?anio=2024', {
+        const response = await fetchConEtag('/api/olap/kpi/tendencia-mensual?anio=2024', {
             credentials: 'include'
         });
         const data = await response.json();
@@ -1305,7 +1381,7 @@ async function loadTendenciaMensual() {
 
 async function loadAnalisisPorRegion() {
     try {
-        const response = await fetch('/api/olap/kpi/ranking-sucursales', {
+        const response = await fetchConEtag('/api/olap/kpi/ranking-sucursales', {
             credentials: 'include'
         });
         const data = await response.json();
@@ -1369,7 +1445,7 @@ async function loadAnalisisPorRegion() {
 
 async function loadAnalisisDetallado() {
     try {
-        const response = await fetch('/api/olap/kpi/top-productos?limit=10', {
+        const response = await fetchConEtag('/api/olap/kpi/top-productos?limit=10', {
             credentials: 'include'
         });
         const data = await response.json();
@@ -1616,6 +1692,7 @@ document.addEventListener('DOMContentLoaded', () => {
         if (ok) {
             loadDashboardMetricas();
             loadPanelAlertas();
+            iniciarEventos();
         }
     });
     loadCategoriasSelect();
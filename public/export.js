@@ -605,24 +605,42 @@ async function exportarJSON() {
     }
 }
 
+// ============================================
+// EXPORTAR HISTORIAL COMPLETO (streaming desde el servidor)
+// ============================================
+// recurso: 'movimientos' | 'ventas' | 'fact_ventas'; filtros: { producto_id, tipo, desde, hasta }
+function exportarHistorial(recurso, formato = 'csv', filtros = {}) {
+    const params = new URLSearchParams({ formato });
+    Object.entries(filtros).forEach(([k, v]) => {
+        if (v !== undefined && v !== null && v !== '') params.append(k, v);
+    });
+    // El navegador descarga el archivo conforme llega, sin armarlo en memoria
+    const enlace = document.createElement('a');
+    enlace.href = `/api/exportar/${recurso}?${params.toString()}`;
+    document.body.appendChild(enlace);
+    enlace.click();
+    enlace.remove();
+    mostrarNotificacion('⬇️ Descarga del historial iniciada', 'success');
+}
+
 // ============================================
 // FUNCIÓN AUXILIAR PARA CARGAR DATOS
 // ============================================
 async function cargarDatosParaExport() {
     try {
-        const statsResponse = await fetch('/api/olap/kpi/estadisticas', { credentials: 'include' });
+        const statsResponse = await fetchConEtag('/api/olap/kpi/estadisticas', { credentials: 'include' });
         datosGlobalesDashboard.estadisticas = await statsResponse.json();
         
-        const ventasResponse = await fetch('/api/olap/ventas', { credentials: 'include' });
+        const ventasResponse = await fetchConEtag('/api/olap/ventas', { credentials: 'include' });
         datosGlobalesDashboard.ventasPorCategoria = await ventasResponse.json();
         
-        const topProductosResponse = await fetch('/api/olap/kpi/top-productos?limit=10', { credentials: 'include' });
+        const topProductosResponse = await fetchConEtag('/api/olap/kpi/top-productos?limit=10', { credentials: 'include' });
         datosGlobalesDashboard.topProductos = await topProductosResponse.json();
         
-        const sucursalesResponse = await fetch('/api/olap/kpi/ranking-sucursales', { credentials: 'include' });
+        const sucursalesResponse = await fetchConEtag('/api/olap/kpi/ranking-sucursales', { credentials: 'include' });
         datosGlobalesDashboard.sucursales = await sucursalesResponse.json();
         
-        const tendenciaResponse = await fetch('/api/olap/kpi/tendencia-mensual?anio=2024', { credentials: 'include' });
+        const tendenciaResponse = await fetchConEtag('/api/olap/kpi/tendencia-mensual?anio=2024', { credentials: 'include' });
         datosGlobalesDashboard.tendenciaMensual = await tendenciaResponse.json();
         
     } catch (error) {
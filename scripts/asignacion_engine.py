@@ -2,10 +2,17 @@
 # -*- coding: utf-8 -*-
 """
 Motor de Asignación Automática.
+
+Uso como biblioteca (lo que hace app.py):
+    from scripts import asignacion_engine
+    asignacion_engine.asignar(pedidos, stock_disponible, criterio)
+
+Uso por línea de comandos:
 Lee por stdin un JSON con: producto_id, stock_disponible, criterio, pedidos.
 Escribe por stdout un JSON con lista de { pedido_id, cantidad_asignada }.
 """
 
+import heapq
 import json
 import sys
 from datetime import datetime
@@ -22,25 +29,90 @@ def parse_fecha(s):
         return datetime.min
 
 
+# Claves de orden: se calculan una vez por pedido (fecha ya convertida) antes de seleccionar
+def _clave_fifo(p):
+    return parse_fecha(p.get('fecha_solicitud'))
+
+
+def _clave_mayor(p):
+    return (-(p.get('prioridad') or 0), parse_fecha(p.get('fecha_solicitud')))
+
+
+def _clave_cantidad(p):
+    return p.get('cantidad_solicitada') or 0
+
+
+# Se usa el montículo si se espera agotar el stock con menos de 1/FRACCION_MONTICULO de los pedidos;
+# si tras sacar el doble de esa cantidad sigue quedando stock, se ordena el resto de una vez
+FRACCION_MONTICULO = 32
+# Pedidos con los que se estima cuántos harán falta para agotar el stock
+TAM_MUESTRA = 256
+
+
+def _pedidos_estimados(pedidos, stock, clave):
+    """
+    Pedidos que se espera atender antes de agotar `stock`: se reparte el stock sobre una muestra
+    ordenada con el mismo criterio, escalada al total de pedidos.
+    """
+    muestra = sorted(pedidos[:TAM_MUESTRA], key=clave)
+    escala = len(pedidos) / len(muestra) if muestra else 0
+    acumulado = 0
+    for j, p in enumerate(muestra, 1):
+        acumulado += max(0, (p.get('cantidad_solicitada') or 0) - (p.get('cantidad_asignada') or 0)) * escala
+        if acumulado >= stock:
+            return j * escala
+    return len(pedidos)
+
+
+def _seleccionar(pedidos, clave, limite):
+    """
+    Genera los pedidos en el mismo orden que sorted(pedidos, key=clave). Los `limite` primeros salen de
+    un montículo (O(n + k log n)), así que si el stock se agota antes el resto no se ordena nunca.
+    """
+    claves = list(map(clave, pedidos))
+    # (clave, posición): los empates salen por orden de llegada, como en sorted()
+    entradas = list(zip(claves, range(len(claves))))
+    heapq.heapify(entradas)
+    emitidos = 0
+    while entradas and emitidos < limite:
+        yield pedidos[heapq.heappop(entradas)[1]]
+        emitidos += 1
+    if entradas:
+        # El montículo guarda justo los que faltan: se ordena solo ese resto, no la lista completa
+        entradas.sort()
+        yield from (pedidos[i] for _, i in entradas)
+
+
+def asignar_por_clave(pedidos, stock, clave, monticulo=False):
+    """
+    Equivale a asignar_secuencial(sorted(pedidos, key=clave), stock). Con `monticulo`, cuando el stock
+    alcanza para pocos pedidos los selecciona con un montículo en lugar de ordenar la lista completa.
+    Solo compensa con claves compuestas (tuplas), cuya comparación es lo caro de ordenar; con claves
+    simples sorted() es igual o más rápido (scripts/benchmark_asignacion_heap.py).
+    """
+    if not monticulo:
+        return asignar_secuencial(sorted(pedidos, key=clave), stock)
+    if not isinstance(pedidos, list):
+        pedidos = list(pedidos)
+    limite = len(pedidos) // FRACCION_MONTICULO
+    if _pedidos_estimados(pedidos, stock, clave) >= limite:
+        return asignar_secuencial(sorted(pedidos, key=clave), stock)
+    return asignar_secuencial(_seleccionar(pedidos, clave, 2 * limite), stock)
+
+
 def asignar_prioridad_fifo(pedidos, stock):
     """Asignar por orden de llegada (FIFO)."""
-    ordenados = sorted(pedidos, key=lambda x: parse_fecha(x.get('fecha_solicitud')))
-    return asignar_secuencial(ordenados, stock)
+    return asignar_por_clave(pedidos, stock, _clave_fifo)
 
 
 def asignar_prioridad_mayor(pedidos, stock):
     """Mayor prioridad numérica primero; empate por FIFO."""
-    ordenados = sorted(
-        pedidos,
-        key=lambda x: (-(x.get('prioridad') or 0), parse_fecha(x.get('fecha_solicitud')))
-    )
-    return asignar_secuencial(ordenados, stock)
+    return asignar_por_clave(pedidos, stock, _clave_mayor, monticulo=True)
 
 
 def asignar_prioridad_cantidad(pedidos, stock):
     """Atender primero los pedidos de menor cantidad solicitada."""
-    ordenados = sorted(pedidos, key=lambda x: (x.get('cantidad_solicitada') or 0))
-    return asignar_secuencial(ordenados, stock)
+    return asignar_por_clave(pedidos, stock, _clave_cantidad)
 
 
 def asignar_prioridad_cliente(pedidos, stock):
@@ -65,6 +137,27 @@ def asignar_secuencial(pedidos_ordenados, stock_disponible):
     return resultado
 
 
+CRITERIOS = {
+    "prioridad_fifo": asignar_prioridad_fifo,
+    "prioridad_mayor": asignar_prioridad_mayor,
+    "prioridad_cantidad": asignar_prioridad_cantidad,
+    "prioridad_cliente": asignar_prioridad_cliente,
+}
+
+
+def asignar(pedidos, stock_disponible, criterio="prioridad_fifo"):
+    """
+    Punto de entrada único: reparte stock_disponible entre los pedidos según el criterio.
+    Criterios desconocidos usan FIFO. Devuelve lista de { pedido_id, cantidad_asignada }.
+    `pedidos` puede ser una lista o un iterador (se consume una sola vez); con stock <= 0 no se lee.
+    """
+    stock = int(stock_disponible or 0)
+    if stock <= 0:
+        return []
+    fn = CRITERIOS.get((criterio or "prioridad_fifo").strip(), asignar_prioridad_fifo)
+    return fn(pedidos, stock)
+
+
 def main():
     try:
         data = json.load(sys.stdin)
@@ -72,25 +165,7 @@ def main():
         sys.stderr.write(str(e))
         sys.exit(1)
 
-    stock = int(data.get("stock_disponible") or 0)
-    criterio = (data.get("criterio") or "prioridad_fifo").strip()
-    pedidos = data.get("pedidos") or []
-
-    if stock <= 0 or not pedidos:
-        print(json.dumps([]))
-        return
-
-    if criterio == "prioridad_fifo":
-        asignaciones = asignar_prioridad_fifo(pedidos, stock)
-    elif criterio == "prioridad_mayor":
-        asignaciones = asignar_prioridad_mayor(pedidos, stock)
-    elif criterio == "prioridad_cantidad":
-        asignaciones = asignar_prioridad_cantidad(pedidos, stock)
-    elif criterio == "prioridad_cliente":
-        asignaciones = asignar_prioridad_cliente(pedidos, stock)
-    else:
-        asignaciones = asignar_prioridad_fifo(pedidos, stock)
-
+    asignaciones = asignar(data.get("pedidos") or [], data.get("stock_disponible"), data.get("criterio"))
     print(json.dumps(asignaciones))
 
 
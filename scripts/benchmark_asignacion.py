@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compara el motor de asignación en proceso (import) contra la llamada por subprocess + JSON
+que usaba antes /api/asignacion/ejecutar. No necesita MySQL.
+
+Uso: python3 scripts/benchmark_asignacion.py [num_pedidos] [repeticiones]
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+raiz = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, raiz)
+
+from scripts import asignacion_engine
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'asignacion_engine.py')
+
+
+def generar_pedidos(n, semilla=42):
+    rnd = random.Random(semilla)
+    base = datetime(2024, 1, 1)
+    return [{
+        'id': i + 1,
+        'cantidad_solicitada': rnd.randint(1, 50),
+        'cantidad_asignada': 0,
+        'prioridad': rnd.randint(0, 5),
+        'fecha_solicitud': base + timedelta(minutes=rnd.randint(0, 500000)),
+    } for i in range(n)]
+
+
+def por_subprocess(pedidos, stock, criterio):
+    lista = [dict(p, fecha_solicitud=p['fecha_solicitud'].isoformat()) for p in pedidos]
+    inp = json.dumps({'producto_id': 1, 'stock_disponible': stock, 'criterio': criterio, 'pedidos': lista})
+    proc = subprocess.run([sys.executable, SCRIPT], input=inp, capture_output=True, text=True, timeout=10)
+    return json.loads(proc.stdout)
+
+
+def en_proceso(pedidos, stock, criterio):
+    return asignacion_engine.asignar(pedidos, stock, criterio)
+
+
+def medir(fn, repeticiones, *args):
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = fn(*args)
+        tiempos.append(time.perf_counter() - t0)
+    tiempos.sort()
+    return resultado, tiempos[len(tiempos) // 2], tiempos[-1]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    pedidos = generar_pedidos(n)
+    stock = sum(p['cantidad_solicitada'] for p in pedidos) // 2
+    print(f"Pedidos: {n}  Stock: {stock}  Repeticiones: {repeticiones}\n")
+    print(f"{'criterio':<20}{'subprocess p50':>16}{'en proceso p50':>16}{'aceleración':>14}")
+    for criterio in asignacion_engine.CRITERIOS:
+        r_sub, p50_sub, _ = medir(por_subprocess, repeticiones, pedidos, stock, criterio)
+        r_mem, p50_mem, _ = medir(en_proceso, repeticiones, pedidos, stock, criterio)
+        if r_sub != r_mem:
+            print(f"  ¡Resultados distintos para {criterio}!", file=sys.stderr)
+            return 1
+        print(f"{criterio:<20}{p50_sub * 1000:>13.2f} ms{p50_mem * 1000:>13.3f} ms{p50_sub / p50_mem:>13.0f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
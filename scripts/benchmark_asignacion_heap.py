@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark por criterio del motor de asignación: la versión anterior (sorted() de toda la lista
+con parse_fecha dentro de la clave) contra la actual (montículo que se detiene al agotar el stock en
+los criterios de clave compuesta, sorted() en los demás). Las dos versiones se ejecutan alternadas y
+se toma el mejor tiempo de cada una, para que el ruido de la máquina no se reparta a un solo lado. Comprueba que ambas devuelven exactamente las mismas asignaciones,
+también cuando los pedidos llegan como iterador. No necesita MySQL.
+
+Uso: python3 scripts/benchmark_asignacion_heap.py [num_pedidos] [repeticiones]
+"""
+import gc
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+raiz = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, raiz)
+
+from scripts import asignacion_engine
+from scripts.asignacion_engine import asignar_secuencial, parse_fecha
+
+# Stock como fracción de lo pendiente: casi agotado, la mitad y suficiente para todos
+ESCENARIOS = (('0,1 %', 0.001), ('1 %', 0.01), ('50 %', 0.5), ('100 %', 1.0))
+
+
+# --- Versión anterior (referencia) ---
+def _ordenar_fifo(pedidos):
+    return sorted(pedidos, key=lambda x: parse_fecha(x.get('fecha_solicitud')))
+
+
+def _ordenar_mayor(pedidos):
+    return sorted(pedidos, key=lambda x: (-(x.get('prioridad') or 0), parse_fecha(x.get('fecha_solicitud'))))
+
+
+def _ordenar_cantidad(pedidos):
+    return sorted(pedidos, key=lambda x: (x.get('cantidad_solicitada') or 0))
+
+
+REFERENCIA = {
+    'prioridad_fifo': _ordenar_fifo,
+    'prioridad_mayor': _ordenar_mayor,
+    'prioridad_cantidad': _ordenar_cantidad,
+    'prioridad_cliente': _ordenar_mayor,
+}
+
+
+def anterior(pedidos, stock, criterio):
+    return asignar_secuencial(REFERENCIA[criterio](pedidos), stock)
+
+
+def actual(pedidos, stock, criterio):
+    return asignacion_engine.asignar(pedidos, stock, criterio)
+
+
+def generar_pedidos(n, semilla=42):
+    """Fechas como cadena ISO (como llegan por JSON) y muchos empates de prioridad y cantidad."""
+    rnd = random.Random(semilla)
+    base = datetime(2024, 1, 1)
+    return [{
+        'id': i + 1,
+        'cantidad_solicitada': rnd.randint(1, 50),
+        'cantidad_asignada': rnd.choice((0, 0, 0, 5)),
+        'prioridad': rnd.randint(0, 5),
+        'fecha_solicitud': (base + timedelta(minutes=rnd.randint(0, 50000))).isoformat(),
+    } for i in range(n)]
+
+
+def _cronometrar(fn, *args):
+    gc.collect()
+    t0 = time.perf_counter()
+    resultado = fn(*args)
+    return resultado, time.perf_counter() - t0
+
+
+def medir(repeticiones, *args):
+    """Alterna anterior y actual; devuelve los resultados y el mejor tiempo de cada una."""
+    t_ant = t_act = float('inf')
+    r_ant = r_act = None
+    for _ in range(repeticiones):
+        r_ant, t = _cronometrar(anterior, *args)
+        t_ant = min(t_ant, t)
+        r_act, t = _cronometrar(actual, *args)
+        t_act = min(t_act, t)
+    return r_ant, t_ant, r_act, t_act
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+    pedidos = generar_pedidos(n)
+    pendiente = sum(max(0, p['cantidad_solicitada'] - p['cantidad_asignada']) for p in pedidos)
+    print(f"Pedidos: {n}  Unidades pendientes: {pendiente}  Repeticiones: {repeticiones}\n")
+    print(f"{'criterio':<20}{'stock':>7}{'asignados':>11}{'anterior':>14}{'actual':>16}{'aceleración':>13}")
+    for criterio in asignacion_engine.CRITERIOS:
+        for nombre, fraccion in ESCENARIOS:
+            stock = max(1, int(pendiente * fraccion))
+            r_ant, mejor_ant, r_act, mejor_act = medir(repeticiones, pedidos, stock, criterio)
+            r_iter = actual(iter(pedidos), stock, criterio)
+            if r_ant != r_act or r_ant != r_iter:
+                print(f"  ¡Resultados distintos para {criterio} con stock {nombre}!", file=sys.stderr)
+                return 1
+            print(f"{criterio:<20}{nombre:>7}{len(r_act):>11}{mejor_ant * 1000:>11.2f} ms"
+                  f"{mejor_act * 1000:>13.2f} ms{mejor_ant / mejor_act:>12.1f}x")
+    print('\nOK: mismas asignaciones y en el mismo orden que la versión con sorted()')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de búsqueda de productos: LIKE '%q%' (recorrido completo) contra el índice FULLTEXT ngram
+y contra el prefijo de código. Crea una tabla temporal de trabajo `bench_productos` con N productos
+(100.000 por defecto) en la base configurada en .env y la borra al terminar.
+
+Uso: python3 scripts/benchmark_busqueda.py [num_productos] [repeticiones]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+raiz = os.path.join(os.path.dirname(__file__), '..')
+os.chdir(raiz)
+sys.path.insert(0, raiz)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import pymysql
+
+PALABRAS = ['Laptop', 'Monitor', 'Teclado', 'Mouse', 'Licuadora', 'Cafetera', 'Sofá', 'Mesa', 'Silla',
+            'Taladro', 'Martillo', 'Balón', 'Raqueta', 'Muñeca', 'Tenis', 'Botas', 'Cuaderno', 'Plumas',
+            'Aceite', 'Filtro', 'Alimento', 'Collar', 'Refrigerador', 'Lavadora', 'Consola', 'Control']
+MARCAS = ['HP', 'LG', 'Samsung', 'Sony', 'Oster', 'Nike', 'Adidas', 'Bosch', 'Philips', 'Dell', 'Acer']
+BUSQUEDAS = ['lap', 'samsung', 'teclado', 'ora', 'Botas Nike', 'zz-no-existe']
+
+
+def conectar():
+    return pymysql.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'root'),
+        password=os.getenv('MYSQL_PASSWORD', ''),
+        database=os.getenv('MYSQL_DATABASE', 'dw_manager'),
+        port=int(os.getenv('MYSQL_PORT', 3306)),
+        charset='utf8mb4',
+    )
+
+
+def preparar(cur, n):
+    rnd = random.Random(7)
+    cur.execute('DROP TABLE IF EXISTS bench_productos')
+    cur.execute("""
+        CREATE TABLE bench_productos (
+          id INT AUTO_INCREMENT PRIMARY KEY,
+          nombre VARCHAR(255) NOT NULL,
+          codigo VARCHAR(50) NULL UNIQUE
+        )
+    """)
+    lote = []
+    for i in range(1, n + 1):
+        nombre = f'{rnd.choice(PALABRAS)} {rnd.choice(MARCAS)} {rnd.choice(PALABRAS)} #{i}'
+        codigo = f'{nombre[:3].upper()}-{i:06d}'
+        lote.append((nombre, codigo))
+        if len(lote) == 5000:
+            cur.executemany('INSERT INTO bench_productos (nombre, codigo) VALUES (%s, %s)', lote)
+            lote = []
+    if lote:
+        cur.executemany('INSERT INTO bench_productos (nombre, codigo) VALUES (%s, %s)', lote)
+    cur.execute('SET SESSION innodb_ft_enable_stopword = OFF')
+    cur.execute('ALTER TABLE bench_productos ADD FULLTEXT INDEX ft_bench (nombre, codigo) WITH PARSER ngram')
+
+
+def medir(cur, sql, args, repeticiones):
+    tiempos = []
+    filas = 0
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        cur.execute(sql, args)
+        filas = len(cur.fetchall())
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos), filas
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    conn = conectar()
+    cur = conn.cursor()
+    try:
+        print(f'Preparando bench_productos con {n} filas...')
+        t0 = time.perf_counter()
+        preparar(cur, n)
+        conn.commit()
+        print(f'  listo en {time.perf_counter() - t0:.1f} s\n')
+        print(f"{'búsqueda':<16}{'LIKE %q% (ms)':>16}{'FULLTEXT (ms)':>16}{'prefijo código (ms)':>22}{'filas L/F':>14}")
+        for q in BUSQUEDAS:
+            patron = f'%{q}%'
+            t_like, f_like = medir(cur, 'SELECT id FROM bench_productos WHERE nombre LIKE %s OR codigo LIKE %s ORDER BY id DESC LIMIT 50', (patron, patron), repeticiones)
+            frase = '"' + q + '"'
+            t_ft, f_ft = medir(cur, 'SELECT id, MATCH(nombre, codigo) AGAINST (%s IN BOOLEAN MODE) AS r FROM bench_productos WHERE MATCH(nombre, codigo) AGAINST (%s IN BOOLEAN MODE) ORDER BY r DESC LIMIT 50', (frase, frase), repeticiones)
+            t_pre, _ = medir(cur, 'SELECT id FROM bench_productos WHERE codigo LIKE %s ORDER BY codigo LIMIT 8', (q[:3].upper() + '%',), repeticiones)
+            print(f'{q:<16}{t_like:>16.2f}{t_ft:>16.2f}{t_pre:>22.2f}{f"{f_like}/{f_ft}":>14}')
+    finally:
+        cur.execute('DROP TABLE IF EXISTS bench_productos')
+        conn.commit()
+        cur.close()
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
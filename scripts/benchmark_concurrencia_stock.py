@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de estrés de stock concurrente contra la base configurada en .env.
+Crea un producto temporal, lanza hilos que registran ventas, salidas y entradas sobre él a través
+de los endpoints reales (/api/ventas/registrar y /api/movimientos) y al final comprueba que:
+  - el stock nunca quedó negativo,
+  - stock final = stock inicial + entradas aceptadas - salidas aceptadas (sin deriva),
+  - las filas de ventas/movimientos coinciden con las operaciones aceptadas.
+Informa commits por segundo. Borra el producto y sus filas al terminar.
+
+Uso: python3 scripts/benchmark_concurrencia_stock.py [hilos] [operaciones_por_hilo] [stock_inicial]
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+raiz = os.path.join(os.path.dirname(__file__), '..')
+os.chdir(raiz)
+sys.path.insert(0, raiz)
+
+from app import app, get_db_config
+
+import pymysql
+
+
+def conectar():
+    return pymysql.connect(**get_db_config())
+
+
+def preparar(stock_inicial):
+    conn = conectar()
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT id, rol FROM usuarios ORDER BY id LIMIT 1')
+            usuario = cur.fetchone()
+            if not usuario:
+                raise SystemExit('Se necesita al menos un usuario en la tabla usuarios')
+            codigo = f'BENCH-STOCK-{os.getpid()}'
+            cur.execute(
+                'INSERT INTO productos (nombre, codigo, precio_unitario, stock) VALUES (%s, %s, %s, %s)',
+                ('Producto benchmark concurrencia', codigo, 10, stock_inicial)
+            )
+            producto_id = cur.lastrowid
+        conn.commit()
+        return producto_id, usuario
+    finally:
+        conn.close()
+
+
+def limpiar(producto_id):
+    conn = conectar()
+    try:
+        with conn.cursor() as cur:
+            cur.execute('DELETE FROM ventas WHERE producto_id = %s', (producto_id,))
+            cur.execute('DELETE FROM movimientos WHERE producto_id = %s', (producto_id,))
+            cur.execute('DELETE FROM productos WHERE id = %s', (producto_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def trabajador(producto_id, usuario, operaciones, semilla, resultado, lock):
+    rnd = random.Random(semilla)
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s['userId'] = usuario['id']
+        s['userRole'] = usuario['rol']
+    local = {'entradas': 0, 'salidas': 0, 'ventas_ok': 0, 'movimientos_ok': 0, 'rechazadas': 0, 'errores': 0,
+             'min_stock': None}
+    for _ in range(operaciones):
+        cantidad = rnd.randint(1, 3)
+        op = rnd.random()
+        if op < 0.6:
+            r = cliente.post('/api/ventas/registrar', json={'producto_id': producto_id, 'cantidad': cantidad})
+            campo_stock = 'stock_restante'
+        else:
+            tipo = 'entrada_compra' if op < 0.75 else 'salida_baja'
+            r = cliente.post('/api/movimientos', json={'producto_id': producto_id, 'tipo': tipo,
+                                                         'cantidad': cantidad, 'observaciones': 'benchmark'})
+            campo_stock = 'stock_actual'
+        if r.status_code in (200, 201):
+            cuerpo = r.get_json()
+            if op < 0.6:
+                local['ventas_ok'] += 1
+                local['salidas'] += cantidad
+            else:
+                local['movimientos_ok'] += 1
+                local['entradas' if tipo.startswith('entrada_') else 'salidas'] += cantidad
+            stock = cuerpo[campo_stock]
+            local['min_stock'] = stock if local['min_stock'] is None else min(local['min_stock'], stock)
+        elif r.status_code == 400:
+            local['rechazadas'] += 1
+        else:
+            local['errores'] += 1
+    with lock:
+        for k, v in local.items():
+            if k == 'min_stock':
+                if v is not None:
+                    resultado[k] = v if resultado[k] is None else min(resultado[k], v)
+            else:
+                resultado[k] += v
+
+
+def main():
+    hilos = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    por_hilo = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    stock_inicial = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    os.environ.setdefault('MYSQL_POOL_MAX', str(hilos + 2))
+    producto_id, usuario = preparar(stock_inicial)
+    resultado = {'entradas': 0, 'salidas': 0, 'ventas_ok': 0, 'movimientos_ok': 0, 'rechazadas': 0,
+                 'errores': 0, 'min_stock': None}
+    lock = threading.Lock()
+    try:
+        print(f'Producto {producto_id}  stock inicial {stock_inicial}  hilos {hilos}  operaciones/hilo {por_hilo}')
+        t0 = time.perf_counter()
+        ts = [threading.Thread(target=trabajador, args=(producto_id, usuario, por_hilo, i, resultado, lock))
+              for i in range(hilos)]
+        for t in ts:
+            t.start()
+        for t in ts:
+            t.join()
+        segundos = time.perf_counter() - t0
+
+        conn = conectar()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT stock FROM productos WHERE id = %s', (producto_id,))
+                stock_final = cur.fetchone()['stock']
+                cur.execute('SELECT COUNT(*) AS n FROM ventas WHERE producto_id = %s', (producto_id,))
+                filas_ventas = cur.fetchone()['n']
+                cur.execute('SELECT COUNT(*) AS n FROM movimientos WHERE producto_id = %s', (producto_id,))
+                filas_movs = cur.fetchone()['n']
+        finally:
+            conn.close()
+
+        commits = resultado['ventas_ok'] + resultado['movimientos_ok']
+        esperado = stock_inicial + resultado['entradas'] - resultado['salidas']
+        print(f"Aceptadas: {commits} (ventas {resultado['ventas_ok']}, movimientos {resultado['movimientos_ok']})  "
+              f"rechazadas por stock: {resultado['rechazadas']}  errores: {resultado['errores']}")
+        print(f'Tiempo: {segundos:.2f} s  →  {commits / segundos:.0f} commits/s')
+        print(f"Stock final: {stock_final}  esperado: {esperado}  mínimo observado: {resultado['min_stock']}")
+        fallos = []
+        if stock_final != esperado:
+            fallos.append(f'deriva de stock ({stock_final - esperado:+d})')
+        if stock_final < 0 or (resultado['min_stock'] is not None and resultado['min_stock'] < 0):
+            fallos.append('stock negativo')
+        if filas_ventas != resultado['ventas_ok'] or filas_movs != resultado['movimientos_ok']:
+            fallos.append(f'filas ventas/movimientos {filas_ventas}/{filas_movs} no cuadran')
+        if resultado['errores']:
+            fallos.append(f"{resultado['errores']} respuestas de error")
+        if fallos:
+            print('FALLO: ' + '; '.join(fallos), file=sys.stderr)
+            return 1
+        print('OK: sin stock negativo ni deriva')
+        return 0
+    finally:
+        limpiar(producto_id)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
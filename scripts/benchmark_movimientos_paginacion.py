@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latencia de página del historial de movimientos: cursor (created_at, id) contra LIMIT/OFFSET,
+a distintas profundidades. Crea una tabla de trabajo `bench_movimientos` con los mismos índices que
+movimientos y N filas (2.000.000 por defecto) en la base configurada en .env; la borra al terminar.
+
+Uso: python3 scripts/benchmark_movimientos_paginacion.py [filas] [repeticiones]
+"""
+import os
+import statistics
+import sys
+import time
+
+raiz = os.path.join(os.path.dirname(__file__), '..')
+os.chdir(raiz)
+sys.path.insert(0, raiz)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import pymysql
+
+TAM_PAGINA = 50
+LOTE_GENERACION = 100000
+
+# Misma forma que la consulta de /api/movimientos (sin el JOIN a productos)
+SQL_CURSOR = """
+    SELECT m.id, m.producto_id, m.tipo, m.cantidad, m.observaciones, m.created_at
+    FROM (
+        SELECT id FROM bench_movimientos
+        WHERE {filtro} (created_at < %s OR (created_at = %s AND id < %s))
+        ORDER BY created_at DESC, id DESC LIMIT %s
+    ) pagina
+    JOIN bench_movimientos m ON m.id = pagina.id
+    ORDER BY m.created_at DESC, m.id DESC
+"""
+SQL_OFFSET = """
+    SELECT id, producto_id, tipo, cantidad, observaciones, created_at
+    FROM bench_movimientos WHERE {filtro} 1=1
+    ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s
+"""
+
+
+def conectar():
+    return pymysql.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'root'),
+        password=os.getenv('MYSQL_PASSWORD', ''),
+        database=os.getenv('MYSQL_DATABASE', 'dw_manager'),
+        port=int(os.getenv('MYSQL_PORT', 3306)),
+        charset='utf8mb4',
+    )
+
+
+def preparar(conn, n):
+    cur = conn.cursor()
+    cur.execute('DROP TABLE IF EXISTS bench_movimientos')
+    cur.execute("""
+        CREATE TABLE bench_movimientos (
+          id INT AUTO_INCREMENT PRIMARY KEY,
+          producto_id INT NOT NULL,
+          tipo VARCHAR(30) NOT NULL,
+          cantidad INT NOT NULL,
+          usuario_id INT NULL,
+          observaciones TEXT NULL,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          KEY idx_movimientos_created (created_at),
+          KEY idx_movimientos_producto_created (producto_id, created_at),
+          KEY idx_movimientos_tipo_created (tipo, created_at)
+        )
+    """)
+    cur.execute('SET SESSION cte_max_recursion_depth = %s', (LOTE_GENERACION + 1,))
+    hechas = 0
+    while hechas < n:
+        lote = min(LOTE_GENERACION, n - hechas)
+        # Tres movimientos por minuto: hay empates en created_at que el cursor debe desempatar por id
+        cur.execute("""
+            INSERT INTO bench_movimientos (producto_id, tipo, cantidad, observaciones, created_at)
+            WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < %s - 1)
+            SELECT 1 + (i + %s) MOD 500,
+                   ELT(1 + (i + %s) MOD 4, 'entrada_compra', 'entrada_devolucion', 'salida_venta', 'salida_baja'),
+                   1 + (i + %s) MOD 20,
+                   'benchmark',
+                   TIMESTAMP('2015-01-01') + INTERVAL ((i + %s) DIV 3) MINUTE
+            FROM seq
+        """, (lote, hechas, hechas, hechas, hechas))
+        conn.commit()
+        hechas += lote
+        print(f'  {hechas}/{n} filas', end='\r', flush=True)
+    cur.execute('ANALYZE TABLE bench_movimientos')
+    cur.fetchall()
+    cur.close()
+    print()
+
+
+def medir(cur, sql, args, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        cur.execute(sql, args)
+        cur.fetchall()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    conn = conectar()
+    try:
+        print(f'Preparando bench_movimientos con {n} filas...')
+        t0 = time.perf_counter()
+        preparar(conn, n)
+        print(f'  listo en {time.perf_counter() - t0:.1f} s\n')
+        cur = conn.cursor()
+        profundidades = [p for p in (0, 1000, 10000, 100000, 1000000, n - TAM_PAGINA - 1) if 0 <= p < n - TAM_PAGINA]
+        for etiqueta, filtro, args_filtro, total in (
+            ('sin filtro', '', (), n),
+            ('producto_id = 7', 'producto_id = %s AND', (7,), n // 500),
+        ):
+            print(f'Historial {etiqueta}')
+            print(f"{'profundidad':>12}{'cursor (ms)':>14}{'OFFSET (ms)':>14}")
+            for prof in sorted({min(p, total - TAM_PAGINA - 1) for p in profundidades if p < total}):
+                # Cursor = última fila de la página anterior (se obtiene fuera de la medición)
+                cur.execute(SQL_OFFSET.format(filtro=filtro), args_filtro + (1, max(prof - 1, 0)))
+                fila = cur.fetchone()
+                cursor_args = args_filtro + (fila[5], fila[5], fila[0], TAM_PAGINA + 1)
+                t_cursor = medir(cur, SQL_CURSOR.format(filtro=filtro), cursor_args, repeticiones)
+                t_offset = medir(cur, SQL_OFFSET.format(filtro=filtro), args_filtro + (TAM_PAGINA + 1, prof),
+                                 repeticiones)
+                print(f'{prof:>12}{t_cursor:>14.2f}{t_offset:>14.2f}')
+            print()
+        cur.close()
+    finally:
+        with conn.cursor() as cur:
+            cur.execute('DROP TABLE IF EXISTS bench_movimientos')
+        conn.commit()
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compara /api/olap/productos-estrella y /api/olap/kpi/tendencia-mensual con funciones de ventana
+(LAG() OVER en MySQL) contra la versión anterior (LIMIT 100 sobre fact_ventas y LAG en Python),
+usando el DW de la base configurada en .env.
+
+Además de los tiempos comprueba los resultados:
+  - tendencia: ambas versiones deben coincidir mes a mes,
+  - productos estrella: la versión con ventanas debe coincidir con un recuento completo en Python
+    sobre agg_ventas_producto_mes; se indica si la versión anterior (truncada) difería.
+
+Uso: python3 scripts/benchmark_olap_ventanas.py [anio] [repeticiones]
+"""
+import os
+import statistics
+import sys
+import time
+
+raiz = os.path.join(os.path.dirname(__file__), '..')
+os.chdir(raiz)
+sys.path.insert(0, raiz)
+
+from app import get_db_config, SQL_TENDENCIA_MENSUAL, SQL_ULTIMOS_MESES, SQL_PRODUCTOS_ESTRELLA
+
+import pymysql
+
+TOP = 3
+
+
+def tendencia_anterior(cur, anio):
+    cur.execute('''
+        SELECT a.mes, a.nombre_mes, SUM(a.total_ventas) AS total_ventas
+        FROM agg_ventas_mes_categoria_sucursal a
+        WHERE a.anio = %s
+        GROUP BY a.mes, a.nombre_mes
+        ORDER BY a.mes
+    ''', (anio,))
+    prev = None
+    out = []
+    for r in cur.fetchall():
+        r = dict(r)
+        r['ventas_mes_anterior'] = prev
+        if prev and prev > 0:
+            r['crecimiento_porcentual'] = round((float(r['total_ventas']) - prev) / prev * 100, 2)
+        else:
+            r['crecimiento_porcentual'] = None
+        prev = float(r['total_ventas'])
+        out.append(r)
+    return out
+
+
+def tendencia_ventanas(cur, anio):
+    cur.execute(SQL_TENDENCIA_MENSUAL, (anio,))
+    return cur.fetchall()
+
+
+def estrella_anterior(cur):
+    cur.execute('''
+        SELECT p.nombre AS producto, SUM(f.monto_total) AS total_ventas
+        FROM fact_ventas f
+        JOIN dim_producto p ON f.sk_producto = p.sk_producto
+        JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo
+        GROUP BY p.nombre, t.anio, t.mes
+        ORDER BY t.anio DESC, t.mes DESC
+        LIMIT 100
+    ''')
+    by_prod = {}
+    for r in cur.fetchall():
+        by_prod.setdefault(r['producto'], []).append(float(r['total_ventas']))
+    growth = []
+    for name, vals in by_prod.items():
+        if len(vals) >= 2:
+            g = round((vals[0] - vals[1]) / vals[1] * 100, 2)
+            growth.append({'producto': name, 'crecimiento_porcentual': g})
+    growth.sort(key=lambda x: -x['crecimiento_porcentual'])
+    return growth[:TOP]
+
+
+def estrella_ventanas(cur):
+    cur.execute(SQL_ULTIMOS_MESES)
+    meses = cur.fetchall()
+    if len(meses) < 2:
+        return []
+    actual, anterior = meses
+    cur.execute(SQL_PRODUCTOS_ESTRELLA, (actual['anio'], actual['mes'], anterior['anio'], anterior['mes'],
+                                         actual['anio'], actual['mes'], TOP))
+    return cur.fetchall()
+
+
+def estrella_referencia(cur):
+    """Recuento completo, sin truncar: lee todo el agregado y calcula el crecimiento en Python."""
+    cur.execute('''
+        SELECT p.nombre AS producto, a.anio, a.mes, SUM(a.total_ventas) AS total_ventas
+        FROM agg_ventas_producto_mes a JOIN dim_producto p ON a.sk_producto = p.sk_producto
+        GROUP BY p.nombre, a.anio, a.mes
+    ''')
+    filas = cur.fetchall()
+    meses = sorted({(r['anio'], r['mes']) for r in filas}, reverse=True)[:2]
+    if len(meses) < 2:
+        return []
+    ventas = {(r['producto'], r['anio'], r['mes']): float(r['total_ventas']) for r in filas}
+    growth = []
+    for (producto, anio, mes), total in ventas.items():
+        prev = ventas.get((producto,) + meses[1])
+        if (anio, mes) == meses[0] and prev and prev > 0:
+            growth.append((round((total - prev) / prev * 100, 2), total, producto))
+    growth.sort(key=lambda x: (-x[0], -x[1], x[2]))
+    return [{'producto': p, 'crecimiento_porcentual': g} for g, _, p in growth[:TOP]]
+
+
+def medir(fn, repeticiones, *args):
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = fn(*args)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos), resultado
+
+
+def clave(filas):
+    return [(r['producto'], float(r['crecimiento_porcentual'])) for r in filas]
+
+
+def main():
+    anio = sys.argv[1] if len(sys.argv) > 1 else '2024'
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    conn = pymysql.connect(**get_db_config())
+    fallos = []
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*) AS n FROM fact_ventas')
+        hechos = cur.fetchone()['n']
+        cur.execute('SELECT COUNT(*) AS n FROM agg_ventas_producto_mes')
+        agregado = cur.fetchone()['n']
+        print(f'fact_ventas: {hechos} filas  agg_ventas_producto_mes: {agregado} filas\n')
+
+        t_ant, r_ant = medir(tendencia_anterior, repeticiones, cur, anio)
+        t_ven, r_ven = medir(tendencia_ventanas, repeticiones, cur, anio)
+        print(f'Tendencia mensual {anio}')
+        print(f'  LAG en Python:   {t_ant:8.2f} ms')
+        print(f'  LAG() OVER:      {t_ven:8.2f} ms')
+        # Redondeo DECIMAL en MySQL frente a float en Python: se admite una centésima de diferencia
+        iguales = len(r_ven) == len(r_ant) and all(
+            a['mes'] == b['mes'] and (a['crecimiento_porcentual'] is None) == (b['crecimiento_porcentual'] is None)
+            and (a['crecimiento_porcentual'] is None
+                 or abs(float(a['crecimiento_porcentual']) - b['crecimiento_porcentual']) <= 0.01)
+            for a, b in zip(r_ven, r_ant))
+        if not iguales:
+            fallos.append('la tendencia mensual no coincide con la versión anterior')
+
+        t_ant, r_ant = medir(estrella_anterior, repeticiones, cur)
+        t_ven, r_ven = medir(estrella_ventanas, repeticiones, cur)
+        t_ref, r_ref = medir(estrella_referencia, 1, cur)
+        print(f'\nProductos estrella (top {TOP})')
+        print(f'  LIMIT 100 + Python:       {t_ant:8.2f} ms  {clave(r_ant)}')
+        print(f'  Ventanas sobre 2 meses:   {t_ven:8.2f} ms  {clave(r_ven)}')
+        print(f'  Referencia (todo el agregado): {t_ref:8.2f} ms')
+        if clave(r_ven) != clave(r_ref):
+            fallos.append('productos estrella no coincide con el recuento completo')
+        if clave(r_ant) != clave(r_ref):
+            print('  (la versión anterior daba un resultado incorrecto con estos datos)')
+        cur.close()
+    finally:
+        conn.close()
+    if fallos:
+        print('\nFALLO: ' + '; '.join(fallos), file=sys.stderr)
+        return 1
+    print('\nOK: resultados correctos')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compara registrar N líneas de venta una a una (/api/ventas/registrar) contra un solo lote
+(/api/ventas/registrar-lote) usando la base configurada en .env. Crea productos temporales
+y los borra al terminar.
+
+Uso: python3 scripts/benchmark_ventas_lote.py [lineas] [productos]
+"""
+import os
+import random
+import sys
+import time
+
+raiz = os.path.join(os.path.dirname(__file__), '..')
+os.chdir(raiz)
+sys.path.insert(0, raiz)
+
+from app import app, get_db_config
+
+import pymysql
+
+
+def main():
+    lineas = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    num_productos = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    conn = pymysql.connect(**get_db_config())
+    ids = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT id, rol FROM usuarios ORDER BY id LIMIT 1')
+            usuario = cur.fetchone()
+            if not usuario:
+                raise SystemExit('Se necesita al menos un usuario en la tabla usuarios')
+            for i in range(num_productos):
+                cur.execute(
+                    'INSERT INTO productos (nombre, codigo, precio_unitario, stock) VALUES (%s, %s, %s, %s)',
+                    (f'Producto benchmark lote {i}', f'BENCH-LOTE-{os.getpid()}-{i}', 12.5, lineas * 10)
+                )
+                ids.append(cur.lastrowid)
+        conn.commit()
+
+        rnd = random.Random(3)
+        lote = [{'producto_id': rnd.choice(ids), 'cantidad': rnd.randint(1, 4)} for _ in range(lineas)]
+        cliente = app.test_client()
+        with cliente.session_transaction() as s:
+            s['userId'] = usuario['id']
+            s['userRole'] = usuario['rol']
+
+        t0 = time.perf_counter()
+        for linea in lote:
+            r = cliente.post('/api/ventas/registrar', json=linea)
+            if r.status_code != 200:
+                raise SystemExit(f'Venta individual falló: {r.get_json()}')
+        t_individual = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        r = cliente.post('/api/ventas/registrar-lote', json={'ventas': lote})
+        t_lote = time.perf_counter() - t0
+        cuerpo = r.get_json()
+        if r.status_code != 200 or cuerpo['aceptadas'] != lineas:
+            raise SystemExit(f'El lote no se registró completo: {cuerpo.get("error") or cuerpo["rechazadas"]}')
+
+        print(f'Líneas: {lineas}  Productos: {num_productos}')
+        print(f'Una a una: {t_individual:8.3f} s  ({lineas / t_individual:8.0f} líneas/s)')
+        print(f'En lote:   {t_lote:8.3f} s  ({lineas / t_lote:8.0f} líneas/s)')
+        print(f'Aceleración: {t_individual / t_lote:.1f}x')
+        return 0
+    finally:
+        if ids:
+            marcas = ', '.join(['%s'] * len(ids))
+            with conn.cursor() as cur:
+                cur.execute(f'DELETE FROM ventas WHERE producto_id IN ({marcas})', tuple(ids))
+                cur.execute(f'DELETE FROM productos WHERE id IN ({marcas})', tuple(ids))
+            conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
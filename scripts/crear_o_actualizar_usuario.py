@@ -46,7 +46,7 @@ def main():
         'charset': 'utf8mb4',
     }
 
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=10)).decode('utf-8')
+    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=int(os.getenv('BCRYPT_ROUNDS', 10)))).decode('utf-8')
 
     try:
         conn = pymysql.connect(**config)
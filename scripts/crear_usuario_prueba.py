@@ -23,7 +23,7 @@ def main():
     }
     email = 'prueba@test.com'
     password = 'prueba123'
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=10)).decode('utf-8')
+    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=int(os.getenv('BCRYPT_ROUNDS', 10)))).decode('utf-8')
 
     import time
     max_intentos = 3
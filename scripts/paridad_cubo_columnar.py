@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Paridad del cubo columnar en memoria (cubo_columnar.py) con las consultas SQL de los endpoints OLAP.
+Llama a rollup, drilldown, slice y dice con varios parámetros tomados del DW (.env) dos veces, una con
+MySQL y otra con el cubo, y compara las respuestas fila a fila. También muestra el tiempo de cada modo.
+Requiere NumPy y el cubo refrescado (los agregados agg_* al día con fact_ventas).
+
+Uso: python3 scripts/paridad_cubo_columnar.py [repeticiones]
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+raiz = os.path.join(os.path.dirname(__file__), '..')
+os.chdir(raiz)
+sys.path.insert(0, raiz)
+
+import app as aplicacion
+from app import app, get_db_config
+from cubo_columnar import CuboColumnar, disponible
+
+import pymysql
+
+
+def rutas(conn):
+    with conn.cursor() as cur:
+        cur.execute('SELECT DISTINCT categoria FROM dim_producto ORDER BY categoria LIMIT 3')
+        categorias = [r['categoria'] for r in cur.fetchall()]
+        cur.execute('SELECT DISTINCT ciudad FROM dim_sucursal ORDER BY ciudad LIMIT 3')
+        ciudades = [r['ciudad'] for r in cur.fetchall()]
+        cur.execute('SELECT DISTINCT t.anio FROM fact_ventas f JOIN dim_tiempo t ON f.sk_tiempo = t.sk_tiempo ORDER BY t.anio DESC LIMIT 2')
+        anios = [r['anio'] for r in cur.fetchall()]
+    lista = ['/api/olap/rollup/anio', '/api/olap/rollup/trimestre', '/api/olap/rollup/mes',
+             '/api/olap/drilldown/categorias', '/api/olap/drilldown/productos', '/api/olap/dice']
+    lista += [f'/api/olap/drilldown/productos?categoria={c}' for c in categorias]
+    lista += [f'/api/olap/slice/categoria/{c}' for c in categorias]
+    lista += [f'/api/olap/slice/sucursal/{c}' for c in ciudades]
+    lista += [f'/api/olap/slice/periodo/{a}' for a in anios]
+    for a in anios:
+        lista.append(f'/api/olap/dice?anio={a}')
+        lista.append(f'/api/olap/dice?anio={a}&mes_inicio=3&mes_fin=8')
+        for c in categorias[:1]:
+            lista.append(f'/api/olap/dice?anio={a}&categoria={c}')
+        for c in ciudades[:1]:
+            lista.append(f'/api/olap/dice?anio={a}&mes_inicio=1&mes_fin=6&ciudad={c}')
+    return lista
+
+
+def normalizar(fila):
+    """Los importes llegan como cadena decimal; se comparan como número."""
+    return {k: (round(float(v), 2) if isinstance(v, str) and k.startswith(('total_', 'num_')) else v)
+            for k, v in fila.items()}
+
+
+def diferencias(sql, cubo):
+    """Lista de problemas; el orden se compara por total_ventas porque los empates no tienen orden fijo en SQL."""
+    sql = [normalizar(f) for f in sql]
+    cubo = [normalizar(f) for f in cubo]
+    if len(sql) != len(cubo):
+        return [f'{len(sql)} filas en SQL y {len(cubo)} en el cubo']
+    problemas = []
+    if [f.get('total_ventas') for f in sql] != [f.get('total_ventas') for f in cubo]:
+        problemas.append('orden distinto')
+    # Con LIMIT, las filas empatadas con la última pueden ser otras: se comparan solo las anteriores
+    minimo = min((f.get('total_ventas') or 0 for f in sql), default=0) if len(sql) == 50 else None
+
+    def conjunto(filas):
+        return sorted(json.dumps(f, sort_keys=True, default=str) for f in filas
+                      if minimo is None or (f.get('total_ventas') or 0) > minimo)
+    if conjunto(sql) != conjunto(cubo):
+        problemas.append('filas distintas')
+    return problemas
+
+
+def pedir(cliente, ruta, con_cubo, repeticiones):
+    aplicacion.cubo_memoria.activo = con_cubo
+    tiempos = []
+    for _ in range(repeticiones):
+        aplicacion.olap_cache.invalidar()
+        t0 = time.perf_counter()
+        r = cliente.get(ruta)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+        if r.status_code != 200:
+            raise SystemExit(f'{ruta}: HTTP {r.status_code} {r.get_data(as_text=True)[:200]}')
+    return r.get_json(), statistics.median(tiempos)
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    if not disponible():
+        raise SystemExit('NumPy no está instalado (pip install numpy)')
+    conn = pymysql.connect(**get_db_config())
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT id, rol FROM usuarios ORDER BY id LIMIT 1')
+            usuario = cur.fetchone()
+        if not usuario:
+            raise SystemExit('Se necesita al menos un usuario en la tabla usuarios')
+        lista = rutas(conn)
+        aplicacion.cubo_memoria = CuboColumnar(activo=True)
+        t0 = time.perf_counter()
+        aplicacion.cubo_memoria.cargar(conn)
+        estad = aplicacion.cubo_memoria.estadisticas()
+        print(f"Cubo cargado: {estad['hechos']} hechos en {time.perf_counter() - t0:.2f} s, "
+              f"{estad['memoria']['total_mb']} MB\n")
+    finally:
+        conn.close()
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s['userId'] = usuario['id']
+        s['userRole'] = usuario['rol']
+
+    fallos = 0
+    print(f"{'ruta':<62}{'SQL (ms)':>10}{'cubo (ms)':>11}  resultado")
+    for ruta in lista:
+        filas_sql, t_sql = pedir(cliente, ruta, False, repeticiones)
+        filas_cubo, t_cubo = pedir(cliente, ruta, True, repeticiones)
+        problemas = diferencias(filas_sql, filas_cubo)
+        fallos += bool(problemas)
+        print(f"{ruta:<62}{t_sql:>10.2f}{t_cubo:>11.2f}  {'; '.join(problemas) or 'OK'}")
+    estad = aplicacion.cubo_memoria.estadisticas()
+    print(f"\nMemoria del cubo tras las consultas: {estad['memoria']['total_mb']} MB")
+    if fallos:
+        print(f'FALLO: {fallos} rutas con diferencias', file=sys.stderr)
+        return 1
+    print('OK: el cubo en memoria coincide con SQL')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
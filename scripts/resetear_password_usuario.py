@@ -50,7 +50,7 @@ def main():
             print('Las contraseñas no coinciden.', file=sys.stderr)
             sys.exit(1)
 
-    password_hash = bcrypt.hashpw(nueva_password.encode('utf-8'), bcrypt.gensalt(rounds=10)).decode('utf-8')
+    password_hash = bcrypt.hashpw(nueva_password.encode('utf-8'), bcrypt.gensalt(rounds=int(os.getenv('BCRYPT_ROUNDS', 10)))).decode('utf-8')
 
     try:
         conn = pymysql.connect(**config)
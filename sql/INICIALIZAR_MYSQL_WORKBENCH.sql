@@ -46,6 +46,9 @@ CREATE TABLE IF NOT EXISTS productos (
   pasillo VARCHAR(50) NULL,
   estante VARCHAR(50) NULL,
   nivel VARCHAR(50) NULL,
+  -- Alerta de stock mínimo mantenida por MySQL en cada cambio de stock o punto_reorden
+  bajo_stock TINYINT(1) AS (IF(stock < COALESCE(NULLIF(punto_reorden, 0), 5), 1, 0)) STORED,
+  KEY idx_productos_bajo_stock (bajo_stock, stock),
   FOREIGN KEY (categoria_id) REFERENCES categorias(id) ON DELETE SET NULL
 );
 
@@ -66,6 +69,10 @@ CREATE TABLE IF NOT EXISTS movimientos (
   usuario_id INT NULL,
   observaciones TEXT NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  -- Historial paginado por (created_at, id); InnoDB añade id al final de cada índice secundario
+  KEY idx_movimientos_created (created_at),
+  KEY idx_movimientos_producto_created (producto_id, created_at),
+  KEY idx_movimientos_tipo_created (tipo, created_at),
   FOREIGN KEY (producto_id) REFERENCES productos(id) ON DELETE RESTRICT,
   FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL,
   CHECK (tipo IN ('entrada_compra', 'entrada_devolucion', 'salida_venta', 'salida_baja')),
@@ -139,6 +146,34 @@ CREATE TABLE IF NOT EXISTS fact_ventas (
   FOREIGN KEY (sk_sucursal) REFERENCES dim_sucursal(sk_sucursal)
 );
 
+CREATE TABLE IF NOT EXISTS agg_ventas_mes_categoria_sucursal (
+  anio INT NOT NULL,
+  mes INT NOT NULL,
+  trimestre INT NOT NULL,
+  nombre_mes VARCHAR(20) NOT NULL,
+  categoria VARCHAR(100) NOT NULL,
+  sk_sucursal INT NOT NULL,
+  total_ventas DECIMAL(16,2) NOT NULL DEFAULT 0,
+  total_unidades BIGINT NOT NULL DEFAULT 0,
+  num_transacciones INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (anio, mes, categoria, sk_sucursal),
+  KEY idx_agg_mcs_categoria (categoria),
+  KEY idx_agg_mcs_sucursal (sk_sucursal)
+);
+
+CREATE TABLE IF NOT EXISTS agg_ventas_producto_mes (
+  sk_producto INT NOT NULL,
+  anio INT NOT NULL,
+  mes INT NOT NULL,
+  trimestre INT NOT NULL,
+  nombre_mes VARCHAR(20) NOT NULL,
+  total_ventas DECIMAL(16,2) NOT NULL DEFAULT 0,
+  total_unidades BIGINT NOT NULL DEFAULT 0,
+  num_transacciones INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (sk_producto, anio, mes),
+  KEY idx_agg_pm_periodo (anio, mes)
+);
+
 CREATE TABLE IF NOT EXISTS etl_log (
   id INT AUTO_INCREMENT PRIMARY KEY,
   proceso VARCHAR(100) NOT NULL,
@@ -146,7 +181,8 @@ CREATE TABLE IF NOT EXISTS etl_log (
   registros_exitosos INT DEFAULT 0,
   registros_fallidos INT DEFAULT 0,
   fecha_ejecucion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  estado VARCHAR(50) NULL
+  estado VARCHAR(50) NULL,
+  ultimo_id_fuente INT NULL
 );
 
 SET @exist = (SELECT COUNT(*) FROM information_schema.TABLE_CONSTRAINTS
@@ -156,6 +192,99 @@ PREPARE stmt FROM @sql;
 EXECUTE stmt;
 DEALLOCATE PREPARE stmt;
 
+-- Búsqueda de productos: índice FULLTEXT con parser ngram (subcadenas de 2 caracteres).
+-- Sin stopwords: con ngram, un stopword de una letra ('a', 'i') anularía todos los bigramas que la contienen.
+SET SESSION innodb_ft_enable_stopword = OFF;
+SET @exist = (SELECT COUNT(*) FROM information_schema.STATISTICS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'productos' AND INDEX_NAME = 'ft_productos_busqueda');
+SET @sql = IF(@exist = 0, 'ALTER TABLE productos ADD FULLTEXT INDEX ft_productos_busqueda (nombre, codigo) WITH PARSER ngram', 'SELECT 1');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- Contadores del panel (/api/dashboard/metricas) mantenidos por triggers en la misma transacción
+-- que cada escritura. Repartidos en 16 filas por conexión (CONNECTION_ID() MOD 16) para que las
+-- escrituras simultáneas no esperen todas por la misma fila; la lectura suma las 16. Una transacción
+-- solo toca la fila de su conexión, aunque escriba muchos productos o pedidos: no hay interbloqueos.
+CREATE TABLE IF NOT EXISTS contadores_dashboard (
+  slot TINYINT NOT NULL PRIMARY KEY,
+  productos_agotados INT NOT NULL DEFAULT 0,
+  pedidos_pendientes INT NOT NULL DEFAULT 0,
+  total_productos INT NOT NULL DEFAULT 0,
+  total_unidades BIGINT NOT NULL DEFAULT 0
+);
+INSERT IGNORE INTO contadores_dashboard (slot) VALUES
+  (0), (1), (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12), (13), (14), (15);
+
+DROP TRIGGER IF EXISTS trg_productos_contadores_ins;
+CREATE TRIGGER trg_productos_contadores_ins AFTER INSERT ON productos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    total_productos = total_productos + 1,
+    total_unidades = total_unidades + COALESCE(NEW.stock, 0),
+    productos_agotados = productos_agotados + (COALESCE(NEW.stock, 0) = 0)
+  WHERE slot = CONNECTION_ID() MOD 16;
+
+DROP TRIGGER IF EXISTS trg_productos_contadores_upd;
+CREATE TRIGGER trg_productos_contadores_upd AFTER UPDATE ON productos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    total_unidades = total_unidades + COALESCE(NEW.stock, 0) - COALESCE(OLD.stock, 0),
+    productos_agotados = productos_agotados + (COALESCE(NEW.stock, 0) = 0) - (COALESCE(OLD.stock, 0) = 0)
+  WHERE slot = CONNECTION_ID() MOD 16 AND NOT (NEW.stock <=> OLD.stock);
+
+DROP TRIGGER IF EXISTS trg_productos_contadores_del;
+CREATE TRIGGER trg_productos_contadores_del AFTER DELETE ON productos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    total_productos = total_productos - 1,
+    total_unidades = total_unidades - COALESCE(OLD.stock, 0),
+    productos_agotados = productos_agotados - (COALESCE(OLD.stock, 0) = 0)
+  WHERE slot = CONNECTION_ID() MOD 16;
+
+DROP TRIGGER IF EXISTS trg_pedidos_contadores_ins;
+CREATE TRIGGER trg_pedidos_contadores_ins AFTER INSERT ON pedidos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    pedidos_pendientes = pedidos_pendientes + 1
+  WHERE slot = CONNECTION_ID() MOD 16 AND NEW.estado IN ('pendiente', 'parcial');
+
+DROP TRIGGER IF EXISTS trg_pedidos_contadores_upd;
+CREATE TRIGGER trg_pedidos_contadores_upd AFTER UPDATE ON pedidos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    pedidos_pendientes = pedidos_pendientes + (NEW.estado IN ('pendiente', 'parcial')) - (OLD.estado IN ('pendiente', 'parcial'))
+  WHERE slot = CONNECTION_ID() MOD 16 AND (NEW.estado IN ('pendiente', 'parcial')) <> (OLD.estado IN ('pendiente', 'parcial'));
+
+DROP TRIGGER IF EXISTS trg_pedidos_contadores_del;
+CREATE TRIGGER trg_pedidos_contadores_del AFTER DELETE ON pedidos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    pedidos_pendientes = pedidos_pendientes - 1
+  WHERE slot = CONNECTION_ID() MOD 16 AND OLD.estado IN ('pendiente', 'parcial');
+
+-- Trabajos en segundo plano (refresco del cubo, asignación): estado y progreso que consulta /api/trabajos/<id>
+CREATE TABLE IF NOT EXISTS trabajos (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  tipo VARCHAR(40) NOT NULL,
+  estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+  parametros JSON NULL,
+  progreso DECIMAL(5,2) NOT NULL DEFAULT 0,
+  filas_procesadas INT NOT NULL DEFAULT 0,
+  mensaje VARCHAR(255) NULL,
+  resultado JSON NULL,
+  error TEXT NULL,
+  usuario_id INT NULL,
+  propietario VARCHAR(64) NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  iniciado_en DATETIME NULL,
+  terminado_en DATETIME NULL,
+  KEY idx_trabajos_tipo_estado (tipo, estado),
+  KEY idx_trabajos_estado (estado, id)
+);
+
+-- Versiones de tabla para los ETag de las lecturas (las suben los endpoints de escritura);
+-- compartidas por todos los workers de la app y persistentes entre reinicios
+CREATE TABLE IF NOT EXISTS versiones_tablas (
+  tabla VARCHAR(64) NOT NULL PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  modificada TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 -- ========== PARTE 2: FASE 1 - DIMENSIONES ==========
 USE dw_manager;
 
@@ -358,8 +487,9 @@ FROM ventas v
 JOIN dim_producto dp ON v.producto_id = dp.id_fuente
 JOIN dim_tiempo dt ON DATE(v.fecha_venta) = dt.fecha;
 
-INSERT INTO etl_log (proceso, registros_procesados, registros_exitosos, registros_fallidos, estado)
-VALUES ('Carga Fact Ventas', ROW_COUNT(), ROW_COUNT(), 0, 'EXITOSO');
+-- ultimo_id_fuente: la app sigue desde aquí al refrescar el cubo (no vuelve a cargar estas ventas)
+INSERT INTO etl_log (proceso, registros_procesados, registros_exitosos, registros_fallidos, estado, ultimo_id_fuente)
+VALUES ('Carga Fact Ventas', ROW_COUNT(), ROW_COUNT(), 0, 'EXITOSO', (SELECT COALESCE(MAX(id), 0) FROM ventas));
 
 DROP VIEW IF EXISTS v_ventas_categoria;
 CREATE VIEW v_ventas_categoria AS
@@ -0,0 +1,215 @@
+-- ============================================
+-- MIGRACIÓN DE RENDIMIENTO (bases ya existentes)
+-- Aplica sobre dw_manager los cambios de esquema que schema-mysql.sql ya incluye
+-- para instalaciones nuevas. Se puede ejecutar varias veces.
+--
+-- Uso: mysql -u root -p dw_manager < migracion-rendimiento.sql
+-- ============================================
+USE dw_manager;
+
+-- 1. ETL incremental: marca de agua (último ventas.id cargado) en etl_log
+-- ============================================
+SET @exist = (SELECT COUNT(*) FROM information_schema.COLUMNS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'etl_log' AND COLUMN_NAME = 'ultimo_id_fuente');
+SET @sql = IF(@exist = 0, 'ALTER TABLE etl_log ADD COLUMN ultimo_id_fuente INT NULL', 'SELECT 1');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- Si fact_ventas ya se cargó con mysql-fase3-etl.sql o mysql-datos-masivos-10k.sql, ya contiene
+-- todas las ventas: la marca empieza en el último ventas.id. Con 0, el primer refresco del cubo las
+-- volvería a cargar con otra sucursal, uk_fact no vería el duplicado y se duplicarían los hechos y los
+-- agregados. Solo se inserta si aún no hay ninguna marca.
+INSERT INTO etl_log (proceso, registros_procesados, registros_exitosos, registros_fallidos, estado, ultimo_id_fuente)
+SELECT 'Carga Fact Ventas', 0, 0, 0, 'MARCA_INICIAL', (SELECT COALESCE(MAX(id), 0) FROM ventas)
+FROM DUAL
+WHERE EXISTS (SELECT 1 FROM fact_ventas)
+  AND NOT EXISTS (SELECT 1 FROM etl_log WHERE proceso = 'Carga Fact Ventas' AND ultimo_id_fuente > 0);
+
+-- 2. Agregados materializados del cubo (se llenan en el siguiente /api/olap/refrescar-cubo)
+-- ============================================
+CREATE TABLE IF NOT EXISTS agg_ventas_mes_categoria_sucursal (
+  anio INT NOT NULL,
+  mes INT NOT NULL,
+  trimestre INT NOT NULL,
+  nombre_mes VARCHAR(20) NOT NULL,
+  categoria VARCHAR(100) NOT NULL,
+  sk_sucursal INT NOT NULL,
+  total_ventas DECIMAL(16,2) NOT NULL DEFAULT 0,
+  total_unidades BIGINT NOT NULL DEFAULT 0,
+  num_transacciones INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (anio, mes, categoria, sk_sucursal),
+  KEY idx_agg_mcs_categoria (categoria),
+  KEY idx_agg_mcs_sucursal (sk_sucursal)
+);
+
+CREATE TABLE IF NOT EXISTS agg_ventas_producto_mes (
+  sk_producto INT NOT NULL,
+  anio INT NOT NULL,
+  mes INT NOT NULL,
+  trimestre INT NOT NULL,
+  nombre_mes VARCHAR(20) NOT NULL,
+  total_ventas DECIMAL(16,2) NOT NULL DEFAULT 0,
+  total_unidades BIGINT NOT NULL DEFAULT 0,
+  num_transacciones INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (sk_producto, anio, mes),
+  KEY idx_agg_pm_periodo (anio, mes)
+);
+
+-- 3. Búsqueda de productos: FULLTEXT ngram sobre (nombre, codigo)
+-- ============================================
+-- Índice FULLTEXT con parser ngram (subcadenas de 2 caracteres).
+-- Sin stopwords: con ngram, un stopword de una letra ('a', 'i') anularía todos los bigramas que la contienen.
+SET SESSION innodb_ft_enable_stopword = OFF;
+SET @exist = (SELECT COUNT(*) FROM information_schema.STATISTICS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'productos' AND INDEX_NAME = 'ft_productos_busqueda');
+SET @sql = IF(@exist = 0, 'ALTER TABLE productos ADD FULLTEXT INDEX ft_productos_busqueda (nombre, codigo) WITH PARSER ngram', 'SELECT 1');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 4. Historial de movimientos: índices para paginar por (created_at, id) con y sin filtros
+-- ============================================
+SET @exist = (SELECT COUNT(*) FROM information_schema.STATISTICS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'movimientos' AND INDEX_NAME = 'idx_movimientos_created');
+SET @sql = IF(@exist = 0, 'ALTER TABLE movimientos ADD INDEX idx_movimientos_created (created_at)', 'SELECT 1');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @exist = (SELECT COUNT(*) FROM information_schema.STATISTICS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'movimientos' AND INDEX_NAME = 'idx_movimientos_producto_created');
+SET @sql = IF(@exist = 0, 'ALTER TABLE movimientos ADD INDEX idx_movimientos_producto_created (producto_id, created_at)', 'SELECT 1');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @exist = (SELECT COUNT(*) FROM information_schema.STATISTICS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'movimientos' AND INDEX_NAME = 'idx_movimientos_tipo_created');
+SET @sql = IF(@exist = 0, 'ALTER TABLE movimientos ADD INDEX idx_movimientos_tipo_created (tipo, created_at)', 'SELECT 1');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 5. Alertas de bajo stock: columna generada e índice (la consulta lee solo los productos en alerta)
+-- ============================================
+SET @exist = (SELECT COUNT(*) FROM information_schema.COLUMNS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'productos' AND COLUMN_NAME = 'bajo_stock');
+SET @sql = IF(@exist = 0, 'ALTER TABLE productos ADD COLUMN bajo_stock TINYINT(1) AS (IF(stock < COALESCE(NULLIF(punto_reorden, 0), 5), 1, 0)) STORED', 'SELECT 1');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @exist = (SELECT COUNT(*) FROM information_schema.STATISTICS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'productos' AND INDEX_NAME = 'idx_productos_bajo_stock');
+SET @sql = IF(@exist = 0, 'ALTER TABLE productos ADD INDEX idx_productos_bajo_stock (bajo_stock, stock)', 'SELECT 1');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 6. Contadores del panel mantenidos por triggers
+-- ============================================
+-- Contadores del panel (/api/dashboard/metricas) mantenidos por triggers en la misma transacción
+-- que cada escritura. Repartidos en 16 filas por conexión (CONNECTION_ID() MOD 16) para que las
+-- escrituras simultáneas no esperen todas por la misma fila; la lectura suma las 16. Una transacción
+-- solo toca la fila de su conexión, aunque escriba muchos productos o pedidos: no hay interbloqueos.
+CREATE TABLE IF NOT EXISTS contadores_dashboard (
+  slot TINYINT NOT NULL PRIMARY KEY,
+  productos_agotados INT NOT NULL DEFAULT 0,
+  pedidos_pendientes INT NOT NULL DEFAULT 0,
+  total_productos INT NOT NULL DEFAULT 0,
+  total_unidades BIGINT NOT NULL DEFAULT 0
+);
+INSERT IGNORE INTO contadores_dashboard (slot) VALUES
+  (0), (1), (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12), (13), (14), (15);
+
+DROP TRIGGER IF EXISTS trg_productos_contadores_ins;
+CREATE TRIGGER trg_productos_contadores_ins AFTER INSERT ON productos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    total_productos = total_productos + 1,
+    total_unidades = total_unidades + COALESCE(NEW.stock, 0),
+    productos_agotados = productos_agotados + (COALESCE(NEW.stock, 0) = 0)
+  WHERE slot = CONNECTION_ID() MOD 16;
+
+DROP TRIGGER IF EXISTS trg_productos_contadores_upd;
+CREATE TRIGGER trg_productos_contadores_upd AFTER UPDATE ON productos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    total_unidades = total_unidades + COALESCE(NEW.stock, 0) - COALESCE(OLD.stock, 0),
+    productos_agotados = productos_agotados + (COALESCE(NEW.stock, 0) = 0) - (COALESCE(OLD.stock, 0) = 0)
+  WHERE slot = CONNECTION_ID() MOD 16 AND NOT (NEW.stock <=> OLD.stock);
+
+DROP TRIGGER IF EXISTS trg_productos_contadores_del;
+CREATE TRIGGER trg_productos_contadores_del AFTER DELETE ON productos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    total_productos = total_productos - 1,
+    total_unidades = total_unidades - COALESCE(OLD.stock, 0),
+    productos_agotados = productos_agotados - (COALESCE(OLD.stock, 0) = 0)
+  WHERE slot = CONNECTION_ID() MOD 16;
+
+DROP TRIGGER IF EXISTS trg_pedidos_contadores_ins;
+CREATE TRIGGER trg_pedidos_contadores_ins AFTER INSERT ON pedidos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    pedidos_pendientes = pedidos_pendientes + 1
+  WHERE slot = CONNECTION_ID() MOD 16 AND NEW.estado IN ('pendiente', 'parcial');
+
+DROP TRIGGER IF EXISTS trg_pedidos_contadores_upd;
+CREATE TRIGGER trg_pedidos_contadores_upd AFTER UPDATE ON pedidos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    pedidos_pendientes = pedidos_pendientes + (NEW.estado IN ('pendiente', 'parcial')) - (OLD.estado IN ('pendiente', 'parcial'))
+  WHERE slot = CONNECTION_ID() MOD 16 AND (NEW.estado IN ('pendiente', 'parcial')) <> (OLD.estado IN ('pendiente', 'parcial'));
+
+DROP TRIGGER IF EXISTS trg_pedidos_contadores_del;
+CREATE TRIGGER trg_pedidos_contadores_del AFTER DELETE ON pedidos FOR EACH ROW
+  UPDATE contadores_dashboard SET
+    pedidos_pendientes = pedidos_pendientes - 1
+  WHERE slot = CONNECTION_ID() MOD 16 AND OLD.estado IN ('pendiente', 'parcial');
+
+-- Valores iniciales (después los corrige también la reconciliación periódica de la app)
+UPDATE contadores_dashboard SET productos_agotados = 0, pedidos_pendientes = 0, total_productos = 0, total_unidades = 0;
+UPDATE contadores_dashboard c
+  JOIN (SELECT COUNT(*) AS total_productos, COALESCE(SUM(stock), 0) AS total_unidades,
+               COALESCE(SUM(COALESCE(stock, 0) = 0), 0) AS productos_agotados FROM productos) p
+  JOIN (SELECT COUNT(*) AS pedidos_pendientes FROM pedidos WHERE estado IN ('pendiente', 'parcial')) pd
+  SET c.productos_agotados = p.productos_agotados, c.pedidos_pendientes = pd.pedidos_pendientes,
+      c.total_productos = p.total_productos, c.total_unidades = p.total_unidades
+  WHERE c.slot = 0;
+
+-- 7. Trabajos en segundo plano
+-- ============================================
+-- Trabajos en segundo plano (refresco del cubo, asignación): estado y progreso que consulta /api/trabajos/<id>
+CREATE TABLE IF NOT EXISTS trabajos (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  tipo VARCHAR(40) NOT NULL,
+  estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+  parametros JSON NULL,
+  progreso DECIMAL(5,2) NOT NULL DEFAULT 0,
+  filas_procesadas INT NOT NULL DEFAULT 0,
+  mensaje VARCHAR(255) NULL,
+  resultado JSON NULL,
+  error TEXT NULL,
+  usuario_id INT NULL,
+  propietario VARCHAR(64) NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  iniciado_en DATETIME NULL,
+  terminado_en DATETIME NULL,
+  KEY idx_trabajos_tipo_estado (tipo, estado),
+  KEY idx_trabajos_estado (estado, id)
+);
+
+-- propietario: ejecutor que lo tiene en cola (su GET_LOCK de presencia dice si sigue vivo)
+SET @exist = (SELECT COUNT(*) FROM information_schema.COLUMNS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'trabajos' AND COLUMN_NAME = 'propietario');
+SET @sql = IF(@exist = 0, 'ALTER TABLE trabajos ADD COLUMN propietario VARCHAR(64) NULL AFTER usuario_id', 'SELECT 1');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 8. Versiones de tabla para ETag
+-- ============================================
+-- Versiones de tabla para los ETag de las lecturas (las suben los endpoints de escritura);
+-- compartidas por todos los workers de la app y persistentes entre reinicios
+CREATE TABLE IF NOT EXISTS versiones_tablas (
+  tabla VARCHAR(64) NOT NULL PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  modificada TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
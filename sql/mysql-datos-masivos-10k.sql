@@ -195,6 +195,10 @@ JOIN dim_tiempo dt ON DATE(v.fecha_venta) = dt.fecha;
 INSERT INTO etl_log (proceso, registros_procesados, registros_exitosos, registros_fallidos, estado)
 VALUES ('Carga Masiva Ventas', ROW_COUNT(), ROW_COUNT(), 0, 'EXITOSO');
 
+-- Marca de agua del ETL de la app (proceso 'Carga Fact Ventas'): al refrescar el cubo sigue desde aquí
+INSERT INTO etl_log (proceso, registros_procesados, registros_exitosos, registros_fallidos, estado, ultimo_id_fuente)
+SELECT 'Carga Fact Ventas', 0, 0, 0, 'MARCA_SQL', COALESCE(MAX(id), 0) FROM ventas;
+
 -- ============================================
 -- PASO 7: VERIFICACIÓN
 -- ============================================
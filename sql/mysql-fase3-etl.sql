@@ -34,8 +34,9 @@ FROM ventas v
 JOIN dim_producto dp ON v.producto_id = dp.id_fuente
 JOIN dim_tiempo dt ON DATE(v.fecha_venta) = dt.fecha;
 
-INSERT INTO etl_log (proceso, registros_procesados, registros_exitosos, registros_fallidos, estado)
-VALUES ('Carga Fact Ventas', ROW_COUNT(), ROW_COUNT(), 0, 'EXITOSO');
+-- ultimo_id_fuente: la app sigue desde aquí al refrescar el cubo (no vuelve a cargar estas ventas)
+INSERT INTO etl_log (proceso, registros_procesados, registros_exitosos, registros_fallidos, estado, ultimo_id_fuente)
+VALUES ('Carga Fact Ventas', ROW_COUNT(), ROW_COUNT(), 0, 'EXITOSO', (SELECT COALESCE(MAX(id), 0) FROM ventas));
 
 -- 3.4 Vistas (MySQL no tiene MATERIALIZED VIEW; usamos VIEW normales)
 -- ============================================
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+Trabajos en segundo plano (refresco del cubo, asignación masiva).
+La petición HTTP solo registra el trabajo en la tabla `trabajos` y devuelve su id; un pool de hilos
+lo ejecuta y va guardando progreso y filas procesadas en esa misma fila, que es lo que consultan
+los endpoints de estado desde cualquier proceso.
+Los tipos exclusivos toman un GET_LOCK de MySQL mientras corren: nunca hay dos a la vez, ni siquiera
+entre procesos distintos.
+Un trabajo solo empieza si sigue 'pendiente' (se reclama con un UPDATE condicional). Los que dejó un
+proceso que murió se cierran al empezar otro: 'en_proceso' del mismo tipo exclusivo y 'pendiente' con
+más de `max_pendiente` segundos cuyo propietario ya no existe. Mientras un ejecutor tiene trabajos en
+cola mantiene un GET_LOCK con su nombre (columna `propietario`); MySQL lo libera solo si el proceso
+muere, así que cualquier proceso sabe con IS_USED_LOCK si el dueño de una fila sigue vivo.
+
+Conexiones del pool por trabajo en curso: la de la función (get_db) y otra para guardar el estado; en
+los exclusivos esa otra es la misma que tiene el bloqueo. Más una por proceso mientras hay cola, así que
+MYSQL_POOL_MAX debe cubrir las peticiones simultáneas más 2 × hilos + 1.
+"""
+import json
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pymysql
+
+log = logging.getLogger(__name__)
+
+ESTADOS_FINALES = ('completado', 'error', 'cancelado')
+
+
+class Trabajo:
+    """Lo que recibe la función del trabajo: sus parámetros y avance() para informar del progreso."""
+
+    def __init__(self, ejecutor, id, tipo, parametros):
+        self._ejecutor = ejecutor
+        # Conexión del bloqueo en los tipos exclusivos: el progreso se guarda en ella
+        self._conn = None
+        self.id = id
+        self.tipo = tipo
+        self.parametros = parametros
+        self.filas = 0
+        self.progreso = 0.0
+        self.mensaje = None
+        self._guardado = 0.0
+
+    def avance(self, filas=None, progreso=None, mensaje=None):
+        """Actualiza el estado; se escribe en la tabla como mucho una vez por intervalo."""
+        if filas is not None:
+            self.filas = int(filas)
+        if progreso is not None:
+            self.progreso = max(0.0, min(100.0, round(float(progreso), 2)))
+        if mensaje is not None:
+            self.mensaje = mensaje[:255]
+        ahora = time.monotonic()
+        if ahora - self._guardado >= self._ejecutor.intervalo_avance:
+            self._guardado = ahora
+            self._ejecutor._actualizar(self.id, conn=self._conn, filas_procesadas=self.filas,
+                                       progreso=self.progreso, mensaje=self.mensaje)
+
+
+class EjecutorTrabajos:
+    """
+    obtener_pool() devuelve el PoolMySQL de la app; contexto() abre el contexto en que corre cada
+    trabajo (app.app_context, para que la función pueda usar get_db()).
+    """
+
+    def __init__(self, obtener_pool, contexto, hilos=2, intervalo_avance=1.0, max_pendiente=3600):
+        self._obtener_pool = obtener_pool
+        self._contexto = contexto
+        self.hilos = hilos
+        self.intervalo_avance = intervalo_avance
+        self.max_pendiente = max_pendiente
+        self._tipos = {}
+        self._activos = {}
+        # Enviados desde este proceso que aún no empezaron; mientras haya alguno se mantiene la presencia
+        self._en_cola = set()
+        # Nombre del ejecutor en la columna `propietario` (cabe en los 64 caracteres de GET_LOCK)
+        self.propietario = f'{socket.gethostname()[:24]}.{os.getpid()}.{secrets.token_hex(3)}'
+        self._conn_presencia = None
+        self._lock = threading.Lock()
+        self._pool_hilos = None
+        self.enviados = 0
+        self.completados = 0
+        self.fallidos = 0
+
+    def registrar(self, tipo, funcion, exclusivo=False):
+        """funcion(trabajo) -> resultado serializable a JSON."""
+        self._tipos[tipo] = (funcion, exclusivo)
+
+    # --- Acceso a la tabla (conexión propia del pool, fuera de la transacción del trabajo) ---
+    def _con_conexion(self, operacion, conn=None):
+        """operacion(conn) y commit. Con `conn` (la del bloqueo de un exclusivo) no se pide otra al pool."""
+        if conn is not None:
+            try:
+                resultado = operacion(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return resultado
+        pool = self._obtener_pool()
+        conn = pool.obtener()
+        try:
+            resultado = operacion(conn)
+            conn.commit()
+        except pymysql.err.OperationalError:
+            pool.descartar(conn)
+            raise
+        except Exception:
+            conn.rollback()
+            pool.devolver(conn)
+            raise
+        pool.devolver(conn)
+        return resultado
+
+    def _ejecutar_sql(self, sql, args, conn=None):
+        """UPDATE en una conexión propia (o en `conn`); devuelve las filas afectadas."""
+        def operacion(conn):
+            cur = conn.cursor()
+            try:
+                cur.execute(sql, args)
+                return cur.rowcount
+            finally:
+                cur.close()
+        return self._con_conexion(operacion, conn)
+
+    def _reclamar(self, trabajo_id, conn=None):
+        """Pasa el trabajo de 'pendiente' a 'en_proceso'. False si ya no estaba pendiente (cerrado como huérfano)."""
+        return self._ejecutar_sql(
+            "UPDATE trabajos SET estado = 'en_proceso', iniciado_en = %s WHERE id = %s AND estado = 'pendiente'",
+            (_ahora(), trabajo_id), conn
+        ) == 1
+
+    @staticmethod
+    def _nombre_presencia(propietario):
+        return f'dw_manager.ejecutor.{propietario}'
+
+    def _asegurar_presencia(self):
+        """Toma el bloqueo con el nombre del ejecutor antes de registrar filas a su nombre. Con self._lock."""
+        if self._conn_presencia is not None:
+            return
+        pool = self._obtener_pool()
+        conn = pool.obtener()
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute('SELECT GET_LOCK(%s, 0) AS ok', (self._nombre_presencia(self.propietario),))
+                ok = cur.fetchone()['ok']
+            finally:
+                cur.close()
+        except Exception:
+            pool.descartar(conn)
+            raise
+        if ok != 1:
+            pool.devolver(conn)
+            raise RuntimeError(f'No se pudo tomar el bloqueo de presencia de {self.propietario}')
+        self._conn_presencia = conn
+
+    def _soltar_presencia(self):
+        """Sin trabajos en cola la conexión de presencia vuelve al pool. Con self._lock."""
+        conn, self._conn_presencia = self._conn_presencia, None
+        if conn is None:
+            return
+        pool = self._obtener_pool()
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT RELEASE_LOCK(%s)', (self._nombre_presencia(self.propietario),))
+            cur.fetchall()
+            cur.close()
+            pool.devolver(conn)
+        except Exception:
+            pool.descartar(conn)
+
+    def _fuera_de_cola(self, trabajo_id):
+        with self._lock:
+            self._en_cola.discard(trabajo_id)
+            if not self._en_cola:
+                self._soltar_presencia()
+
+    def _cerrar_pendientes_huerfanos(self):
+        """
+        'pendiente' con más de max_pendiente segundos cuyo propietario ya no tiene su bloqueo de presencia:
+        el proceso que lo tenía en cola murió. Los de procesos vivos siguen esperando aunque tarden.
+        Filas sin propietario (anteriores a la columna): solo por antigüedad.
+        """
+        try:
+            cerrados = self._ejecutar_sql(
+                "UPDATE trabajos SET estado = 'error', error = 'No llegó a ejecutarse: el proceso que lo tenía en cola terminó', "
+                "terminado_en = NOW() WHERE estado = 'pendiente' AND created_at < NOW() - INTERVAL %s SECOND "
+                "AND (propietario IS NULL OR IS_USED_LOCK(CONCAT('dw_manager.ejecutor.', propietario)) IS NULL)",
+                (int(self.max_pendiente),)
+            )
+        except Exception:
+            log.exception('No se pudieron cerrar los trabajos pendientes huérfanos')
+            return
+        if cerrados:
+            log.warning('%s trabajos pendientes huérfanos marcados como error', cerrados)
+
+    def _actualizar(self, trabajo_id, conn=None, **campos):
+        asignaciones = ', '.join(f'{c} = %s' for c in campos)
+
+        def actualizar(conn):
+            cur = conn.cursor()
+            try:
+                cur.execute(f'UPDATE trabajos SET {asignaciones} WHERE id = %s', tuple(campos.values()) + (trabajo_id,))
+            finally:
+                cur.close()
+        try:
+            self._con_conexion(actualizar, conn)
+            return
+        except Exception:
+            if conn is None:
+                # El estado es informativo: un fallo al guardarlo no debe tumbar el trabajo
+                log.exception('No se pudo actualizar el trabajo %s', trabajo_id)
+                return
+        # Se cayó la conexión del bloqueo: el estado final no se pierde, va por una del pool
+        try:
+            self._con_conexion(actualizar)
+        except Exception:
+            log.exception('No se pudo actualizar el trabajo %s', trabajo_id)
+
+    @staticmethod
+    def _nombre_bloqueo(tipo):
+        return f'dw_manager.trabajo.{tipo}'
+
+    def enviar(self, tipo, parametros=None, usuario_id=None):
+        """
+        Registra el trabajo y lo encola. Devuelve (id, nuevo). Para un tipo exclusivo que ya está
+        pendiente o en curso (en este proceso o en otro) devuelve el id existente y nuevo=False.
+        """
+        if tipo not in self._tipos:
+            raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+        exclusivo = self._tipos[tipo][1]
+        with self._lock:
+            if exclusivo and tipo in self._activos:
+                return self._activos[tipo], False
+
+            def insertar(conn):
+                cur = conn.cursor()
+                try:
+                    if exclusivo:
+                        cur.execute('SELECT IS_USED_LOCK(%s) AS sesion', (self._nombre_bloqueo(tipo),))
+                        if cur.fetchone()['sesion'] is not None:
+                            cur.execute("SELECT id FROM trabajos WHERE tipo = %s AND estado = 'en_proceso' ORDER BY id DESC LIMIT 1", (tipo,))
+                            fila = cur.fetchone()
+                            if fila:
+                                return fila['id'], False
+                    cur.execute(
+                        'INSERT INTO trabajos (tipo, estado, parametros, usuario_id, propietario) VALUES (%s, %s, %s, %s, %s)',
+                        (tipo, 'pendiente', json.dumps(parametros or {}, default=str), usuario_id, self.propietario)
+                    )
+                    return cur.lastrowid, True
+                finally:
+                    cur.close()
+            # La presencia va antes de la fila: nadie puede verla pendiente sin un dueño vivo
+            self._asegurar_presencia()
+            try:
+                trabajo_id, nuevo = self._con_conexion(insertar)
+            except Exception:
+                if not self._en_cola:
+                    self._soltar_presencia()
+                raise
+            if not nuevo:
+                if not self._en_cola:
+                    self._soltar_presencia()
+                return trabajo_id, False
+            if exclusivo:
+                self._activos[tipo] = trabajo_id
+            self._en_cola.add(trabajo_id)
+            if self._pool_hilos is None:
+                self._pool_hilos = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='trabajo')
+            self.enviados += 1
+        self._pool_hilos.submit(self._ejecutar, Trabajo(self, trabajo_id, tipo, parametros or {}))
+        return trabajo_id, True
+
+    def _ejecutar(self, trabajo):
+        funcion, exclusivo = self._tipos[trabajo.tipo]
+        pool = self._obtener_pool()
+        conn_bloqueo = None
+        en_cola = True
+        self._cerrar_pendientes_huerfanos()
+        try:
+            if exclusivo:
+                # El bloqueo vive en su propia sesión: se libera solo si el proceso muere
+                conn_bloqueo = pool.obtener()
+                cur = conn_bloqueo.cursor()
+                cur.execute('SELECT GET_LOCK(%s, 0) AS ok', (self._nombre_bloqueo(trabajo.tipo),))
+                ok = cur.fetchone()['ok']
+                if ok != 1:
+                    cur.close()
+                    self._actualizar(trabajo.id, conn=conn_bloqueo, estado='cancelado', terminado_en=_ahora(),
+                                     mensaje='Ya hay otro trabajo de este tipo en curso')
+                    return
+                # Con el bloqueo tomado, cualquier otro 'en_proceso' del mismo tipo quedó huérfano, y los
+                # 'pendiente' anteriores a este quedan cubiertos por él
+                cur.execute(
+                    "UPDATE trabajos SET estado = 'error', error = 'Interrumpido: el proceso que lo ejecutaba terminó', "
+                    "terminado_en = NOW() WHERE tipo = %s AND estado = 'en_proceso' AND id <> %s",
+                    (trabajo.tipo, trabajo.id)
+                )
+                cur.execute(
+                    "UPDATE trabajos SET estado = 'cancelado', mensaje = %s, terminado_en = NOW() "
+                    "WHERE tipo = %s AND estado = 'pendiente' AND id < %s",
+                    (f'Cubierto por el trabajo {trabajo.id}', trabajo.tipo, trabajo.id)
+                )
+                conn_bloqueo.commit()
+                cur.close()
+                # Estado y progreso van por esta conexión, que sin ello estaría ociosa todo el trabajo
+                trabajo._conn = conn_bloqueo
+            reclamado = self._reclamar(trabajo.id, trabajo._conn)
+            # Ya no está 'pendiente': deja de necesitar la presencia de este proceso
+            self._fuera_de_cola(trabajo.id)
+            en_cola = False
+            if not reclamado:
+                log.info('Trabajo %s (%s) ya no estaba pendiente; no se ejecuta', trabajo.id, trabajo.tipo)
+                return
+            with self._contexto():
+                resultado = funcion(trabajo)
+            self._actualizar(
+                trabajo.id, conn=trabajo._conn, estado='completado', progreso=100, filas_procesadas=trabajo.filas,
+                mensaje=trabajo.mensaje, resultado=json.dumps(resultado, default=str), terminado_en=_ahora()
+            )
+            self.completados += 1
+        except Exception as e:
+            log.exception('Trabajo %s (%s) falló', trabajo.id, trabajo.tipo)
+            self._actualizar(trabajo.id, conn=trabajo._conn, estado='error', error=str(e)[:2000],
+                             filas_procesadas=trabajo.filas, terminado_en=_ahora())
+            self.fallidos += 1
+        finally:
+            if en_cola:
+                self._fuera_de_cola(trabajo.id)
+            if conn_bloqueo is not None:
+                try:
+                    cur = conn_bloqueo.cursor()
+                    cur.execute('SELECT RELEASE_LOCK(%s)', (self._nombre_bloqueo(trabajo.tipo),))
+                    cur.fetchall()
+                    cur.close()
+                    pool.devolver(conn_bloqueo)
+                except Exception:
+                    pool.descartar(conn_bloqueo)
+            with self._lock:
+                if self._activos.get(trabajo.tipo) == trabajo.id:
+                    del self._activos[trabajo.tipo]
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'hilos': self.hilos,
+                'tipos': {t: {'exclusivo': e} for t, (_, e) in self._tipos.items()},
+                'activos_exclusivos': dict(self._activos),
+                'en_cola': len(self._en_cola),
+                'propietario': self.propietario,
+                'enviados': self.enviados,
+                'completados': self.completados,
+                'fallidos': self.fallidos,
+            }
+
+
+def _ahora():
+    return datetime.now().replace(microsecond=0)
+
+
+def fila_publica(fila):
+    """Fila de `trabajos` lista para jsonify: parametros y resultado como objetos."""
+    fila = dict(fila)
+    for campo in ('parametros', 'resultado'):
+        if isinstance(fila.get(campo), (str, bytes)):
+            try:
+                fila[campo] = json.loads(fila[campo])
+            except ValueError:
+                pass
+    fila['terminado'] = fila.get('estado') in ESTADOS_FINALES
+    return fila